@@ -3,15 +3,32 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+import os
 import webapp2
 
-from handlers.autobid_handler import JSONAutobidHandler
+from handlers.autobid_handler import JSONAutobidHandler, JSONAutobidBatchHandler
 from handlers.explore_handler import ExploreHandler, JSONExploreHandler
+import handlers.explore_handler as explore_handler
 from handlers.bidder_handler import BidderHandler
 from handlers.scores_handler import ScoresHandler
 from handlers.score_flashcards_handler import ScoreFlashcardsHandler
 from handlers.unittest_handler import UnittestHandler
 from handlers.priorities_handler import JSONPrioritiesHandler
+from response_cache import ResponseCache
+from z3b import atlas
+
+
+# Interpretations of common auctions can be precomputed with scripts/build-atlas.
+atlas_path = os.environ.get('SAYCBRIDGE_ATLAS')
+if atlas_path:
+    atlas.install_atlas(atlas.load_atlas(atlas_path))
+
+# /json/interpret responses can be kept on disk, shared between workers and
+# restarts.  Entries are keyed by bidder revision and atlas, so the directory
+# only needs clearing to reclaim space.
+response_cache_dir = os.environ.get('SAYCBRIDGE_RESPONSE_CACHE')
+if response_cache_dir:
+    explore_handler.interpretation_cache = ResponseCache(store_dir=response_cache_dir)
 
 
 routes = [
@@ -21,6 +38,7 @@ routes = [
     (r'/explore/(.*)', ExploreHandler),
     (r'/explore', ExploreHandler),
     (r'/json/autobid', JSONAutobidHandler),
+    (r'/json/autobid_batch', JSONAutobidBatchHandler),
     (r'/json/interpret', JSONExploreHandler),
 
     # Low usage:
@@ -4,6 +4,7 @@
 
 import copy
 import datetime
+import traceback
 import urllib
 
 import webapp2
@@ -45,7 +46,7 @@ class JSONAutobidHandler(webapp2.RequestHandler):
     def _explore_string_from_call_selection(self, selection):
         try:
             with Interpreter().extend_history(selection.rule_selector.history, selection.call) as history:
-                return ConstraintsSerializer(history.rho).explore_string()
+                return ConstraintsSerializer(history.rho.summary).explore_string()
         except InconsistentHistoryException:
             return None
 
@@ -75,21 +76,25 @@ class JSONAutobidHandler(webapp2.RequestHandler):
             call_selections.append(selection)
         return call_selections
 
-    def get(self):
-        bidder = Bidder()
-        board = self._board_from_request()
+    def _until_position_from_request(self):
         until_position_string = self.request.get('until_position')
-        until_position = Position.from_char(until_position_string) if until_position_string else None
+        return Position.from_char(until_position_string) if until_position_string else None
+
+    def _board_dict(self, bidder, board, until_position):
         call_selections = self._bid_all_hands(bidder, board, until_position=until_position)
         until_position_history_string = board.call_history.calls_string()
         call_selections += self._bid_all_hands(bidder, board)
         # Callers might want to know what the full history would look like if autobid.
-        board_dict = {
+        return {
             'board_number': board.number,
             'calls_string': until_position_history_string, # The history up to "until_position"
             'autobid_continuation': board.call_history.calls_string(), # How the autobidder would continue
             'autobid_interpretations': map(self._json_tuple, call_selections), # Interpretations for all calls (including continuation)
         }
+
+    def get(self):
+        board = self._board_from_request()
+        board_dict = self._board_dict(Bidder(), board, self._until_position_from_request())
         self.response.headers["Content-Type"] = "application/json"
         self.response.headers["Cache-Control"] = "public"
 
@@ -98,3 +103,42 @@ class JSONAutobidHandler(webapp2.RequestHandler):
         self.response.headers.add_header("Expires", expires_str)
 
         self.response.out.write(json.dumps(board_dict))
+
+
+# Autobids every board POSTed, one per line, and streams back each board's
+# JSONAutobidHandler dict as a line of JSON as soon as it is bid.  Boards are
+# Board identifiers, or PBN deals optionally preceded by a board number, e.g.
+# "11 S:AK85.Q64.543.AT4 J64.AK932.8.K952 QT73.T7.QT96.J86 92.J85.AKJ72.Q73".
+# All of the boards share one Bidder (and the interpreter's history cache).
+# Boards which can't be parsed or bid get a line with an error instead.
+class JSONAutobidBatchHandler(JSONAutobidHandler):
+    def _board_from_line(self, line):
+        words = line.split()
+        if len(words) == 1:
+            return Board.from_identifier(line)
+        board_number = int(words.pop(0)) if len(words) == 5 else 1
+        return Board(board_number, Deal.from_pbn_string(" ".join(words)))
+
+    def _board_lines(self, board_strings, until_position):
+        bidder = Bidder()
+        for board_string in board_strings:
+            try:
+                board = self._board_from_line(board_string)
+            except (AssertionError, KeyError, IndexError, ValueError):
+                yield json.dumps({'board': board_string, 'error': "Failed to parse board."}) + "\n"
+                continue
+            try:
+                board_dict = self._board_dict(bidder, board, until_position)
+            except Exception, e:
+                # Raising would end the stream (and the worker) partway
+                # through, so the failure is reported on this board's line.
+                traceback.print_exc()
+                yield json.dumps({'board': board_string, 'error': "Failed to bid board: %s" % e}) + "\n"
+                continue
+            board_dict['board'] = board_string
+            yield json.dumps(board_dict) + "\n"
+
+    def post(self):
+        board_strings = filter(None, map(str.strip, str(self.request.body).splitlines()))
+        self.response.headers["Content-Type"] = "application/x-ndjson"
+        self.response.app_iter = self._board_lines(board_strings, self._until_position_from_request())
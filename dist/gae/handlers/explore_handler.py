@@ -14,8 +14,10 @@ from core.call import Pass
 from core.callexplorer import CallExplorer
 from core.callhistory import CallHistory
 from proxy import ConstraintsSerializer
+from response_cache import ResponseCache
 from z3b.bidder import Interpreter, Bidder, InconsistentHistoryException
 from z3b.forcing import SAYCForcingOracle
+import z3b.bidder as bidder
 from z3b.preconditions import annotations
 
 
@@ -26,6 +28,11 @@ def get_git_revision():
 BIDDER_REVISION = get_git_revision()
 
 
+# /json/interpret bodies, keyed by revision, atlas and calls.  appengine_main
+# may replace this with one backed by a file store.
+interpretation_cache = ResponseCache()
+
+
 class ExploreHandler(webapp2.RequestHandler):
     def _history_from_calls_string(self, calls_string):
         history_identifier = "N:NO:%s" % calls_string  # FIXME: I doubt this is right with the new identifiers.
@@ -63,23 +70,28 @@ class JSONExploreHandler(webapp2.RequestHandler):
             # sayc_page no longer supported.
         return explore_dict
 
-    # FIXME: Why is this different from ConstraintsSerializer.explore_string?
-    # Why does the bidder return one knowledge_string and /explore a different one?
-    def _knowledge_string(self, position_view, interpreter):
-        explore_string = ConstraintsSerializer(position_view).explore_string()
+    def _pretty_string(self, summary, annotations_for_last_call, is_forcing):
+        explore_string = ConstraintsSerializer(summary).explore_string()
         # FIXME: Annotation filtering belongs on the client, not here!
         annotations_whitelist = set([annotations.Artificial, annotations.NotrumpSystemsOn])
-        annotations_for_last_call = set(position_view.annotations_for_last_call) & annotations_whitelist
+        annotations_for_last_call = set(annotations_for_last_call) & annotations_whitelist
         pretty_string = "%s %s" % (explore_string, ", ".join(map(str, annotations_for_last_call)))
+        if is_forcing:
+            pretty_string += " Forcing"
+        return pretty_string
+
+    # FIXME: Why is this different from ConstraintsSerializer.explore_string?
+    # Why does the bidder return one knowledge_string and /explore a different one?
+    def _knowledge_string(self, position_view, interpreter):
+        is_forcing = False
         # Only bother trying to interpret if the bid is forcing if we understood it in the first place:
         if position_view.rule_for_last_call:
             try:
                 partner_future = interpreter.extend_history(position_view.history, Pass())
-                if SAYCForcingOracle().forced_to_bid(partner_future):
-                    pretty_string += " Forcing"
+                is_forcing = SAYCForcingOracle().forced_to_bid(partner_future)
             except InconsistentHistoryException:
                 pass
-        return pretty_string
+        return self._pretty_string(position_view.summary, position_view.annotations_for_last_call, is_forcing)
 
     # FIXME: This could be untangled further.
     def _knowledge_string_and_rule_for_additional_call(self, history, call, interpreter):
@@ -90,25 +102,80 @@ class JSONExploreHandler(webapp2.RequestHandler):
         except InconsistentHistoryException, e:
             return None, None
 
-    def get(self):
-        interpreter = Interpreter()
-        calls_string = self.request.get('calls_string') or ''
-        dealer_char = self.request.get('dealer') or ''
-        vulnerability_string = self.request.get('vulnerability') or ''
-        call_history = CallHistory.from_string(calls_string, dealer_char, vulnerability_string)
+    def _interpretations_from_atlas(self, call_history):
+        atlas = bidder.interpretation_atlas
+        records = atlas.records_over(call_history) if atlas else None
+        if records is None:
+            return None
+
+        interpretations = []
+        for call in CallExplorer().possible_calls_over(call_history):
+            record = records[call]
+            knowledge_string, rule = None, None
+            if record.is_consistent:
+                knowledge_string = self._pretty_string(record.summary, record.annotations, record.is_forcing)
+                rule = atlas.rule_for(record)
+            interpretations.append(self._json_from_rule(knowledge_string, rule, call))
+        return interpretations
+
+    def _interpretations(self, call_history):
+        interpretations = self._interpretations_from_atlas(call_history)
+        if interpretations is not None:
+            return interpretations
 
+        interpreter = Interpreter()
         interpretations = []
         with interpreter.create_history(call_history) as history:
             for call in CallExplorer().possible_calls_over(call_history):
                 knowledge_string, rule = self._knowledge_string_and_rule_for_additional_call(history, call, interpreter)
                 explore_dict = self._json_from_rule(knowledge_string, rule, call)
                 interpretations.append(explore_dict)
+        return interpretations
+
+    def _cache_key(self, call_history):
+        # Interpretations depend on neither the dealer nor the vulnerability,
+        # but do depend on which atlas (if any) answered them.
+        atlas = bidder.interpretation_atlas
+        atlas_identifier = atlas.identifier if atlas else "none"
+        return "%s:%s:%s" % (BIDDER_REVISION, atlas_identifier, call_history.comma_separated_calls())
+
+    def _matches_if_none_match(self, etag):
+        if_none_match = self.request.headers.get('If-None-Match')
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        for candidate in if_none_match.split(','):
+            candidate = candidate.strip()
+            if candidate.startswith('W/'):
+                candidate = candidate[2:]
+            if candidate.strip('"') == etag:
+                return True
+        return False
 
-        self.response.headers["Content-Type"] = "application/json"
+    def get(self):
+        calls_string = self.request.get('calls_string') or ''
+        dealer_char = self.request.get('dealer') or ''
+        vulnerability_string = self.request.get('vulnerability') or ''
+        call_history = CallHistory.from_string(calls_string, dealer_char, vulnerability_string)
+
+        cache_key = self._cache_key(call_history)
+        etag = ResponseCache.etag_for_key(cache_key)
+        self.response.headers["ETag"] = '"%s"' % etag
         self.response.headers["Cache-Control"] = "public"
 
         expires_date = datetime.datetime.utcnow() + datetime.timedelta(days=1)
         expires_str = expires_date.strftime("%d %b %Y %H:%M:%S GMT")
         self.response.headers.add_header("Expires", expires_str)
 
-        self.response.out.write(json.dumps(interpretations))
+        if self._matches_if_none_match(etag):
+            self.response.set_status(304)
+            return
+
+        body = interpretation_cache.get(cache_key)
+        if body is None:
+            body = json.dumps(self._interpretations(call_history))
+            interpretation_cache.set(cache_key, body)
+
+        self.response.headers["Content-Type"] = "application/json"
+        self.response.out.write(body)
@@ -3,20 +3,32 @@
 # found in the LICENSE file.
 
 import json
-import networkx.readwrite.json_graph
 import webapp2
 from z3b.rules import Rule
 from z3b.sayc import StandardAmericanYellowCard
 
 
-class JSONPrioritiesHandler(webapp2.RequestHandler):
-    def get(self):
-        graph = StandardAmericanYellowCard.priority_ordering.ordering._graph
-        link_data = networkx.readwrite.json_graph.node_link_data(graph)
-
+# The ordering as a graph in node-link form (as networkx's node_link_data
+# made it), with a link from each priority to every priority greater than it.
+# Links refer to nodes by index, which is also the priority's rank.
+def node_link_data(ordering):
+    priorities = ordering.items()
+    links = []
+    for rank, priority in enumerate(priorities):
+        greater_bits = ordering.greater_bits(priority)
+        links.extend({'source': rank, 'target': greater_rank} for greater_rank in range(len(priorities)) if greater_bits >> greater_rank & 1)
+    return {
+        'directed': True,
+        'multigraph': False,
+        'graph': [],
         # Many priority objects aren't json serializable so just repr everything for now.
-        for node in link_data['nodes']:
-            node['id'] = repr(node['id'])
+        'nodes': [{'id': repr(priority)} for priority in priorities],
+        'links': links,
+    }
 
+
+class JSONPrioritiesHandler(webapp2.RequestHandler):
+    def get(self):
+        link_data = node_link_data(StandardAmericanYellowCard.priority_ordering.ordering)
         self.response.headers["Content-Type"] = "application/json"
         self.response.out.write(json.dumps(link_data))
@@ -1,15 +1,26 @@
 from cherrypy import wsgiserver
-import standalone_app
+import multiprocessing
+import os
+
+from static_files import with_static_files
+from worker_pool import WorkerPool
+
+# z3 does not play nice with threads, so the bidder runs in worker processes,
+# and the server's threads only pass requests to them (and serve static files).
+# The pool must be made before the server, as it forks while single threaded.
+worker_count = int(os.environ.get('SAYCBRIDGE_WORKERS', multiprocessing.cpu_count()))
+worker_pool = WorkerPool(worker_count)
 
 server = wsgiserver.CherryPyWSGIServer(
         ('localhost', 8080),
-        standalone_app.app,
-        numthreads=1 # z3 does not play nice with threads.
+        with_static_files(worker_pool),
+        numthreads=2 * worker_count
     )
 try:
-    print "Starting..."
+    print "Starting %s workers..." % worker_count
     server.start()
 except KeyboardInterrupt:
     print
     print "Stopping..."
     server.stop()
+    worker_pool.stop()
@@ -12,9 +12,11 @@ class ConstraintsSerializer(object):
     MAX_HCP_PER_HAND = 37
     EMPTY_HCP_RANGE = (0, MAX_HCP_PER_HAND)
 
-    def __init__(self, position_view):
-        self._hcp_range = (position_view.min_points, position_view.max_points)
-        self._suit_length_ranges = [(position_view.min_length(suit), position_view.max_length(suit)) for suit in SUITS]
+    # Takes a PositionSummary, e.g. from PositionView.summary, which computes
+    # all of the ranges in one pass over the solver, or from an atlas.
+    def __init__(self, summary):
+        self._hcp_range = (summary.min_points, summary.max_points)
+        self._suit_length_ranges = [(summary.min_length(suit), summary.max_length(suit)) for suit in SUITS]
 
     def _string_for_range(self, range_tuple, global_max):
         # This len check only exists for trying to print invalid hand constraints.
@@ -0,0 +1,67 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import collections
+import hashlib
+import os
+import os.path
+import tempfile
+import threading
+
+
+# A bounded, least-recently-used cache of response bodies, optionally backed
+# by a directory of files so bodies survive restarts and are shared between
+# worker processes.  Keys should include everything the body depends on,
+# including the bidder revision, as nothing is ever invalidated.
+class ResponseCache(object):
+    def __init__(self, max_entries=10000, store_dir=None):
+        self.max_entries = max_entries
+        self.store_dir = store_dir
+        self._bodies = collections.OrderedDict()
+        self._lock = threading.Lock()
+        if store_dir and not os.path.isdir(store_dir):
+            os.makedirs(store_dir)
+
+    # The ETag is a function of the key alone, so a revalidation can be
+    # answered without looking at (or computing) the body.
+    @classmethod
+    def etag_for_key(cls, key):
+        return hashlib.sha1(key).hexdigest()
+
+    def _store_path(self, key):
+        return os.path.join(self.store_dir, self.etag_for_key(key))
+
+    def _remember(self, key, body):
+        with self._lock:
+            self._bodies.pop(key, None)
+            self._bodies[key] = body
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            body = self._bodies.pop(key, None)
+            if body is not None:
+                self._bodies[key] = body
+                return body
+        if not self.store_dir:
+            return None
+        try:
+            with open(self._store_path(key)) as store_file:
+                body = store_file.read()
+        except IOError:
+            return None
+        self._remember(key, body)
+        return body
+
+    def set(self, key, body):
+        self._remember(key, body)
+        if not self.store_dir:
+            return
+        # Written to a temporary file and renamed, so readers in other
+        # processes never see half a body.
+        descriptor, temp_path = tempfile.mkstemp(dir=self.store_dir)
+        with os.fdopen(descriptor, 'w') as temp_file:
+            temp_file.write(body)
+        os.rename(temp_path, self._store_path(key))
@@ -0,0 +1,15 @@
+import werkzeug
+import os.path
+
+gae_dir = os.path.dirname(__file__)
+
+
+# Alternately we could read app.yaml and setup the static paths from that.
+def with_static_files(app):
+    return werkzeug.SharedDataMiddleware(app, {
+        '/scripts': os.path.join(gae_dir, 'scripts'),
+        '/stylesheets': os.path.join(gae_dir, 'stylesheets'),
+        '/images': os.path.join(gae_dir, 'images'),
+        '/static': os.path.join(gae_dir, 'static'),
+        '/fight': os.path.join(gae_dir, 'static', 'fight.html')
+    })
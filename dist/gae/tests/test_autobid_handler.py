@@ -0,0 +1,35 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import json
+import unittest2
+from handlers.autobid_handler import JSONAutobidBatchHandler
+
+
+DEAL_STRING = "S:AK85.Q64.543.AT4 J64.AK932.8.K952 QT73.T7.QT96.J86 92.J85.AKJ72.Q73"
+
+
+class JSONAutobidBatchHandlerTest(unittest2.TestCase):
+    def test_failed_boards_get_error_lines(self):
+        handler = JSONAutobidBatchHandler.__new__(JSONAutobidBatchHandler)
+
+        def board_dict(bidder, board, until_position):
+            if board.number == 11:
+                raise ValueError("No call for board 11")
+            return {'board_number': board.number}
+
+        handler._board_dict = board_dict
+        board_strings = ["11 " + DEAL_STRING, "12 " + DEAL_STRING, "not a board", "13 " + DEAL_STRING]
+        lines = list(handler._board_lines(board_strings, None))
+        self.assertTrue(all(line.endswith("\n") for line in lines))
+        records = map(json.loads, lines)
+        self.assertEquals([record['board'] for record in records], board_strings)
+        self.assertEquals(records[0]['error'], "Failed to bid board: No call for board 11")
+        self.assertEquals(records[1]['board_number'], 12)
+        self.assertEquals(records[2]['error'], "Failed to parse board.")
+        self.assertEquals(records[3]['board_number'], 13)
+
+
+if __name__ == '__main__':
+    unittest2.main()
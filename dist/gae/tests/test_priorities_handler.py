@@ -0,0 +1,25 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest2
+from handlers.priorities_handler import node_link_data
+from z3b.ordering import Ordering
+
+
+class NodeLinkDataTest(unittest2.TestCase):
+    def test_node_link_data(self):
+        ordering = Ordering()
+        low, middle, high, other = 1, 2, 3, 4
+        ordering.order(low, middle, high)
+        ordering.order(other, high)
+        link_data = node_link_data(ordering)
+        node_ids = [node['id'] for node in link_data['nodes']]
+        self.assertEquals(sorted(node_ids), ['1', '2', '3', '4'])
+        links = set((node_ids[link['source']], node_ids[link['target']]) for link in link_data['links'])
+        self.assertEquals(links, set([('1', '2'), ('1', '3'), ('2', '3'), ('4', '3')]))
+        self.assertTrue(link_data['directed'])
+
+
+if __name__ == '__main__':
+    unittest2.main()
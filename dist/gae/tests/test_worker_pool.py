@@ -0,0 +1,132 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import StringIO
+import os
+import threading
+import unittest2
+from worker_pool import WorkerPool
+
+
+# Answers with the worker's pid, or dies on /die.
+def _pid_app(environ, start_response):
+    if environ['PATH_INFO'] == '/die':
+        os._exit(1)
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [str(os.getpid())]
+
+
+def _pid_app_factory():
+    return _pid_app
+
+
+class WorkerPoolTest(unittest2.TestCase):
+    def setUp(self):
+        self.pool = None
+
+    def tearDown(self):
+        if self.pool:
+            self.pool.stop()
+
+    def _make_pool(self, worker_count, max_requests=1000):
+        self.pool = WorkerPool(worker_count, app_factory=_pid_app_factory, max_requests=max_requests)
+        return self.pool
+
+    def _request(self, calls_string='', path='/'):
+        responses = []
+
+        def start_response(status, headers):
+            responses.append(status)
+
+        environ = {
+            'PATH_INFO': path,
+            'QUERY_STRING': 'calls_string=%s' % calls_string,
+            'wsgi.input': StringIO.StringIO(''),
+        }
+        body = "".join(self.pool(environ, start_response))
+        return responses[0], body
+
+    def _pid_for(self, calls_string):
+        status, body = self._request(calls_string)
+        self.assertEquals(status, '200 OK')
+        return int(body)
+
+    def test_affinity(self):
+        pool = self._make_pool(4)
+        self.assertEquals(pool._affinity_key({'QUERY_STRING': 'calls_string=1C,P,1H'}), "1C P")
+        pids = set(worker.pid for worker in pool.workers)
+        self.assertEquals(len(pids), 4)
+        # Auctions starting with the same calls go to the same (idle) worker.
+        pid = self._pid_for("1C,P")
+        self.assertIn(pid, pids)
+        self.assertEquals(self._pid_for("1C,P,1H"), pid)
+        self.assertEquals(self._pid_for("1C,P,1H,P"), pid)
+
+    def test_busy_worker(self):
+        pool = self._make_pool(2)
+        pid = self._pid_for("1C,P")
+        busy_worker = [worker for worker in pool.workers if worker.pid == pid][0]
+        with busy_worker.lock:
+            self.assertNotEquals(self._pid_for("1C,P"), pid)
+        self.assertEquals(self._pid_for("1C,P"), pid)
+
+    def test_recycle(self):
+        pool = self._make_pool(1, max_requests=2)
+        worker = pool.workers[0]
+        first_pid = worker.pid
+        self.assertEquals(self._pid_for(""), first_pid)
+        self.assertEquals(self._pid_for(""), first_pid)
+        worker.wait_for_recycle()
+        self.assertEquals(worker.recycle_count, 1)
+        self.assertNotEquals(worker.pid, first_pid)
+        self.assertEquals(self._pid_for(""), worker.pid)
+        self.assertEquals(worker.request_count, 1)
+
+    def test_recycle_waits_for_the_request(self):
+        pool = self._make_pool(1, max_requests=1)
+        worker = pool.workers[0]
+        first_pid = worker.pid
+
+        def start_response(status, headers):
+            pass
+
+        environ = {'PATH_INFO': '/', 'QUERY_STRING': '', 'wsgi.input': StringIO.StringIO('')}
+        body = pool(environ, start_response)
+        self.assertEquals(next(body), str(first_pid))
+        # Until the body is closed, the worker is still held by this request.
+        self.assertFalse(worker.lock.acquire(False))
+        self.assertEquals(worker.pid, first_pid)
+        body.close()
+        worker.wait_for_recycle()
+        self.assertNotEquals(worker.pid, first_pid)
+
+    def test_dead_worker(self):
+        pool = self._make_pool(1)
+        worker = pool.workers[0]
+        first_pid = worker.pid
+        status, body = self._request(path='/die')
+        self.assertEquals(status, '500 Internal Server Error')
+        worker.wait_for_recycle()
+        self.assertEquals(worker.recycle_count, 1)
+        self.assertNotEquals(self._pid_for(""), first_pid)
+
+    def test_requests_from_many_threads(self):
+        pool = self._make_pool(2)
+        pids = []
+
+        def make_requests():
+            for _ in range(10):
+                pids.append(self._pid_for("1C"))
+
+        threads = [threading.Thread(target=make_requests) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(len(pids), 40)
+        self.assertTrue(set(pids) <= set(worker.pid for worker in pool.workers))
+
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -0,0 +1,295 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import StringIO
+import _multiprocessing
+import multiprocessing
+import os
+import resource
+import signal
+import sys
+import threading
+import time
+import traceback
+import urlparse
+
+
+# Only the parts of a WSGI environ which can be sent to another process.
+def _request_from_environ(environ):
+    request = dict((key, value) for key, value in environ.items() if isinstance(value, (str, int, bool)))
+    content_length = environ.get('CONTENT_LENGTH')
+    request['body'] = environ['wsgi.input'].read(int(content_length)) if content_length else ''
+    return request
+
+
+def _environ_from_request(request):
+    environ = dict(request)
+    environ['wsgi.input'] = StringIO.StringIO(environ.pop('body'))
+    environ['wsgi.errors'] = sys.stderr
+    environ['wsgi.version'] = (1, 0)
+    environ['wsgi.multithread'] = False
+    environ['wsgi.multiprocess'] = True
+    return environ
+
+
+# The worker process: everything, z3 included, is created after the fork, so
+# nothing is shared with the server or the other workers.  Each response is
+# sent as its status and headers, then each chunk of its body as soon as the
+# app produces it, then the worker's max RSS, which marks the end.
+def _serve(connection, app_factory):
+    app = app_factory()
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+
+        def start_response(status, headers, exc_info=None):
+            connection.send((status, headers))
+
+        for chunk in app(_environ_from_request(request), start_response):
+            if chunk:
+                connection.send(chunk.encode('utf-8') if isinstance(chunk, unicode) else chunk)
+        # ru_maxrss is in kilobytes on linux.
+        connection.send(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def appengine_app():
+    import appengine_main
+    return appengine_main.app
+
+
+def _fork_worker(spawner_connection, app_factory):
+    server_connection, worker_connection = multiprocessing.Pipe()
+    pid = os.fork()
+    if pid:
+        worker_connection.close()
+        return pid, server_connection
+
+    spawner_connection.close()
+    server_connection.close()
+    exit_code = 1
+    try:
+        _serve(worker_connection, app_factory)
+        exit_code = 0
+    except:
+        traceback.print_exc()
+    finally:
+        os._exit(exit_code)
+
+
+def _wait_for_worker(pid, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if os.waitpid(pid, os.WNOHANG)[0]:
+            return
+        time.sleep(0.01)
+    os.kill(pid, signal.SIGTERM)
+    os.waitpid(pid, 0)
+
+
+# The spawner process, which forks every worker.  It is itself forked before
+# the server starts any threads, and stays single threaded, so no worker is
+# forked while another thread holds a lock (in CherryPy, logging, etc.)
+# which would never be released in the child.  The server's end of each
+# worker's pipe is sent back over the spawner's socket as a file descriptor.
+def _spawn_workers(connection, app_factory):
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        command, pid = message
+        if command == 'start':
+            pid, server_connection = _fork_worker(connection, app_factory)
+            connection.send(pid)
+            _multiprocessing.sendfd(connection.fileno(), server_connection.fileno())
+            server_connection.close()
+        elif command == 'stop':
+            _wait_for_worker(pid, 1)
+
+
+# The server's side of the spawner process.  Safe to use from any thread.
+class WorkerSpawner(object):
+    def __init__(self, app_factory):
+        self._lock = threading.Lock()
+        self._connection, spawner_connection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_spawn_workers, args=(spawner_connection, app_factory))
+        self._process.daemon = True
+        self._process.start()
+        spawner_connection.close()
+
+    # Returns the new worker's pid and a connection to it.
+    def start_worker(self):
+        with self._lock:
+            self._connection.send(('start', None))
+            pid = self._connection.recv()
+            handle = _multiprocessing.recvfd(self._connection.fileno())
+        return pid, _multiprocessing.Connection(handle)
+
+    # Waits a second for the worker to exit, then kills it.
+    def stop_worker(self, pid):
+        with self._lock:
+            self._connection.send(('stop', pid))
+
+    def stop(self):
+        with self._lock:
+            self._connection.send(None)
+            self._connection.close()
+        self._process.join()
+
+
+# One worker process, serving one request at a time.  Callers must hold lock
+# from start_response until they have read the body.  Once the worker has
+# served max_requests, grown past max_rss_kb or died, it is replaced by a
+# fresh process.  Replacing it means forking (via the spawner) and waiting
+# for the old process to exit, so it is done on its own thread, which swaps
+# in the new process once the worker is next free.  Until then, the old
+# process serves as usual (or, if it died, requests fail).
+class Worker(object):
+    FAILED_RESPONSE = ('500 Internal Server Error', [('Content-Type', 'text/plain')])
+
+    def __init__(self, spawner, max_requests, max_rss_kb):
+        self.spawner = spawner
+        self.max_requests = max_requests
+        self.max_rss_kb = max_rss_kb
+        self.lock = threading.Lock()
+        self.recycle_count = 0
+        self.request_count = 0
+        self._is_responding = False
+        self._recycle_thread = None
+        self.pid, self._connection = spawner.start_worker()
+
+    def _stop(self, pid, connection):
+        try:
+            connection.send(None)
+        except IOError:
+            pass
+        connection.close()
+        self.spawner.stop_worker(pid)
+
+    def _recycle(self):
+        pid, connection = self.spawner.start_worker()
+        with self.lock:
+            old_pid, old_connection = self.pid, self._connection
+            self.pid, self._connection = pid, connection
+            self.request_count = 0
+            self.recycle_count += 1
+        self._stop(old_pid, old_connection)
+
+    # Callers must hold lock.
+    def _recycle_later(self):
+        if self._recycle_thread and self._recycle_thread.is_alive():
+            return
+        self._recycle_thread = threading.Thread(target=self._recycle)
+        self._recycle_thread.daemon = True
+        self._recycle_thread.start()
+
+    def wait_for_recycle(self):
+        if self._recycle_thread:
+            self._recycle_thread.join()
+
+    def start_response(self, request):
+        try:
+            self._connection.send(request)
+            status, headers = self._connection.recv()
+        except (EOFError, IOError):
+            # The worker died (or was killed) mid-request.
+            self._recycle_later()
+            return self.FAILED_RESPONSE
+        self._is_responding = True
+        return status, headers
+
+    def _finish_response(self, max_rss_kb):
+        self._is_responding = False
+        self.request_count += 1
+        if self.request_count >= self.max_requests or max_rss_kb >= self.max_rss_kb:
+            self._recycle_later()
+
+    # The body of the response begun by start_response.  Whatever the caller
+    # does not read is still read (and dropped) by finish.
+    def body_chunks(self):
+        while self._is_responding:
+            try:
+                message = self._connection.recv()
+            except (EOFError, IOError):
+                self._is_responding = False
+                self._recycle_later()
+                return
+            if isinstance(message, str):
+                yield message
+            else:
+                self._finish_response(message)
+
+    def finish(self):
+        for _ in self.body_chunks():
+            pass
+
+    def stop(self):
+        self.wait_for_recycle()
+        with self.lock:
+            self._stop(self.pid, self._connection)
+
+
+# A WSGI app which hands each request to one of worker_count pre-forked worker
+# processes, each with its own z3 context, solver pool and caches, so one slow
+# request only ties up one worker.  Requests are sent to the worker chosen by
+# their auction's first few calls, which keeps that worker's history cache
+# hot, unless it is busy and another worker is idle.
+class WorkerPool(object):
+    AFFINITY_CALL_COUNT = 2
+
+    # Must be made before the server starts any threads.  See _spawn_workers.
+    # A worker which has bid all of test-sayc, with full caches, peaks at about
+    # 85MB, so max_rss_kb only recycles workers which have grown far past that.
+    # max_requests recycles well behaved workers too, so it is set high enough
+    # that their warm caches are rarely thrown away.
+    def __init__(self, worker_count, app_factory=appengine_app, max_requests=1000, max_rss_kb=1024 * 1024):
+        self.spawner = WorkerSpawner(app_factory)
+        self.workers = [Worker(self.spawner, max_requests, max_rss_kb) for _ in range(worker_count)]
+
+    def _affinity_key(self, environ):
+        query = urlparse.parse_qs(environ.get('QUERY_STRING', ''))
+        calls_string = query.get('calls_string', [''])[0]
+        calls = calls_string.replace(",", " ").split()
+        return " ".join(calls[:self.AFFINITY_CALL_COUNT])
+
+    def _acquire_worker(self, affinity_key):
+        preferred_index = hash(affinity_key) % len(self.workers)
+        for offset in range(len(self.workers)):
+            worker = self.workers[(preferred_index + offset) % len(self.workers)]
+            if worker.lock.acquire(False):
+                return worker
+        # Everyone is busy, wait for the worker with the hot cache.
+        worker = self.workers[preferred_index]
+        worker.lock.acquire()
+        return worker
+
+    def _body(self, worker):
+        try:
+            for chunk in worker.body_chunks():
+                yield chunk
+        finally:
+            worker.finish()
+            worker.lock.release()
+
+    def __call__(self, environ, start_response):
+        request = _request_from_environ(environ)
+        worker = self._acquire_worker(self._affinity_key(environ))
+        try:
+            status, headers = worker.start_response(request)
+        except:
+            worker.lock.release()
+            raise
+        start_response(status, headers)
+        return self._body(worker)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+        self.spawner.stop()
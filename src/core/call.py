@@ -19,13 +19,23 @@ def _values_between(start, stop, iterable):
         if value == stop:
             break
 
+NON_CONTRACT_NAMES = ('P', 'X', 'XX')
+# Pass, double, redouble and the 35 contracts.
+CALL_COUNT = len(NON_CONTRACT_NAMES) + 7 * 5
+
+
 # Call objects should be global singletons and thus immutable.
 class Call(object):
     def __init__(self, name):
         self.name = name.upper()
-        self.strain = None if self.name in ('P', 'X', 'XX') else Strain.from_char(self.name[1])
+        self.strain = None if self.name in NON_CONTRACT_NAMES else Strain.from_char(self.name[1])
         self.level = int(self.name[0]) if self.is_contract() else None
         self._validate()
+        # Calls are numbered densely in sort order: 'P', 'X', 'XX', '1C', ... '7N'.
+        if self.is_contract():
+            self.index = len(NON_CONTRACT_NAMES) + (self.level - 1) * len(STRAINS) + self.strain.index
+        else:
+            self.index = NON_CONTRACT_NAMES.index(self.name)
 
     LEVELS = (1, 2, 3, 4, 5, 6, 7)
 
@@ -40,17 +50,21 @@ class Call(object):
             assert len(self.name) == 2, "%s is not a valid call name" % self.name
             assert self.level in range(8) and self.strain in STRAINS
         else:
-            assert self.name in ('P', 'X', 'XX'), "%s is not a valid call name" % self.name
+            assert self.name in NON_CONTRACT_NAMES, "%s is not a valid call name" % self.name
 
     @classmethod
     @memoized
     def from_string(self, string):
         return Call(string)
 
+    @classmethod
+    def from_index(cls, index):
+        assert 0 <= index < CALL_COUNT, "%s is not a valid call index" % index
+        return ALL_CALLS[index]
+
     @classmethod
     def from_level_and_strain(self, level, strain):
-        # Use from_string to share the @memoized cache.
-        return Call.from_string("%s%s" % (level, strain.char))
+        return ALL_CALLS[len(NON_CONTRACT_NAMES) + (level - 1) * len(STRAINS) + strain.index]
 
     # This is an odd way of saying "not pass, not double, not redouble"
     def is_contract(self):
@@ -119,6 +133,37 @@ class Call(object):
         return list(_values_between(start_name, stop_name, cls.notrump_names()))
 
 
+# Every call, indexed by Call.index.  These are the same singletons
+# Call.from_string returns.
+ALL_CALLS = tuple(Call.from_string(name) for name in NON_CONTRACT_NAMES + tuple("%s%s" % (level, strain.char) for level in Call.LEVELS for strain in STRAINS))
+assert [call.index for call in ALL_CALLS] == range(CALL_COUNT)
+
+PASS_MASK = 1 << ALL_CALLS[0].index
+DOUBLE_MASK = 1 << ALL_CALLS[1].index
+REDOUBLE_MASK = 1 << ALL_CALLS[2].index
+# All contracts, and all contracts above each contract, indexed by Call.index.
+CONTRACTS_MASK = ((1 << CALL_COUNT) - 1) & ~(PASS_MASK | DOUBLE_MASK | REDOUBLE_MASK)
+CONTRACTS_ABOVE_MASKS = tuple(((1 << CALL_COUNT) - 1) & ~((1 << (index + 1)) - 1) for index in range(CALL_COUNT))
+
+
+# A set of calls as an integer, with bit call.index set for each call.
+def mask_for_calls(calls):
+    mask = 0
+    for call in calls:
+        mask |= 1 << call.index
+    return mask
+
+
+# The calls in mask, in Call.index order.
+def calls_in_mask(mask):
+    calls = []
+    while mask:
+        lowest_bit = mask & -mask
+        calls.append(ALL_CALLS[lowest_bit.bit_length() - 1])
+        mask ^= lowest_bit
+    return calls
+
+
 # This is a convenience for an old method of specifying calls.
 class Pass(Call):
     def __init__(self):
@@ -4,34 +4,15 @@
 
 import copy
 
-from core.call import Call
+from core.call import Call, calls_in_mask
 from core.callhistory import CallHistory
 from core.suit import *
 
 
 class CallExplorer(object):
+    # The legal calls over history, in Call.index order.
     def possible_calls_over(self, history):
-        if history.is_complete():
-            return
-
-        yield Call('P')
-
-        last_non_pass = history.last_non_pass()
-        caller = history.position_to_call()
-        if last_non_pass and history.last_to_not_pass() != caller.partner:
-            if last_non_pass.is_contract():
-                yield Call('X')
-            elif last_non_pass.is_double():
-                yield Call('XX')
-
-        last_contract = history.last_contract()
-        for level in range(1, 8):
-            if last_contract and level < last_contract.level:
-                continue
-            for strain in STRAINS:
-                if last_contract and level == last_contract.level and strain <= last_contract.strain:
-                    continue
-                yield Call.from_level_and_strain(level, strain)
+        return calls_in_mask(history.legal_call_mask())
 
     def possible_futures(self, history):
         future_history = copy.copy(history)
@@ -3,7 +3,7 @@
 # found in the LICENSE file.
 
 from core.position import *
-from core.call import Call
+from core.call import Call, CALL_COUNT, CONTRACTS_ABOVE_MASKS, CONTRACTS_MASK, DOUBLE_MASK, PASS_MASK, REDOUBLE_MASK
 from suit import SUITS
 
 import copy
@@ -68,8 +68,85 @@ class Vulnerability(object):
         return position.char in self.name
 
 
+# An auction packs into one integer with each call as a base 39 digit,
+# call.index + 1, the first call most significant.  No digit is zero, so
+# auctions of different lengths never share an integer.  Auctions of up to
+# MAX_PACKED_CALLS_IN_64_BITS calls fit in an unsigned 64 bit integer.
+PACKED_CALL_BASE = CALL_COUNT + 1
+MAX_PACKED_CALLS_IN_64_BITS = 12
+
+
+def extend_packed_calls(packed_calls, call):
+    return packed_calls * PACKED_CALL_BASE + call.index + 1
+
+
+def pack_calls(calls):
+    packed_calls = 0
+    for call in calls:
+        packed_calls = extend_packed_calls(packed_calls, call)
+    return packed_calls
+
+
+def unpack_calls(packed_calls):
+    calls = []
+    while packed_calls:
+        packed_calls, digit = divmod(packed_calls, PACKED_CALL_BASE)
+        calls.append(Call.from_index(digit - 1))
+    calls.reverse()
+    return calls
+
+
+# Bridge rules shared by CallHistory and CallSequence, written only in terms of
+# the accessors both provide.
+class _CallRules(object):
+    __slots__ = ()
+
+    def can_double(self):
+        # Make sure we haven't already doubled.
+        if not self.last_non_pass().is_contract():
+            return False
+        return not self.declarer().in_partnership_with(self.position_to_call())
+
+    def can_redouble(self):
+        if not self.last_non_pass().is_double():
+            return False
+        return self.declarer().in_partnership_with(self.position_to_call())
+
+    # The calls which could be made next, as a mask (see core.call.mask_for_calls).
+    # This may belong on a separate bridge-rules object?
+    def legal_call_mask(self):
+        if self.is_complete():
+            return 0
+        last_contract = self.last_contract()
+        if not last_contract:
+            return PASS_MASK | CONTRACTS_MASK
+        mask = PASS_MASK | CONTRACTS_ABOVE_MASKS[last_contract.index]
+        if self.can_double():
+            mask |= DOUBLE_MASK
+        elif self.can_redouble():
+            mask |= REDOUBLE_MASK
+        return mask
+
+    def is_legal_call(self, call):
+        assert not self.is_complete()
+        return bool(self.legal_call_mask() & (1 << call.index))
+
+    def contract(self):
+        # Maybe we need a Contract object which holds declarer, suit, level, and doubles?
+        last_contract = self.last_contract()
+        if last_contract:
+            last_non_pass = self.last_non_pass()
+            double_string = ''
+            if last_non_pass.is_double():
+                double_string = 'X'
+            elif last_non_pass.is_redouble():
+                double_string = 'XX'
+            return "%s%s" % (last_contract.name, double_string)
+        return None
+
+
 # FIXME: It's unclear if this class should expose just call_names or Call objects.
-class CallHistory(object):
+class CallHistory(_CallRules):
     @classmethod
     def _calls_from_calls_string(cls, calls_string):
         if not calls_string:
@@ -121,42 +198,12 @@ class CallHistory(object):
     def __len__(self):
         return len(self.calls)
 
-    def can_double(self):
-        # Make sure we haven't already doubled.
-        if not self.last_non_pass().is_contract():
-            return False
-        return not self.declarer().in_partnership_with(self.position_to_call())
-
-    def can_redouble(self):
-        if not self.last_non_pass().is_double():
-            return False
-        return self.declarer().in_partnership_with(self.position_to_call())
-
-    # This may belong on a separate bridge-rules object?
-    def is_legal_call(self, call):
-        assert not self.is_complete()
-        if call.is_pass():
-            return True
-        last_contract = self.last_contract()
-        if not last_contract:
-            return not call.is_double() and not call.is_redouble()
-        # Doubles do not have levels.
-        if call.level:
-            if last_contract.level > call.level:
-                return False
-            if last_contract.level == call.level and last_contract.strain >= call.strain:
-                return False
-        if call.is_double() and not self.can_double():
-            return False
-        if call.is_redouble() and not self.can_redouble():
-            return False
-        return True
-
     def copy_appending_call(self, call):
         assert call
         assert self.is_legal_call(call)
-        new_call_history = copy.deepcopy(self)
-        new_call_history.calls.append(call)
+        # Calls are singletons, so only the list needs copying.
+        new_call_history = copy.copy(self)
+        new_call_history.calls = self.calls + [call]
         return new_call_history
 
     def copy_with_partial_history(self, last_entry):
@@ -204,6 +251,10 @@ class CallHistory(object):
     def comma_separated_calls(self):
         return ",".join([call.name for call in self.calls])
 
+    @property
+    def packed_calls(self):
+        return pack_calls(self.calls)
+
     @property
     def last_call(self):
         if not self.calls:
@@ -305,21 +356,128 @@ class CallHistory(object):
     def dummy(self):
         return declarer.partner
 
-    def contract(self):
-        # Maybe we need a Contract object which holds declarer, suit, level, and doubles?
-        last_contract = self.last_contract()
-        if last_contract:
-            last_non_pass = self.last_non_pass()
-            double_string = ''
-            if last_non_pass.is_double():
-                double_string = 'X'
-            elif last_non_pass.is_redouble():
-                double_string = 'XX'
-            return "%s%s" % (last_contract.name, double_string)
-        return None
-
     def is_complete(self):
         return len(self.calls) > 3 and self.calls[-1].is_pass() and self.calls[-2].is_pass() and self.calls[-3].is_pass()
 
     def is_passout(self):
         return self.is_complete() and self.calls[-4].is_pass()
+
+
+# An immutable call history which shares all but its last call with the
+# history it extends, so extending one takes constant time and space.
+# Facts which CallHistory finds by scanning its calls are computed as each
+# call is added instead.
+class CallSequence(_CallRules):
+    __slots__ = ('previous', 'last_call', 'dealer', 'packed_calls', '_length', '_last_non_pass', '_last_to_not_pass',
+        '_last_contract', '_declarer', '_first_to_bid_strain', '_trailing_passes', '_legal_call_mask')
+
+    def __init__(self, dealer=None):
+        self.previous = None
+        self.last_call = None
+        self.dealer = dealer or NORTH
+        self.packed_calls = 0
+        self._length = 0
+        self._last_non_pass = None
+        self._last_to_not_pass = None
+        self._last_contract = None
+        self._declarer = None
+        # The first position in each partnership to bid each strain, indexed by
+        # partnership * 5 + strain.index.
+        self._first_to_bid_strain = (None,) * 10
+        self._trailing_passes = 0
+        self._legal_call_mask = None
+
+    @classmethod
+    def from_calls(cls, calls, dealer=None):
+        sequence = cls(dealer)
+        for call in calls:
+            sequence = sequence.extend(call)
+        return sequence
+
+    def extend(self, call):
+        assert call
+        sequence = CallSequence.__new__(CallSequence)
+        sequence.previous = self
+        sequence.last_call = call
+        sequence.dealer = self.dealer
+        sequence.packed_calls = extend_packed_calls(self.packed_calls, call)
+        sequence._length = self._length + 1
+        sequence._last_contract = self._last_contract
+        sequence._declarer = self._declarer
+        sequence._first_to_bid_strain = self._first_to_bid_strain
+        sequence._legal_call_mask = None
+        if call.is_pass():
+            sequence._last_non_pass = self._last_non_pass
+            sequence._last_to_not_pass = self._last_to_not_pass
+            sequence._trailing_passes = self._trailing_passes + 1
+            return sequence
+
+        caller = self.position_to_call()
+        sequence._last_non_pass = call
+        sequence._last_to_not_pass = caller
+        sequence._trailing_passes = 0
+        if call.is_contract():
+            index = caller.index % 2 * 5 + call.strain.index
+            first_to_bid_strain = self._first_to_bid_strain
+            if first_to_bid_strain[index] is None:
+                first_to_bid_strain = first_to_bid_strain[:index] + (caller,) + first_to_bid_strain[index + 1:]
+            sequence._last_contract = call
+            sequence._declarer = first_to_bid_strain[index]
+            sequence._first_to_bid_strain = first_to_bid_strain
+        return sequence
+
+    def __str__(self):
+        return self.calls_string()
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def calls(self):
+        calls = []
+        sequence = self
+        while sequence.previous is not None:
+            calls.append(sequence.last_call)
+            sequence = sequence.previous
+        calls.reverse()
+        return calls
+
+    def calls_string(self):
+        return " ".join([call.name for call in self.calls])
+
+    def comma_separated_calls(self):
+        return ",".join([call.name for call in self.calls])
+
+    @property
+    def last_to_call(self):
+        if not self._length:
+            return None
+        return self.dealer.position_after_n_calls(self._length - 1)
+
+    def last_non_pass(self):
+        return self._last_non_pass
+
+    def last_to_not_pass(self):
+        return self._last_to_not_pass
+
+    def last_contract(self):
+        return self._last_contract
+
+    def declarer(self):
+        return self._declarer
+
+    def position_to_call(self):
+        return self.dealer.position_after_n_calls(self._length)
+
+    def is_complete(self):
+        return self._length > 3 and self._trailing_passes >= 3
+
+    # Only computed once per sequence, from the state extend() keeps.
+    def legal_call_mask(self):
+        if self._legal_call_mask is None:
+            self._legal_call_mask = _CallRules.legal_call_mask(self)
+        return self._legal_call_mask
+
+    def is_passout(self):
+        # Only four passes from the start can end with four passes.
+        return self._trailing_passes >= 4
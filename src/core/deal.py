@@ -46,6 +46,17 @@ class Deal(object):
         # Deal takes strings, not hand objects, currently.
         return Deal(map(Hand.from_cdhs_string, hand_strings))
 
+    # PBN deals list the hands clockwise from the given position, e.g.
+    # "N:AK85.Q64.543.AT4 J64.AK932.8.K952 QT73.T7.QT96.J86 92.J85.AKJ72.Q73"
+    @classmethod
+    def from_pbn_string(cls, string):
+        first_position_char, hand_strings = string.strip().split(':')
+        first_position = Position.from_char(first_position_char.upper())
+        hands = [None for _ in POSITIONS]
+        for offset, hand_string in enumerate(hand_strings.split()):
+            hands[first_position.position_after_n_calls(offset).index] = Hand.from_shdc_string(hand_string)
+        return Deal(hands)
+
     @classmethod
     def from_hex_identifier(cls, identifier):
         hands = cls._empty_hands()
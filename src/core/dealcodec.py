@@ -0,0 +1,172 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+# Converts many deals at once between Deals, identifiers and "positions for
+# cards" matrices: one row per deal of the position index holding each card,
+# in card identifier order (see Card.identifier_for_card), as made by
+# DealGenerator.generate_positions_for_cards.
+#
+# Two identifier formats are supported:
+# - hex: Deal.identifier's 26 characters, two cards per hex digit.
+# - packed: 12 bytes per deal, the deal's index among all 52!/(13!^4) deals.
+#   The index is a mixed radix number of three combinadics, which cards of
+#   the 52 north holds, which of the remaining 39 east holds and which of the
+#   remaining 26 south holds.  Deals are packed back to back, big endian.
+
+from position import POSITIONS
+from suit import SUITS
+from card import Card
+from hand import Hand
+from deal import Deal
+
+import numpy
+
+
+PACKED_DEAL_SIZE = 12
+
+_HEX_CHARS = '0123456789abcdef'
+_HEX_CHAR_ARRAY = numpy.array(list(_HEX_CHARS), dtype='S1')
+# Indexed by a hex character's ord.  Anything else maps to _INVALID_HEX_DIGIT.
+_INVALID_HEX_DIGIT = 255
+_HEX_DIGIT_FOR_BYTE = numpy.full(256, _INVALID_HEX_DIGIT, dtype=numpy.uint8)
+_HEX_DIGIT_FOR_BYTE[numpy.frombuffer(_HEX_CHARS, dtype=numpy.uint8)] = numpy.arange(16)
+
+# _BINOMIALS[n, k] is n choose k, for the 13 card subsets of up to 52 cards.
+_BINOMIALS = numpy.zeros((53, 14), dtype=numpy.int64)
+_BINOMIALS[:, 0] = 1
+for _n in range(1, 53):
+    _BINOMIALS[_n, 1:] = _BINOMIALS[_n - 1, 1:] + _BINOMIALS[_n - 1, :-1]
+
+# The packed index is held as six 16-bit limbs (most significant first) in
+# uint64s, so a limb times a radix (at most 40 bits) plus a carry can't overflow.
+_LIMB_COUNT = PACKED_DEAL_SIZE / 2
+_LIMB_BITS = 16
+_LIMB_MASK = (1 << _LIMB_BITS) - 1
+
+
+def positions_for_deals(deals):
+    positions_for_cards = numpy.zeros((len(deals), 52), dtype=numpy.uint8)
+    for row, deal in enumerate(deals):
+        for position_index, hand in enumerate(deal.hands):
+            for suit in SUITS:
+                for card in hand.cards_in_suit(suit):
+                    positions_for_cards[row, Card.identifier_for_card(suit, card)] = position_index
+    return positions_for_cards
+
+
+_CARD_FOR_IDENTIFIER = [Card.suit_and_value_from_identifier(identifier) for identifier in range(52)]
+
+
+def deals_for_positions(positions_for_cards):
+    deals = []
+    for row in positions_for_cards:
+        hands = Deal._empty_hands()
+        for identifier, position_index in enumerate(row):
+            suit, card = _CARD_FOR_IDENTIFIER[identifier]
+            hands[position_index][suit.index] += card
+        deals.append(Deal(map(Hand, hands)))
+    return deals
+
+
+def hex_identifiers_for_positions(positions_for_cards):
+    positions_for_cards = numpy.asarray(positions_for_cards, dtype=numpy.uint8)
+    digits = positions_for_cards[:, 0::2] * 4 + positions_for_cards[:, 1::2]
+    characters = numpy.ascontiguousarray(_HEX_CHAR_ARRAY[digits])
+    return characters.view('S26').ravel().tolist()
+
+
+def positions_for_hex_identifiers(identifiers):
+    assert all(len(identifier) == 26 for identifier in identifiers), "Hex deal identifiers are 26 characters"
+    # Identifiers from json are unicode; non-ascii ones raise UnicodeError, a ValueError.
+    identifier_bytes = "".join(identifier.encode('ascii') for identifier in identifiers)
+    digits = _HEX_DIGIT_FOR_BYTE[numpy.frombuffer(identifier_bytes, dtype=numpy.uint8)].reshape(len(identifiers), 26)
+    if (digits == _INVALID_HEX_DIGIT).any():
+        raise ValueError("Invalid hex deal identifier in %s" % identifiers)
+    positions_for_cards = numpy.empty((len(identifiers), 52), dtype=numpy.uint8)
+    positions_for_cards[:, 0::2] = digits >> 2
+    positions_for_cards[:, 1::2] = digits & 3
+    return positions_for_cards
+
+
+# The colex rank of the 13 cards held by position_index among the cards held
+# by it or any later position, for each deal.
+def _combinadic_ranks(positions_for_cards, position_index):
+    remaining = positions_for_cards >= position_index
+    held = positions_for_cards == position_index
+    # Where each card falls among the remaining cards, and among the held ones.
+    remaining_indices = numpy.cumsum(remaining, axis=1) - 1
+    held_counts = numpy.cumsum(held, axis=1)
+    return numpy.where(held, _BINOMIALS[remaining_indices.clip(0), held_counts], 0).sum(axis=1)
+
+
+def _multiply_add(limbs, radix, addend):
+    carry = addend.astype(numpy.uint64)
+    for limb_index in reversed(range(_LIMB_COUNT)):
+        value = limbs[:, limb_index] * numpy.uint64(radix) + carry
+        limbs[:, limb_index] = value & numpy.uint64(_LIMB_MASK)
+        carry = value >> numpy.uint64(_LIMB_BITS)
+
+
+def _divide(limbs, divisor):
+    remainder = numpy.zeros(len(limbs), dtype=numpy.uint64)
+    for limb_index in range(_LIMB_COUNT):
+        value = (remainder << numpy.uint64(_LIMB_BITS)) | limbs[:, limb_index]
+        limbs[:, limb_index] = value // numpy.uint64(divisor)
+        remainder = value % numpy.uint64(divisor)
+    return remainder.astype(numpy.int64)
+
+
+# The radix of each position's rank: how many ways it can hold 13 of the
+# cards not held by earlier positions.  West's hand is whatever is left.
+_RADICES = [_BINOMIALS[52 - 13 * position_index, 13] for position_index in range(3)]
+
+
+def packed_identifiers_for_positions(positions_for_cards):
+    positions_for_cards = numpy.asarray(positions_for_cards, dtype=numpy.uint8)
+    limbs = numpy.zeros((len(positions_for_cards), _LIMB_COUNT), dtype=numpy.uint64)
+    for position_index, radix in enumerate(_RADICES):
+        _multiply_add(limbs, radix, _combinadic_ranks(positions_for_cards, position_index))
+    return limbs.astype(">u2").tobytes()
+
+
+def positions_for_packed_identifiers(packed):
+    assert len(packed) % PACKED_DEAL_SIZE == 0, "Packed deals are %s bytes each" % PACKED_DEAL_SIZE
+    count = len(packed) / PACKED_DEAL_SIZE
+    limbs = numpy.frombuffer(packed, dtype='>u2').reshape(count, _LIMB_COUNT).astype(numpy.uint64)
+    ranks = [None for _ in _RADICES]
+    for position_index in reversed(range(len(_RADICES))):
+        ranks[position_index] = _divide(limbs, _RADICES[position_index])
+
+    rows = numpy.arange(count)[:, numpy.newaxis]
+    positions_for_cards = numpy.empty((count, 52), dtype=numpy.uint8)
+    # The cards not yet dealt, in identifier order, for every deal.
+    remaining_cards = numpy.tile(numpy.arange(52), (count, 1))
+    for position_index, rank in enumerate(ranks):
+        remaining_count = remaining_cards.shape[1]
+        held = numpy.zeros((count, remaining_count), dtype=bool)
+        # Unranking a combinadic finds the highest card first.
+        for held_count in reversed(range(1, 14)):
+            remaining_index = numpy.searchsorted(_BINOMIALS[:remaining_count, held_count], rank, side='right') - 1
+            rank = rank - _BINOMIALS[remaining_index, held_count]
+            held[rows[:, 0], remaining_index] = True
+        positions_for_cards[rows, remaining_cards[held].reshape(count, 13)] = position_index
+        remaining_cards = remaining_cards[~held].reshape(count, remaining_count - 13)
+    positions_for_cards[rows, remaining_cards] = len(POSITIONS) - 1
+    return positions_for_cards
+
+
+def hex_identifiers_for_deals(deals):
+    return hex_identifiers_for_positions(positions_for_deals(deals))
+
+
+def deals_for_hex_identifiers(identifiers):
+    return deals_for_positions(positions_for_hex_identifiers(identifiers))
+
+
+def packed_identifiers_for_deals(deals):
+    return packed_identifiers_for_positions(positions_for_deals(deals))
+
+
+def deals_for_packed_identifiers(packed):
+    return deals_for_positions(positions_for_packed_identifiers(packed))
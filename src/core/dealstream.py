@@ -0,0 +1,72 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+from board import Board
+import dealcodec
+
+import numpy
+
+
+# One batch of a DealStream, as a dealcodec "positions for cards" matrix.
+# Deals, boards and identifiers are only built when asked for.
+class DealBatch(object):
+    def __init__(self, seed, substream, index, positions_for_cards, board_numbers):
+        self.seed = seed
+        self.substream = substream
+        self.index = index
+        self.positions_for_cards = positions_for_cards
+        self.board_numbers = board_numbers
+
+    def __len__(self):
+        return len(self.positions_for_cards)
+
+    # A count x 52 matrix of which cards position holds in each deal.
+    def cards_held_by(self, position):
+        return self.positions_for_cards == position.index
+
+    def deal(self, row):
+        return dealcodec.deals_for_positions(self.positions_for_cards[row:row + 1])[0]
+
+    def deals(self):
+        return dealcodec.deals_for_positions(self.positions_for_cards)
+
+    def boards(self):
+        return [Board(int(number), deal) for number, deal in zip(self.board_numbers, self.deals())]
+
+    def hex_identifiers(self):
+        return dealcodec.hex_identifiers_for_positions(self.positions_for_cards)
+
+
+# An endless, reproducible stream of uniformly random deals (and board
+# numbers), made batch_size at a time.  Every batch has its own RandomState,
+# seeded from (seed, substream, batch index), so any batch can be replayed on
+# its own, and processes given different substreams of the same seed never
+# deal the same boards.
+class DealStream(object):
+    DEFAULT_BATCH_SIZE = 1000
+    # Card order within a shuffled deck -> the position it is dealt to.
+    _POSITION_FOR_DEALT_CARD = numpy.arange(52, dtype=numpy.uint8) / 13
+
+    def __init__(self, seed, substream=0, batch_size=DEFAULT_BATCH_SIZE):
+        self.seed = seed
+        self.substream = substream
+        self.batch_size = batch_size
+
+    @classmethod
+    def random_seed(cls):
+        return numpy.random.randint(1 << 31)
+
+    def batch(self, index):
+        random_state = numpy.random.RandomState([self.seed, self.substream, index])
+        shuffled_cards = random_state.rand(self.batch_size, 52).argsort(axis=1)
+        positions_for_cards = numpy.empty((self.batch_size, 52), dtype=numpy.uint8)
+        positions_for_cards[numpy.arange(self.batch_size)[:, numpy.newaxis], shuffled_cards] = self._POSITION_FOR_DEALT_CARD
+        board_numbers = random_state.randint(1, 17, size=self.batch_size)
+        return DealBatch(self.seed, self.substream, index, positions_for_cards, board_numbers)
+
+    def batches(self, first_index=0):
+        index = first_index
+        while True:
+            yield self.batch(index)
+            index += 1
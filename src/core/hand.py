@@ -47,6 +47,11 @@ class Hand(object):
     def from_cdhs_string(cls, string):
         return Hand(string.split('.'))
 
+    # See shdc_dot_string.  PBN allows '-' for a void.
+    @classmethod
+    def from_shdc_string(cls, string):
+        return Hand(list(reversed(string.replace('-', '').split('.'))))
+
     def high_card_points(self):
         return sum(map(Card.high_card_points, itertools.chain(*self.cards_by_suit_index)))
 
@@ -0,0 +1,225 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+from suit import *
+from card import Card
+from hand import Hand
+
+
+SUIT_MASK_COUNT = 1 << 13
+
+
+# A Hand holding only cards in clubs, which is all Hand needs to evaluate a
+# single suit.  It skips Hand._validate, as it doesn't hold 13 cards.
+def _hand_with_clubs(cards):
+    hand = Hand.__new__(Hand)
+    hand.cards_by_suit_index = [cards, '', '', '']
+    return hand
+
+
+def _cards_for_mask(mask):
+    return "".join(Card.card_for_index(index) for index in reversed(range(13)) if mask & (1 << index))
+
+
+def _stopper_round(hand):
+    stopper_checks = (hand.has_first_round_stopper, hand.has_second_round_stopper, hand.has_third_round_stopper, hand.has_fourth_round_stopper)
+    for round_index, has_stopper in enumerate(stopper_checks):
+        if has_stopper(CLUBS):
+            return round_index + 1
+    return None
+
+
+# Everything PackedHand knows about a suit, indexed by the suit's mask.  The
+# tables are filled in by Hand's own methods, so the two can't disagree.
+_CARDS = []
+_LENGTHS = []
+_HIGH_CARD_POINTS = []
+_CONTROL_COUNTS = []
+_ACE_COUNTS = []
+_KING_COUNTS = []
+_STOPPER_ROUNDS = []
+_RUNNABILITIES = []
+_NON_WORKING_HONOR_ADJUSTMENTS = []
+
+
+def _fill_tables():
+    for mask in range(SUIT_MASK_COUNT):
+        cards = _cards_for_mask(mask)
+        hand = _hand_with_clubs(cards)
+        _CARDS.append(cards)
+        _LENGTHS.append(len(cards))
+        _HIGH_CARD_POINTS.append(hand.hcp_in_suit(CLUBS))
+        _CONTROL_COUNTS.append(hand.control_count())
+        _ACE_COUNTS.append(hand.ace_count())
+        _KING_COUNTS.append(hand.king_count())
+        _STOPPER_ROUNDS.append(_stopper_round(hand))
+        _RUNNABILITIES.append(hand._runnability(CLUBS))
+        # Any trump other than clubs.
+        _NON_WORKING_HONOR_ADJUSTMENTS.append(hand._support_point_adjustment_for_non_working_honors(SPADES))
+
+
+_fill_tables()
+
+
+# The same hand as Hand, as one 13-bit mask per suit (bit n is the card with
+# Card index n), with per-suit evaluation looked up in tables rather than
+# computed from strings.  Unlike Hand, PackedHands are immutable.
+class PackedHand(object):
+    __slots__ = ('suit_masks',)
+
+    def __init__(self, suit_masks):
+        self.suit_masks = tuple(suit_masks)
+        assert sum(_LENGTHS[mask] for mask in self.suit_masks) == 13, self.suit_masks
+
+    @classmethod
+    def from_hand(cls, hand):
+        return cls([sum(1 << Card.index_for_card(card) for card in hand.cards_in_suit(suit)) for suit in SUITS])
+
+    # See Card.identifier_for_card.
+    @classmethod
+    def from_card_identifiers(cls, identifiers):
+        suit_masks = [0, 0, 0, 0]
+        for identifier in identifiers:
+            suit_masks[identifier / 13] |= 1 << (identifier % 13)
+        return cls(suit_masks)
+
+    @classmethod
+    def from_cdhs_string(cls, string):
+        return cls.from_hand(Hand.from_cdhs_string(string))
+
+    def to_hand(self):
+        return Hand(map(self.cards_in_suit, SUITS))
+
+    def card_identifiers(self):
+        return [suit_index * 13 + index for suit_index, mask in enumerate(self.suit_masks) for index in range(13) if mask & (1 << index)]
+
+    def shdc_dot_string(self):
+        return '.'.join(map(self.cards_in_suit, (SPADES, HEARTS, DIAMONDS, CLUBS)))
+
+    def cdhs_dot_string(self):
+        return '.'.join(map(self.cards_in_suit, (CLUBS, DIAMONDS, HEARTS, SPADES)))
+
+    def __eq__(self, other):
+        return isinstance(other, PackedHand) and self.suit_masks == other.suit_masks
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.suit_masks)
+
+    def high_card_points(self):
+        masks = self.suit_masks
+        return _HIGH_CARD_POINTS[masks[0]] + _HIGH_CARD_POINTS[masks[1]] + _HIGH_CARD_POINTS[masks[2]] + _HIGH_CARD_POINTS[masks[3]]
+
+    def hcp_in_suit(self, suit):
+        return _HIGH_CARD_POINTS[self.suit_masks[suit.index]]
+
+    def cards_in_suit(self, suit):
+        return _CARDS[self.suit_masks[suit.index]]
+
+    def high_card_in_suit(self, suit):
+        return _CARDS[self.suit_masks[suit.index]][0]
+
+    def ace_count(self):
+        return sum(_ACE_COUNTS[mask] for mask in self.suit_masks)
+
+    def king_count(self):
+        return sum(_KING_COUNTS[mask] for mask in self.suit_masks)
+
+    def has_at_least(self, count, cards, suit):
+        cards_mask = sum(1 << Card.index_for_card(card) for card in set(cards))
+        return _LENGTHS[self.suit_masks[suit.index] & cards_mask] >= count
+
+    def _has_stopper_by_round(self, suit, round_number):
+        stopper_round = _STOPPER_ROUNDS[self.suit_masks[suit.index]]
+        return stopper_round is not None and stopper_round <= round_number
+
+    def has_first_round_stopper(self, suit):
+        return self._has_stopper_by_round(suit, 1)
+
+    def has_second_round_stopper(self, suit):
+        return self._has_stopper_by_round(suit, 2)
+
+    def has_third_round_stopper(self, suit):
+        return self._has_stopper_by_round(suit, 3)
+
+    def has_fourth_round_stopper(self, suit):
+        return self._has_stopper_by_round(suit, 4)
+
+    def length_of_suit(self, suit):
+        return _LENGTHS[self.suit_masks[suit.index]]
+
+    def is_longest_suit(self, suit, except_suits=None):
+        except_suits = except_suits or ()
+        if suit in except_suits:
+            return False
+        length = self.length_of_suit(suit)
+        return all(self.length_of_suit(other_suit) <= length for other_suit in SUITS if other_suit not in except_suits)
+
+    def suit_lengths(self):
+        return [_LENGTHS[mask] for mask in self.suit_masks]
+
+    def longest_suits(self):
+        lengths = self.suit_lengths()
+        longest_suit_length = max(lengths)
+        return [suit for suit in SUITS if lengths[suit.index] == longest_suit_length]
+
+    def length_points(self):
+        return self.high_card_points() + sum(max(length - 4, 0) for length in self.suit_lengths())
+
+    def _runnability(self, suit):
+        return _RUNNABILITIES[self.suit_masks[suit.index]]
+
+    # See Hand.tricks.
+    def tricks(self, partner_min_lengths):
+        tricks = 0
+        for suit in SUITS:
+            length = self.length_of_suit(suit)
+            adverse_holding = 13 - length - partner_min_lengths[suit.index]
+            adverse_holding_per_hand = adverse_holding / 2
+
+            fast_winners, slow_winners = self._runnability(suit)
+            if fast_winners >= adverse_holding_per_hand:
+                tricks += length
+            elif slow_winners >= adverse_holding_per_hand:
+                tricks += length - 1
+            else:
+                tricks += slow_winners
+        return tricks
+
+    def control_count(self):
+        return sum(_CONTROL_COUNTS[mask] for mask in self.suit_masks)
+
+    def _support_point_adjustment_for_non_working_honors(self, trump):
+        return sum(_NON_WORKING_HONOR_ADJUSTMENTS[mask] for suit_index, mask in enumerate(self.suit_masks) if suit_index != trump.index)
+
+    # See Hand.support_points.
+    def support_points(self, trump):
+        assert trump in SUITS, "support_points only makes sense for suited contracts"
+        lengths = self.suit_lengths()
+        trump_length = lengths[trump.index]
+        if trump_length < 3:
+            return self.length_points()
+
+        short_suit_points = (3, 2, 1) if trump_length < 4 else (5, 3, 1)
+        support_bonus = sum(short_suit_points[length] for suit_index, length in enumerate(lengths) if suit_index != trump.index and length < 3)
+        support_bonus += self._support_point_adjustment_for_non_working_honors(trump)
+        return support_bonus + self.high_card_points()
+
+    def generic_support_points(self):
+        return self.support_points(self.longest_suits()[0])
+
+    def is_balanced(self):
+        lengths = self.suit_lengths()
+        return min(lengths) >= 2 and max(lengths) <= 5 and lengths.count(2) < 2
+
+    def is_flat(self):
+        return sorted(self.suit_lengths()) == [3, 3, 3, 4]
+
+    def __repr__(self):
+        return "PackedHand(%s)" % self.cdhs_dot_string()
+
+    def pretty_one_line(self):
+        return "%s (hcp: %s lp: %s sp: %s)" % (self.cdhs_dot_string(), self.high_card_points(), self.length_points(), self.generic_support_points())
@@ -4,7 +4,7 @@
 
 import unittest2
 
-from core.call import Call
+from core.call import Call, ALL_CALLS, CALL_COUNT, calls_in_mask, mask_for_calls
 
 
 class CallTest(unittest2.TestCase):
@@ -29,3 +29,21 @@ class CallTest(unittest2.TestCase):
         self.assertEqual(list(Call.suited_names_between('2D', '4H')), ['2D', '2H', '2S', '3C', '3D', '3H', '3S', '4C', '4D', '4H'])
         self.assertEqual(list(Call.notrump_names_between('1N', '7N')), ['1N', '2N', '3N', '4N', '5N', '6N', '7N'])
         self.assertEqual(list(Call.notrump_names_between('3N', '5N')), ['3N', '4N', '5N'])
+
+    def test_index(self):
+        self.assertEqual(Call('P').index, 0)
+        self.assertEqual(Call('XX').index, 2)
+        self.assertEqual(Call('1C').index, 3)
+        self.assertEqual(Call('7N').index, CALL_COUNT - 1)
+        calls = map(Call.from_index, range(CALL_COUNT))
+        self.assertEqual(calls, sorted(calls))
+        self.assertEqual([call.index for call in calls], range(CALL_COUNT))
+
+    def test_masks(self):
+        self.assertEqual(len(ALL_CALLS), CALL_COUNT)
+        self.assertIs(Call.from_string('3N'), ALL_CALLS[Call('3N').index])
+        calls = map(Call.from_string, ['XX', '1C', '7N', 'P'])
+        mask = mask_for_calls(calls)
+        self.assertEqual(mask, 1 << 0 | 1 << 2 | 1 << 3 | 1 << 37)
+        self.assertEqual(calls_in_mask(mask), sorted(calls))
+        self.assertEqual(calls_in_mask(0), [])
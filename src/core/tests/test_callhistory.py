@@ -3,8 +3,8 @@
 # found in the LICENSE file.
 
 import unittest2
-from core.call import Call
-from core.callhistory import CallHistory, Vulnerability
+from core.call import Call, calls_in_mask
+from core.callhistory import CallHistory, CallSequence, Vulnerability, unpack_calls
 from core.position import *
 from core.suit import *
 
@@ -131,11 +131,80 @@ class CallHistoryTest(unittest2.TestCase):
         self._assert_is_legal_call("1N X", "XX", True)
         self._assert_is_legal_call("P 1D 2S P", "X", False)
 
+    def test_legal_call_mask(self):
+        legal_call_names = lambda history_string: [call.name for call in calls_in_mask(CallHistory.from_string(history_string).legal_call_mask())]
+        self.assertEquals(len(legal_call_names("")), 36)
+        self.assertEquals(legal_call_names("7S"), ["P", "X", "7N"])
+        self.assertEquals(legal_call_names("7S X"), ["P", "XX", "7N"])
+        self.assertEquals(legal_call_names("7S P"), ["P", "7N"])
+        self.assertEquals(legal_call_names("7N P P"), ["P", "X"])
+        self.assertEquals(legal_call_names("1C P P P"), [])
+
+    def test_packed_calls(self):
+        self.assertEquals(CallHistory.from_string("").packed_calls, 0)
+        self.assertEquals(CallHistory.from_string("P").packed_calls, 1)
+        self.assertEquals(CallHistory.from_string("1C").packed_calls, 4)
+        self.assertEquals(CallHistory.from_string("P 1C").packed_calls, 1 * 39 + 4)
+        self.assertNotEquals(CallHistory.from_string("P P").packed_calls, CallHistory.from_string("X").packed_calls)
+        for history_string in ("", "P", "1N P 2C", "1H P 2H P 2S P 4H X P P XX", "7N X XX P P P"):
+            call_history = CallHistory.from_string(history_string)
+            self.assertEquals(unpack_calls(call_history.packed_calls), call_history.calls)
+        self.assertTrue(CallHistory.from_string("7N X XX P P P 7N X XX P P P").packed_calls < 2 ** 64)
+
     def test_empty_for_board_number(self):
         self.assertEquals(CallHistory.empty_for_board_number(1).dealer, NORTH)
         self.assertEquals(CallHistory.empty_for_board_number(6).dealer, EAST)
         self.assertEquals(CallHistory.empty_for_board_number(16).dealer, WEST)
 
 
+class CallSequenceTest(unittest2.TestCase):
+    def _sequence(self, history_string, dealer=NORTH):
+        return CallSequence.from_calls(CallHistory.from_string(history_string).calls, dealer)
+
+    def test_extend_shares_previous(self):
+        sequence = self._sequence("1N P")
+        extended = sequence.extend(Call.from_string("2C"))
+        self.assertIs(extended.previous, sequence)
+        self.assertEquals(sequence.calls_string(), "1N P")
+        self.assertEquals(extended.calls_string(), "1N P 2C")
+        self.assertEquals(len(extended), 3)
+
+    def test_matches_call_history(self):
+        history_strings = [
+            "",
+            "P",
+            "P P P P",
+            "P 1N P P P",
+            "1C P 1S",
+            "1C P 2C X",
+            "1C X XX P",
+            "P 1C P 1D P",
+            "1S 2H 2S",
+            "1S 2H 2S P P 3H",
+            "1H P 2H P 2S P 4H X P P XX",
+        ]
+        for dealer in POSITIONS:
+            for history_string in history_strings:
+                call_history = CallHistory.from_string(history_string, dealer.char)
+                sequence = self._sequence(history_string, dealer)
+                self.assertEquals(sequence.calls, call_history.calls)
+                self.assertEquals(sequence.declarer(), call_history.declarer())
+                self.assertEquals(sequence.last_contract(), call_history.last_contract())
+                self.assertEquals(sequence.last_non_pass(), call_history.last_non_pass())
+                self.assertEquals(sequence.last_to_not_pass(), call_history.last_to_not_pass())
+                self.assertEquals(sequence.last_to_call, call_history.last_to_call)
+                self.assertEquals(sequence.position_to_call(), call_history.position_to_call())
+                self.assertEquals(sequence.contract(), call_history.contract())
+                self.assertEquals(sequence.is_complete(), call_history.is_complete())
+                self.assertEquals(sequence.is_passout(), call_history.is_passout())
+                self.assertEquals(sequence.packed_calls, call_history.packed_calls)
+                if call_history.is_complete():
+                    continue
+                self.assertEquals(sequence.legal_call_mask(), call_history.legal_call_mask())
+                for call_name in ("P", "X", "XX", "1C", "2H", "4N", "7N"):
+                    call = Call.from_string(call_name)
+                    self.assertEquals(sequence.is_legal_call(call), call_history.is_legal_call(call))
+
+
 if __name__ == '__main__':
     unittest2.main()
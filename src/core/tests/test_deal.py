@@ -3,7 +3,9 @@
 # found in the LICENSE file.
 
 import unittest2
+from core import dealcodec
 from core.deal import Deal
+from core.position import *
 
 
 class DealTest(unittest2.TestCase):
@@ -12,6 +14,37 @@ class DealTest(unittest2.TestCase):
         self.assertEquals(deal.identifier, '0000001555555aaaaaabffffff')
         self.assertEquals(deal.pretty_one_line(), Deal.from_identifier(deal.identifier).pretty_one_line())
 
+    def test_from_pbn_string(self):
+        deal = Deal.from_pbn_string("S:AK85.Q64.543.AT4 J64.AK932.8.K952 QT73.T7.QT96.J86 92.J85.AKJ72.Q73")
+        self.assertEquals(deal.hand_for(SOUTH).cdhs_dot_string(), "AT4.543.Q64.AK85")
+        self.assertEquals(deal.hand_for(WEST).cdhs_dot_string(), "K952.8.AK932.J64")
+        self.assertEquals(deal.hand_for(EAST).cdhs_dot_string(), "Q73.AKJ72.J85.92")
+        deal = Deal.from_pbn_string("n:AKQJT98765432.-.-.- -.AKQJT98765432.-.- -.-.AKQJT98765432.- -.-.-.AKQJT98765432")
+        self.assertEquals(deal.hand_for(NORTH).cdhs_dot_string(), "...AKQJT98765432")
+
+    def test_codec(self):
+        deals = [Deal.random() for _ in range(20)]
+        deals.append(Deal.from_string("23456789TJQKA... .23456789TJQKA.. ..23456789TJQKA. ...23456789TJQKA"))
+        identifiers = [deal.identifier for deal in deals]
+        self.assertEquals(dealcodec.hex_identifiers_for_deals(deals), identifiers)
+        self.assertEquals([deal.identifier for deal in dealcodec.deals_for_hex_identifiers(identifiers)], identifiers)
+
+        packed = dealcodec.packed_identifiers_for_deals(deals)
+        self.assertEquals(len(packed), dealcodec.PACKED_DEAL_SIZE * len(deals))
+        self.assertEquals([deal.identifier for deal in dealcodec.deals_for_packed_identifiers(packed)], identifiers)
+        # North holds the lowest ranked 13 cards, east the next, and so on.
+        self.assertEquals(packed[-dealcodec.PACKED_DEAL_SIZE:], '\x00' * dealcodec.PACKED_DEAL_SIZE)
+
+    def test_hex_codec_input(self):
+        identifier = '0000001555555aaaaaabffffff'
+        positions_for_cards = dealcodec.positions_for_hex_identifiers([identifier])
+        self.assertEquals(dealcodec.positions_for_hex_identifiers([unicode(identifier)]).tolist(), positions_for_cards.tolist())
+        self.assertEquals(dealcodec.deals_for_hex_identifiers([u'0000001555555aaaaaabffffff'])[0].identifier, identifier)
+        # Deal.from_hex_identifier only accepts lower case, too.
+        self.assertRaises(ValueError, dealcodec.positions_for_hex_identifiers, [identifier, '0000001555555AAAAAABFFFFFF'])
+        self.assertRaises(ValueError, dealcodec.positions_for_hex_identifiers, ['0000001555555aaaaaabfffffg'])
+        self.assertRaises(ValueError, dealcodec.positions_for_hex_identifiers, [u'0000001555555aaaaaabfffff\xe9'])
+
     def test_random(self):
         # Just make sure the random code path does not assert, and returns something non-None.
         self.assertTrue(bool(Deal.random()))
@@ -0,0 +1,28 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest2
+from core.dealstream import DealStream
+from core.position import *
+
+
+class DealStreamTest(unittest2.TestCase):
+    def test_batches_are_reproducible(self):
+        batch = DealStream(1234, batch_size=50).batch(2)
+        self.assertEquals(DealStream(1234, batch_size=50).batch(2).hex_identifiers(), batch.hex_identifiers())
+        self.assertNotEquals(DealStream(1234, batch_size=50).batch(3).hex_identifiers(), batch.hex_identifiers())
+        self.assertNotEquals(DealStream(1234, substream=1, batch_size=50).batch(2).hex_identifiers(), batch.hex_identifiers())
+
+    def test_batch(self):
+        batch = DealStream(1234, batch_size=50).batch(0)
+        self.assertEquals(len(batch), 50)
+        self.assertTrue((batch.cards_held_by(NORTH).sum(axis=1) == 13).all())
+        deals = batch.deals()
+        self.assertEquals([deal.identifier for deal in deals], batch.hex_identifiers())
+        self.assertEquals(batch.deal(7).identifier, deals[7].identifier)
+        self.assertTrue(all(1 <= board.number <= 16 for board in batch.boards()))
+
+
+if __name__ == '__main__':
+    unittest2.main()
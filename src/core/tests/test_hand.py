@@ -78,6 +78,7 @@ class HandTest(unittest2.TestCase):
         hand = Hand.from_cdhs_string(cdhs_dot_string)
         self.assertEquals(hand.cdhs_dot_string(), cdhs_dot_string)
         self.assertEquals(hand.shdc_dot_string(), "54.J9743.J.AKJ52")
+        self.assertEquals(Hand.from_shdc_string(hand.shdc_dot_string()).cdhs_dot_string(), cdhs_dot_string)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,40 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest2
+from core.hand import Hand
+from core.packedhand import PackedHand
+from core.suit import *
+
+
+class PackedHandTest(unittest2.TestCase):
+    def test_round_trip(self):
+        cdhs_dot_string = "AKJ52..J9743.J54"
+        hand = PackedHand.from_cdhs_string(cdhs_dot_string)
+        self.assertEquals(hand.cdhs_dot_string(), cdhs_dot_string)
+        self.assertEquals(hand.to_hand().cdhs_dot_string(), cdhs_dot_string)
+        self.assertEquals(PackedHand.from_card_identifiers(hand.card_identifiers()), hand)
+        self.assertEquals(hand.suit_masks[DIAMONDS.index], 0)
+        # Bit 12 is the ace, bit 0 the two.
+        self.assertEquals(hand.suit_masks[CLUBS.index], (1 << 12) | (1 << 11) | (1 << 9) | (1 << 3) | (1 << 0))
+
+    def test_matches_hand(self):
+        for hand_string in ("AKJ52.J.J9743.54", "AKJ52..J9743.J54", "732.Q32.AJ8.AKJ9", "T765.QJ2.KQ.A842"):
+            hand = Hand.from_cdhs_string(hand_string)
+            packed_hand = PackedHand.from_hand(hand)
+            self.assertEquals(packed_hand.high_card_points(), hand.high_card_points())
+            self.assertEquals(packed_hand.length_points(), hand.length_points())
+            self.assertEquals(packed_hand.control_count(), hand.control_count())
+            self.assertEquals(packed_hand.generic_support_points(), hand.generic_support_points())
+            self.assertEquals(packed_hand.is_balanced(), hand.is_balanced())
+            self.assertEquals(packed_hand.tricks([0, 1, 2, 3]), hand.tricks([0, 1, 2, 3]))
+            for suit in SUITS:
+                self.assertEquals(packed_hand.support_points(suit), hand.support_points(suit))
+                self.assertEquals(packed_hand.has_second_round_stopper(suit), hand.has_second_round_stopper(suit))
+                self.assertEquals(packed_hand.has_fourth_round_stopper(suit), hand.has_fourth_round_stopper(suit))
+                self.assertEquals(packed_hand.has_at_least(2, "AKQ", suit), hand.has_at_least(2, "AKQ", suit))
+
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -5,6 +5,7 @@
 import itertools
 import logging
 import multiprocessing
+import Queue
 import sys
 import traceback
 import unittest2
@@ -190,11 +191,21 @@ class ResultsAggregator(object):
         print "Pass %s (%.1f%%) of %s total hands" % (total_pass, percent, total_tests)
 
 
+# Each process makes one bidder, and keeps it (and its caches) for every test.
+_bidder = None
+
+
+def _default_bidder():
+    global _bidder
+    if not _bidder:
+        _bidder = BidderFactory.default_bidder()
+    return _bidder
+
+
 # Pickle gets mad at us if we make this a member or even static function.
 # This call is executed in a different process when running tests in parallel.
 def _run_test(test):
-    # FIXME: There is no need to lookup the bidder every time.
-    bidder = BidderFactory.default_bidder()
+    bidder = _default_bidder()
     result = TestResult()
     result.test = test
     # FIXME: OutputCapture captures logging channels as well which is probably a waste.
@@ -217,9 +228,81 @@ def _run_test(test):
     return result
 
 
+# Tests whose auctions start with the same calls share most of the histories
+# (and call selections) the bidder builds, so they are grouped together and
+# each group is run by a single worker, in auction order.
+AFFINITY_CALL_COUNT = 2
+
+
+def _affinity_key(test):
+    return tuple(call.index for call in test.call_history.calls[:AFFINITY_CALL_COUNT])
+
+
+def _auction_order_key(test):
+    return tuple(call.index for call in test.call_history.calls)
+
+
+# Splits tests into affinity groups, and deals them out to worker_count
+# workers.  Each group is one job, so a worker's caches stay warm across the
+# whole group.  Largest groups go first, each to the worker with the fewest
+# tests so far.
+def _jobs_by_worker(tests, worker_count):
+    tests = sorted(tests, key=_auction_order_key)
+    groups = [list(group) for _, group in itertools.groupby(tests, _affinity_key)]
+    groups.sort(key=len, reverse=True)
+    jobs_by_worker = [[] for _ in range(worker_count)]
+    test_counts = [0 for _ in range(worker_count)]
+    for group in groups:
+        worker_index = test_counts.index(min(test_counts))
+        jobs_by_worker[worker_index].append(group)
+        test_counts[worker_index] += len(group)
+    return jobs_by_worker
+
+
+# Every worker's jobs, as a deque per worker.  The jobs themselves reach the
+# workers by fork; only the deques' ends are shared.  Workers take their own
+# jobs from the front, and once out of work, steal from the back of the
+# worker with the most left, which holds its smallest groups.
+class JobDeques(object):
+    def __init__(self, jobs_by_worker):
+        self.jobs_by_worker = jobs_by_worker
+        self._lock = multiprocessing.Lock()
+        self._fronts = multiprocessing.RawArray('i', [0 for _ in jobs_by_worker])
+        self._backs = multiprocessing.RawArray('i', map(len, jobs_by_worker))
+
+    def _remaining(self, worker_index):
+        return self._backs[worker_index] - self._fronts[worker_index]
+
+    def next_job(self, worker_index):
+        with self._lock:
+            if self._remaining(worker_index):
+                self._fronts[worker_index] += 1
+                return self.jobs_by_worker[worker_index][self._fronts[worker_index] - 1]
+            victim_index = max(range(len(self.jobs_by_worker)), key=self._remaining)
+            if not self._remaining(victim_index):
+                return None
+            self._backs[victim_index] -= 1
+            return self.jobs_by_worker[victim_index][self._backs[victim_index]]
+
+
+# Workers keep their caches for the whole run.  Cache hits skip any warnings
+# printed while computing what was cached, so which test prints a warning
+# (if any does) depends on what its worker ran before.  Compare runs by their
+# PASS/FAIL lines and totals, not by the warnings.
+def _run_worker(worker_index, job_deques, results_queue):
+    _default_bidder()
+    while True:
+        job = job_deques.next_job(worker_index)
+        if job is None:
+            break
+        results_queue.put(map(_run_test, job))
+    # Tells the harness this worker is done.
+    results_queue.put(None)
+
+
 class TestHarness(unittest2.TestCase):
     use_multi_process = True
-    test_shard_size = 10
+    worker_poll_seconds = 1
 
     def __init__(self, *args, **kwargs):
         super(TestHarness, self).__init__(*args, **kwargs)
@@ -237,32 +320,39 @@ class TestHarness(unittest2.TestCase):
     def run_tests_single_process(self):
         # This follows the same logic-flow as the multi-process code, yet stays single threaded.
         all_tests = list(itertools.chain.from_iterable(group.tests for group in self.groups))
-        for x in range(0, len(all_tests), self.test_shard_size):
-            shard = all_tests[x : x + self.test_shard_size]
-            results = map(_run_test, shard)
-            self.results.add_results_callback(results)
+        for job in _jobs_by_worker(all_tests, 1)[0]:
+            self.results.add_results_callback(map(_run_test, job))
 
     def run_tests_multi_process(self):
         all_tests = list(itertools.chain.from_iterable(group.tests for group in self.groups))
-        pool = multiprocessing.Pool()
-        # FIXME: outstanding_jobs + map_async is a workaround for http://bugs.python.org/issue8296 (only fixed in python 3)
-        outstanding_jobs = []
-        for x in range(0, len(all_tests), self.test_shard_size):
-            results = pool.map_async(
-                _run_test,
-                all_tests[x : x + self.test_shard_size],
-                self.test_shard_size,
-                self.results.add_results_callback
-            )
-            outstanding_jobs.append(results)
-        pool.close()
-
-        # Calling pool.join() won't handle KeyboardInterrupts, so we do a timed wait
-        # on each individual results object.
-        while outstanding_jobs:
-            outstanding_jobs.pop(0).wait(0xFFFF)
-
-        pool.terminate()
+        worker_count = multiprocessing.cpu_count()
+        job_deques = JobDeques(_jobs_by_worker(all_tests, worker_count))
+        results_queue = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=_run_worker, args=(worker_index, job_deques, results_queue)) for worker_index in range(worker_count)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        try:
+            running_count = worker_count
+            while running_count:
+                # A worker which dies never sends its None, and takes its
+                # current job with it, so the run fails rather than waits.
+                dead_workers = [worker for worker in workers if worker.exitcode not in (None, 0)]
+                if dead_workers:
+                    self.fail("Test workers exited with %s" % ", ".join(str(worker.exitcode) for worker in dead_workers))
+                # A timed get, unlike a blocking one, can be interrupted by KeyboardInterrupt.
+                try:
+                    results = results_queue.get(True, self.worker_poll_seconds)
+                except Queue.Empty:
+                    continue
+                if results is None:
+                    running_count -= 1
+                else:
+                    self.results.add_results_callback(results)
+        finally:
+            for worker in workers:
+                worker.terminate()
 
     def _print_coverage_summary(self):
         # FIXME: This need not depend on z3 specifically.
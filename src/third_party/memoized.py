@@ -1,29 +1,123 @@
 # Python does not (yet) seem to provide automatic memoization.
 
+import collections
 import functools
+import weakref
 
 
+class CacheStatistics(object):
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return "CacheStatistics(%s, hits=%s, misses=%s, evictions=%s)" % (self.name, self.hits, self.misses, self.evictions)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+
+# Every decorated function registers itself here so that long-running
+# processes can inspect and clear all caches at once.
+_all_caches = []
+
+
+def cache_statistics():
+    return dict((cache.statistics.name, cache.statistics) for cache in _all_caches)
+
+
+# Unbounded memoized caches intern their results, which callers may compare
+# by identity (e.g. Position.from_index), so those are never cleared here.
+def clear_all_caches():
+    for cache in _all_caches:
+        if isinstance(cache, memoized) and not cache.size_limit:
+            continue
+        cache.clear()
+
+
+# Caches which aren't made by these decorators can still be cleared (and
+# report statistics) along with them, if they have clear() and statistics.
+def register_cache(cache):
+    _all_caches.append(cache)
+
+
+def _function_name(function):
+    return "%s.%s" % (getattr(function, '__module__', None), function.__name__)
+
+
+class _BoundMemoized(object):
+    def __init__(self, memoized_function, instance):
+        self._memoized_function = memoized_function
+        self._instance = instance
+
+    def __call__(self, *args):
+        return self._memoized_function(self._instance, *args)
+
+    def take(self, *args):
+        return self._memoized_function.take(self._instance, *args)
+
+
+# A single, process-wide cache for the decorated function.  This is intended
+# for interning (e.g. Call.from_string), where results should live forever.
+# Use bounded_memoized to cap the number of results kept.  on_evict, if given,
+# is called with the arguments and result of every entry dropped from the
+# cache, by eviction or by clear(), e.g. to hand a resource back.
 class memoized(object):
-    def __init__(self, function):
+    def __init__(self, function, size_limit=None, on_evict=None):
         self._function = function
-        self._results_cache = {}
+        self.size_limit = size_limit
+        self._on_evict = on_evict
+        self._results_cache = collections.OrderedDict() if size_limit else {}
+        self.statistics = CacheStatistics(_function_name(function))
+        _all_caches.append(self)
 
     def __call__(self, *args):
         try:
-            return self._results_cache[args]
+            result = self._results_cache[args]
         except KeyError:
             # If we didn't find the args in our cache, call and save the results.
+            self.statistics.misses += 1
             result = self._function(*args)
             self._results_cache[args] = result
+            self._evict()
             return result
         # FIXME: We may need to handle TypeError here in the case
         # that "args" is not a valid dictionary key.
+        self.statistics.hits += 1
+        if self.size_limit:
+            # Move to the most-recently-used end.
+            del self._results_cache[args]
+            self._results_cache[args] = result
+        return result
+
+    def _evict(self):
+        if not self.size_limit:
+            return
+        while len(self._results_cache) > self.size_limit:
+            args, result = self._results_cache.popitem(last=False)
+            self.statistics.evictions += 1
+            if self._on_evict:
+                self._on_evict(*(args + (result,)))
+
+    def __len__(self):
+        return len(self._results_cache)
 
     def take(self, *args):
         result = self(*args)
         del self._results_cache[args]
         return result
 
+    def clear(self):
+        results_cache = self._results_cache
+        self._results_cache = collections.OrderedDict() if self.size_limit else {}
+        if self._on_evict:
+            for args, result in results_cache.items():
+                self._on_evict(*(args + (result,)))
+
     # Use python "descriptor" protocol __get__ to appear
     # invisible during property access.
     def __get__(self, instance, owner):
@@ -31,3 +125,61 @@ class memoized(object):
         partial = functools.partial(self.__call__, instance)
         partial.take = functools.partial(self.take, instance)
         return partial
+
+
+def bounded_memoized(size_limit, on_evict=None):
+    return lambda function: memoized(function, size_limit=size_limit, on_evict=on_evict)
+
+
+# Memoizes a method's results on the instance itself, so the results (and
+# anything they reference) are released along with the instance rather than
+# being kept alive by a global cache keyed by self.
+class instance_memoized(object):
+    _CACHES_ATTRIBUTE = '_instance_memoized_caches'
+
+    def __init__(self, function):
+        self._function = function
+        self.statistics = CacheStatistics(_function_name(function))
+        # Only used for clear(), so this must not keep the instances alive.
+        self._instances = weakref.WeakSet()
+        _all_caches.append(self)
+
+    def _results_cache_for(self, instance):
+        caches = instance.__dict__.get(self._CACHES_ATTRIBUTE)
+        if caches is None:
+            caches = {}
+            instance.__dict__[self._CACHES_ATTRIBUTE] = caches
+        results_cache = caches.get(self)
+        if results_cache is None:
+            results_cache = {}
+            caches[self] = results_cache
+            self._instances.add(instance)
+        return results_cache
+
+    def __call__(self, instance, *args):
+        results_cache = self._results_cache_for(instance)
+        try:
+            result = results_cache[args]
+        except KeyError:
+            self.statistics.misses += 1
+            result = self._function(instance, *args)
+            results_cache[args] = result
+            return result
+        self.statistics.hits += 1
+        return result
+
+    def take(self, instance, *args):
+        result = self(instance, *args)
+        del self._results_cache_for(instance)[args]
+        return result
+
+    def clear(self, instance=None):
+        instances = [instance] if instance is not None else list(self._instances)
+        for instance in instances:
+            caches = instance.__dict__.get(self._CACHES_ATTRIBUTE, {})
+            caches.pop(self, None)
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return _BoundMemoized(self, instance)
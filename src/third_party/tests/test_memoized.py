@@ -0,0 +1,140 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import gc
+import unittest2
+from third_party import memoized as memoized_module
+from third_party.memoized import CacheStatistics, bounded_memoized, instance_memoized, memoized
+
+
+class Counter(object):
+    def __init__(self):
+        self.calls = []
+        self.evicted = []
+
+    @bounded_memoized(size_limit=2)
+    def squared(self, value):
+        self.calls.append(value)
+        return value * value
+
+    def _evicted(self, value, result):
+        self.evicted.append((value, result))
+
+    @bounded_memoized(size_limit=2, on_evict=_evicted)
+    def negated(self, value):
+        return -value
+
+    @instance_memoized
+    def doubled(self, value):
+        self.calls.append(value)
+        return value * 2
+
+
+class MemoizedTest(unittest2.TestCase):
+    def test_cache_statistics(self):
+        statistics = CacheStatistics("test")
+        self.assertEquals(statistics.hit_rate, 0.0)
+        statistics.hits = 3
+        statistics.misses = 1
+        self.assertEquals(statistics.hit_rate, 0.75)
+        self.assertEquals(repr(statistics), "CacheStatistics(test, hits=3, misses=1, evictions=0)")
+
+    def test_memoized(self):
+        calls = []
+
+        def tripled(value):
+            calls.append(value)
+            return value * 3
+
+        cache = memoized(tripled)
+        self.assertEquals(cache(2), 6)
+        self.assertEquals(cache(2), 6)
+        self.assertEquals(calls, [2])
+        self.assertEquals((cache.statistics.hits, cache.statistics.misses), (1, 1))
+        self.assertEquals(cache.take(2), 6)
+        self.assertEquals(len(cache), 0)
+        self.assertIn(cache.statistics.name, memoized_module.cache_statistics())
+        # Unbounded caches intern their results, so survive clear_all_caches.
+        cache(2)
+        memoized_module.clear_all_caches()
+        cache(2)
+        self.assertEquals(calls, [2, 2])
+
+    def test_bounded_memoized(self):
+        counter = Counter()
+        cache = Counter.__dict__['squared']
+        cache.clear()
+        counter.squared(1)
+        counter.squared(2)
+        # Using 1 again makes 2 the least recently used.
+        counter.squared(1)
+        counter.squared(3)
+        self.assertEquals(len(cache), 2)
+        self.assertEquals(cache.statistics.evictions, 1)
+        counter.squared(1)
+        counter.squared(2)
+        self.assertEquals(counter.calls, [1, 2, 3, 2])
+
+    def test_on_evict(self):
+        counter = Counter()
+        cache = Counter.__dict__['negated']
+        cache.clear()
+        for value in (1, 2, 3):
+            counter.negated(value)
+        self.assertEquals(counter.evicted, [(1, -1)])
+        # Taken results belong to the caller, so aren't handed to on_evict.
+        self.assertEquals(counter.negated.take(2), -2)
+        cache.clear()
+        self.assertEquals(counter.evicted, [(1, -1), (3, -3)])
+        self.assertEquals(len(cache), 0)
+
+    def test_instance_memoized(self):
+        first, second = Counter(), Counter()
+        self.assertEquals(first.doubled(2), 4)
+        self.assertEquals(first.doubled(2), 4)
+        self.assertEquals(second.doubled(2), 4)
+        self.assertEquals(first.calls, [2])
+        self.assertEquals(second.calls, [2])
+        self.assertEquals(first.doubled.take(2), 4)
+        first.doubled(2)
+        self.assertEquals(first.calls, [2, 2])
+
+        Counter.doubled.clear(first)
+        first.doubled(2)
+        second.doubled(2)
+        self.assertEquals(first.calls, [2, 2, 2])
+        self.assertEquals(second.calls, [2])
+
+        memoized_module.clear_all_caches()
+        second.doubled(2)
+        self.assertEquals(second.calls, [2, 2])
+
+    def test_instance_memoized_does_not_keep_instances_alive(self):
+        counter = Counter()
+        counter.doubled(2)
+        instance_count = len(Counter.doubled._instances)
+        del counter
+        gc.collect()
+        self.assertEquals(len(Counter.doubled._instances), instance_count - 1)
+
+    def test_register_cache(self):
+        class Cache(object):
+            statistics = CacheStatistics("registered")
+            cleared = False
+
+            def clear(self):
+                self.cleared = True
+
+        cache = Cache()
+        memoized_module.register_cache(cache)
+        try:
+            memoized_module.clear_all_caches()
+            self.assertTrue(cache.cleared)
+            self.assertIs(memoized_module.cache_statistics()["registered"], cache.statistics)
+        finally:
+            memoized_module._all_caches.remove(cache)
+
+
+if __name__ == '__main__':
+    unittest2.main()
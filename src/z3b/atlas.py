@@ -0,0 +1,379 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+from core.call import Call, Pass, CALL_COUNT
+from core.callexplorer import CallExplorer
+from core.callhistory import CallHistory, MAX_PACKED_CALLS_IN_64_BITS, extend_packed_calls, pack_calls
+from z3b.forcing import SAYCForcingOracle
+from z3b.preconditions import annotations
+from itertools import chain
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import os.path
+import struct
+import z3b.bidder as bidder
+import z3b.sayc as sayc
+
+
+# What interpreting one call (the last call of a node) found.  Only the summary
+# of the last caller is kept; the other seats' summaries are at the node's
+# three parents.
+class AtlasRecord(object):
+    __slots__ = ('rule_name', 'is_consistent', 'annotation_names', 'summary', 'is_forcing')
+
+    def __init__(self, rule_name=None, is_consistent=False, annotation_names=(), summary=None, is_forcing=False):
+        self.rule_name = rule_name
+        self.is_consistent = is_consistent
+        self.annotation_names = annotation_names
+        self.summary = summary
+        self.is_forcing = is_forcing
+
+    def to_json(self):
+        summary = self.summary
+        summary_list = [summary.min_lengths, summary.max_lengths, summary.min_points, summary.max_points, summary.is_balanced] if summary else None
+        return json.dumps([self.rule_name, self.is_consistent, sorted(self.annotation_names), summary_list, self.is_forcing], separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, string):
+        rule_name, is_consistent, annotation_names, summary_list, is_forcing = json.loads(string)
+        summary = None
+        if summary_list:
+            min_lengths, max_lengths, min_points, max_points, is_balanced = summary_list
+            summary = bidder.PositionSummary(tuple(min_lengths), tuple(max_lengths), min_points, max_points, is_balanced)
+        rule_name = str(rule_name) if rule_name else None
+        return cls(rule_name, is_consistent, tuple(map(str, annotation_names)), summary, is_forcing)
+
+    @property
+    def annotations(self):
+        return set(map(annotations.get, self.annotation_names))
+
+
+def _child_key(key, call):
+    return "%s,%s" % (key, call.name) if key else call.name
+
+
+# Interpretations of every auction up to depth calls, as built by AtlasBuilder.
+# Auctions are keyed by their packed calls (see core.callhistory.pack_calls);
+# interpretation does not depend on the dealer or vulnerability.  Nodes are
+# only recorded below consistent interpretations, so anything else falls back
+# to solving.
+#
+# The file is a json header line with the depth, then one line per node:
+# the node's comma separated calls, a tab, and its record as json.
+class Atlas(object):
+    def __init__(self, depth, records, system=None):
+        self.depth = depth
+        self._records = records
+        self.system = system or sayc.StandardAmericanYellowCard
+        # A digest of the file the atlas was loaded from, for keying anything
+        # which depends on the atlas.  See _file_identifier.
+        self.identifier = None
+        self._rules_by_name = dict((rule.name, rule) for rule in self.system.rules)
+
+    def __len__(self):
+        return len(self._records)
+
+    @classmethod
+    def load(cls, path, system=None):
+        with open(path) as atlas_file:
+            header = json.loads(atlas_file.readline())
+            records = {}
+            for line in atlas_file:
+                key, record_json = line.rstrip("\n").split("\t")
+                packed_calls = pack_calls(map(Call.from_string, key.split(","))) if key else 0
+                records[packed_calls] = AtlasRecord.from_json(record_json)
+        atlas = cls(header['depth'], records, system)
+        atlas.identifier = _file_identifier(path)
+        atlas._validate()
+        return atlas
+
+    def _rule_names(self):
+        return set(record.rule_name for record in self._records.itervalues() if record.rule_name)
+
+    def _validate(self):
+        # An atlas is only as good as the rules it was built with.
+        for rule_name in self._rule_names():
+            if rule_name not in self._rules_by_name:
+                raise ValueError("Atlas is stale, no rule named %s" % rule_name)
+
+    # (packed calls, record) for every node, in packed calls order.
+    def items(self):
+        return sorted(self._records.iteritems())
+
+    def _record(self, packed_calls):
+        return self._records.get(packed_calls)
+
+    # The records of every child of the node, keyed by packed calls.
+    def _child_records(self, packed_calls):
+        child_records = {}
+        for index in range(CALL_COUNT):
+            child_packed_calls = extend_packed_calls(packed_calls, Call.from_index(index))
+            record = self._records.get(child_packed_calls)
+            if record is not None:
+                child_records[child_packed_calls] = record
+        return child_records
+
+    def rule_for(self, record):
+        if not record.rule_name:
+            return None
+        return self._rules_by_name[record.rule_name]
+
+    def record_for(self, call_history):
+        return self._record(call_history.packed_calls)
+
+    def record_for_call(self, call_history, call):
+        return self._record(extend_packed_calls(call_history.packed_calls, call))
+
+    # The records for every legal call over call_history, or None unless all of them are known.
+    def records_over(self, call_history):
+        if len(call_history) >= self.depth:
+            return None
+        packed_calls = call_history.packed_calls
+        child_records = self._child_records(packed_calls)
+        records = {}
+        for call in CallExplorer().possible_calls_over(call_history):
+            record = child_records.get(extend_packed_calls(packed_calls, call))
+            if record is None:
+                return None
+            records[call] = record
+        return records
+
+    # The rule RuleSelector would choose for each call over call_history.
+    def call_to_rule_over(self, call_history):
+        records = self.records_over(call_history)
+        if records is None:
+            return None
+        return dict((call, self.rule_for(record)) for call, record in records.iteritems() if record.rule_name)
+
+
+# The same records as Atlas, in a binary file which is memory mapped rather
+# than read, so every server process using one file shares one copy of it.
+#
+# The file is MAGIC, then the length of a json header (the depth and the rule
+# and annotation names records refer to by number), the header, and padding
+# to a multiple of 8 bytes.  Fixed size records follow, sorted by packed
+# calls.  A node's children have consecutive packed calls, so one binary
+# search finds all of them.
+class MappedAtlas(Atlas):
+    MAGIC = "SAYCATL1"
+    HEADER_LENGTH_FORMAT = struct.Struct("<I")
+    PACKED_CALLS_FORMAT = struct.Struct("<Q")
+    # Packed calls, rule number, flags, annotation bits, min lengths, max lengths, min points, max points.
+    RECORD_FORMAT = struct.Struct("<QHBQ4B4BBB")
+    NO_RULE = 0xFFFF
+    IS_CONSISTENT, IS_FORCING, IS_BALANCED, HAS_SUMMARY = 1, 2, 4, 8
+
+    def __init__(self, path, system=None):
+        with open(path, "rb") as atlas_file:
+            self._map = mmap.mmap(atlas_file.fileno(), 0, access=mmap.ACCESS_READ)
+        assert self._map[:len(self.MAGIC)] == self.MAGIC, "%s is not a mapped atlas" % path
+        header_length, = self.HEADER_LENGTH_FORMAT.unpack_from(self._map, len(self.MAGIC))
+        header_offset = len(self.MAGIC) + self.HEADER_LENGTH_FORMAT.size
+        header = json.loads(self._map[header_offset:header_offset + header_length])
+        self._records_offset = self._padded(header_offset + header_length)
+        self._count = (len(self._map) - self._records_offset) / self.RECORD_FORMAT.size
+        self._record_rule_names = map(str, header['rule_names'])
+        self._record_annotation_names = map(str, header['annotation_names'])
+        Atlas.__init__(self, header['depth'], None, system)
+        self.identifier = _file_identifier(path)
+        self._validate()
+
+    @classmethod
+    def _padded(cls, offset):
+        return (offset + 7) / 8 * 8
+
+    def __len__(self):
+        return self._count
+
+    def _rule_names(self):
+        return self._record_rule_names
+
+    def _packed_calls_at(self, index):
+        return self.PACKED_CALLS_FORMAT.unpack_from(self._map, self._records_offset + index * self.RECORD_FORMAT.size)[0]
+
+    def _record_at(self, index):
+        fields = self.RECORD_FORMAT.unpack_from(self._map, self._records_offset + index * self.RECORD_FORMAT.size)
+        packed_calls, rule_number, flags, annotation_bits = fields[:4]
+        rule_name = self._record_rule_names[rule_number] if rule_number != self.NO_RULE else None
+        annotation_names = tuple(name for bit, name in enumerate(self._record_annotation_names) if annotation_bits & (1 << bit))
+        summary = None
+        if flags & self.HAS_SUMMARY:
+            summary = bidder.PositionSummary(fields[4:8], fields[8:12], fields[12], fields[13], bool(flags & self.IS_BALANCED))
+        return packed_calls, AtlasRecord(rule_name, bool(flags & self.IS_CONSISTENT), annotation_names, summary, bool(flags & self.IS_FORCING))
+
+    def _lower_bound(self, packed_calls):
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) / 2
+            if self._packed_calls_at(middle) < packed_calls:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def items(self):
+        return map(self._record_at, range(self._count))
+
+    def _record(self, packed_calls):
+        index = self._lower_bound(packed_calls)
+        if index < self._count and self._packed_calls_at(index) == packed_calls:
+            return self._record_at(index)[1]
+        return None
+
+    def _child_records(self, packed_calls):
+        last_child_packed_calls = extend_packed_calls(packed_calls, Call.from_index(CALL_COUNT - 1))
+        child_records = {}
+        index = self._lower_bound(extend_packed_calls(packed_calls, Call.from_index(0)))
+        while index < self._count:
+            child_packed_calls, record = self._record_at(index)
+            if child_packed_calls > last_child_packed_calls:
+                break
+            child_records[child_packed_calls] = record
+            index += 1
+        return child_records
+
+    @classmethod
+    def write(cls, atlas, path):
+        assert atlas.depth <= MAX_PACKED_CALLS_IN_64_BITS
+        items = atlas.items()
+        rule_names = sorted(set(record.rule_name for _, record in items if record.rule_name))
+        annotation_names = sorted(set(chain.from_iterable(record.annotation_names for _, record in items)))
+        assert len(annotation_names) <= 64
+        rule_numbers = dict((name, number) for number, name in enumerate(rule_names))
+        annotation_bits = dict((name, 1 << bit) for bit, name in enumerate(annotation_names))
+
+        header = json.dumps({'depth': atlas.depth, 'rule_names': rule_names, 'annotation_names': annotation_names})
+        header_offset = len(cls.MAGIC) + cls.HEADER_LENGTH_FORMAT.size
+        with open(path, "wb") as atlas_file:
+            atlas_file.write(cls.MAGIC)
+            atlas_file.write(cls.HEADER_LENGTH_FORMAT.pack(len(header)))
+            atlas_file.write(header)
+            atlas_file.write("\0" * (cls._padded(header_offset + len(header)) - header_offset - len(header)))
+            for packed_calls, record in items:
+                summary = record.summary or bidder.PositionSummary.unknown()
+                flags = 0
+                flags |= cls.IS_CONSISTENT if record.is_consistent else 0
+                flags |= cls.IS_FORCING if record.is_forcing else 0
+                flags |= cls.IS_BALANCED if summary.is_balanced else 0
+                flags |= cls.HAS_SUMMARY if record.summary else 0
+                atlas_file.write(cls.RECORD_FORMAT.pack(
+                    packed_calls,
+                    rule_numbers[record.rule_name] if record.rule_name else cls.NO_RULE,
+                    flags,
+                    sum(annotation_bits[name] for name in record.annotation_names),
+                    *(tuple(summary.min_lengths) + tuple(summary.max_lengths) + (summary.min_points, summary.max_points))
+                ))
+
+
+def _file_identifier(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as atlas_file:
+        for chunk in iter(lambda: atlas_file.read(1 << 20), ""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Mapped atlases are recognized by their MAGIC.
+def load_atlas(path, system=None):
+    with open(path, "rb") as atlas_file:
+        is_mapped = atlas_file.read(len(MappedAtlas.MAGIC)) == MappedAtlas.MAGIC
+    if is_mapped:
+        return MappedAtlas(path, system)
+    return Atlas.load(path, system)
+
+
+def install_atlas(atlas):
+    bidder.interpretation_atlas = atlas
+
+
+def _atlas_record_for_call(interpreter, history, call):
+    try:
+        child = interpreter.extend_history(history, call)
+    except bidder.InconsistentHistoryException, e:
+        return None, AtlasRecord(e.rule.name if e.rule else None)
+
+    is_forcing = False
+    try:
+        # Matches what the explorer calls forcing.
+        is_forcing = bool(child.rho.rule_for_last_call) and SAYCForcingOracle().forced_to_bid(interpreter.extend_history(child, Pass()))
+    except bidder.InconsistentHistoryException:
+        pass
+    annotation_names = tuple(annotation.key for annotation in child.rho.annotations_for_last_call)
+    return child, AtlasRecord(child.rho.rule_for_last_call.name, True, annotation_names, child.rho.summary, is_forcing)
+
+
+def _write_atlas_records(interpreter, history, depth, atlas_file):
+    if len(history.call_history) >= depth:
+        return
+    key = history.call_history.comma_separated_calls()
+    for call in CallExplorer().possible_calls_over(history.call_history):
+        child, record = _atlas_record_for_call(interpreter, history, call)
+        atlas_file.write("%s\t%s\n" % (_child_key(key, call), record.to_json()))
+        if child:
+            _write_atlas_records(interpreter, child, depth, atlas_file)
+
+
+# Run in a worker process, so everything (z3 included) is private to the process.
+def _build_shard(shard):
+    first_call_name, depth, shard_path = shard
+    interpreter = bidder.Interpreter()
+    history = bidder.History()
+    temporary_path = shard_path + ".partial"
+    with open(temporary_path, "w") as shard_file:
+        child, record = _atlas_record_for_call(interpreter, history, Call.from_string(first_call_name))
+        shard_file.write("%s\t%s\n" % (first_call_name, record.to_json()))
+        if child:
+            _write_atlas_records(interpreter, child, depth, shard_file)
+    # Only finished shards are renamed into place, so an interrupted build resumes where it left off.
+    os.rename(temporary_path, shard_path)
+    return first_call_name
+
+
+# Builds an Atlas by interpreting every auction up to depth calls.  Each
+# opening call's subtree is a shard, built by its own worker process and
+# checkpointed to its own file in shard_dir.  Running the builder again skips
+# shards which are already written, then merges all of them into one file.
+class AtlasBuilder(object):
+    def __init__(self, depth, shard_dir, process_count=None):
+        self.depth = depth
+        self.shard_dir = shard_dir
+        self.process_count = process_count
+
+    def _shard_path(self, first_call):
+        return os.path.join(self.shard_dir, "depth-%s-%s.txt" % (self.depth, first_call.name))
+
+    def shards(self):
+        first_calls = CallExplorer().possible_calls_over(CallHistory())
+        return [(call.name, self.depth, self._shard_path(call)) for call in first_calls]
+
+    def pending_shards(self):
+        return [shard for shard in self.shards() if not os.path.exists(shard[2])]
+
+    def build_shards(self, progress_callback=None):
+        if not os.path.isdir(self.shard_dir):
+            os.makedirs(self.shard_dir)
+        pool = multiprocessing.Pool(self.process_count)
+        try:
+            for first_call_name in pool.imap_unordered(_build_shard, self.pending_shards()):
+                if progress_callback:
+                    progress_callback(first_call_name)
+            pool.close()
+        finally:
+            pool.terminate()
+
+    def write_atlas(self, atlas_path):
+        assert not self.pending_shards()
+        with open(atlas_path, "w") as atlas_file:
+            atlas_file.write(json.dumps({'depth': self.depth}) + "\n")
+            for _, _, shard_path in self.shards():
+                with open(shard_path) as shard_file:
+                    for line in shard_file:
+                        atlas_file.write(line)
+
+    def build(self, atlas_path, progress_callback=None):
+        self.build_shards(progress_callback)
+        self.write_atlas(atlas_path)
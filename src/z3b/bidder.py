@@ -2,16 +2,15 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
-from core.call import Call
-from core.callexplorer import CallExplorer
-from core.callhistory import CallHistory
+from core.call import Call, calls_in_mask
+from core.callhistory import CallSequence
 from itertools import chain
 from z3b import enum
-from third_party.memoized import memoized
+from z3b.evaluator import HandEvaluator, UnsupportedExpression
+from third_party.memoized import CacheStatistics, bounded_memoized, instance_memoized, register_cache
 from z3b.model import positions, expr_for_suit, is_possible, is_certain
 from z3b.preconditions import did_bid_annotation
 import collections
-import copy
 import core.suit as suit
 import z3
 import z3b.model as model
@@ -22,15 +21,18 @@ import z3b.sayc as sayc
 class SolverPool(object):
     def __init__(self):
         self._pool = []
+        self._axiom_count = None
 
     def _ensure_solver(self):
         if self._pool:
             return
         solver = z3.SolverFor('QF_LIA')
         solver.add(model.axioms)
+        self._axiom_count = len(solver.assertions())
         self._pool.append(solver)
 
     def restore(self, solver):
+        model.forget_solver(solver)
         solver.pop()
         self._pool.append(solver)
 
@@ -40,7 +42,24 @@ class SolverPool(object):
         solver.push()
         return solver
 
-    @memoized
+    # Everything asserted on a borrowed solver, past the axioms every pooled
+    # solver starts with.  The assertions are z3's own (already built) exprs,
+    # so a snapshot is cheap and stays valid however the solver is used after.
+    def snapshot(self, solver):
+        assertions = solver.assertions()
+        return [assertions[index] for index in range(self._axiom_count, len(assertions))]
+
+    # A borrowed solver in the state snapshot was taken in.
+    def fork(self, snapshot):
+        solver = self.borrow()
+        solver.add(snapshot)
+        return solver
+
+    def _restore_solver_for_hand(self, hand, solver):
+        self.restore(solver)
+
+    # Solvers are only needed for the rare meaning HandEvaluator can't handle.
+    @bounded_memoized(size_limit=16, on_evict=_restore_solver_for_hand)
     def solver_for_hand(self, hand):
         solver = self.borrow()
         solver.add(model.expr_for_hand(hand))
@@ -138,6 +157,10 @@ class PositionView(object):
     def is_balanced(self):
         return self.history.is_balanced_for_position(self.position)
 
+    @property
+    def summary(self):
+        return self.history.position_summary(self.position)
+
     @property
     def unbid_suits(self):
         return set(suit.SUITS) - self.bid_suits
@@ -147,37 +170,167 @@ class PositionView(object):
         return set([_suit for _suit in suit.SUITS if self.history.is_bid_suit(_suit, self.position)])
 
 
+class PositionSummary(object):
+    __slots__ = ('min_lengths', 'max_lengths', 'min_points', 'max_points', 'is_balanced')
+
+    def __init__(self, min_lengths, max_lengths, min_points, max_points, is_balanced):
+        self.min_lengths = min_lengths
+        self.max_lengths = max_lengths
+        self.min_points = min_points
+        self.max_points = max_points
+        self.is_balanced = is_balanced
+
+    @classmethod
+    def unknown(cls):
+        return cls((0, 0, 0, 0), (13, 13, 13, 13), 0, 37, False)
+
+    def min_length(self, suit):
+        return self.min_lengths[suit.index]
+
+    def max_length(self, suit):
+        return self.max_lengths[suit.index]
+
+
+# Finds the ranges of suit lengths and points for a single History's solver.
+# Rather than scanning every value, each range is bisected and every satisfying
+# model the solver returns narrows the brackets for all of the terms at once,
+# so a full summary costs a few dozen checks instead of ~100.
+class BoundsFinder(object):
+    # The old linear scans used playing_points for the minimum and points for the maximum.
+    TERMS = map(expr_for_suit, suit.SUITS) + [model.playing_points, model.points]
+    DOMAINS = [(0, 13)] * len(suit.SUITS) + [(0, 55), (0, 37)]
+    SUIT_TERM_INDICES = range(len(suit.SUITS))
+    MIN_POINTS_TERM_INDEX = len(suit.SUITS)
+    MAX_POINTS_TERM_INDEX = len(suit.SUITS) + 1
+
+    def __init__(self, history):
+        self.history = history
+        self._is_consistent = None
+        self._min_brackets = map(list, self.DOMAINS)
+        self._max_brackets = map(list, self.DOMAINS)
+        self._seen_unbalanced = False
+        self._is_balanced = None
+
+    # A finder which already knows the answers, and so never solves.
+    @classmethod
+    def from_summary(cls, history, summary):
+        finder = cls(history)
+        finder._is_consistent = True
+        finder._is_balanced = summary.is_balanced
+        for index in cls.SUIT_TERM_INDICES:
+            finder._min_brackets[index] = [summary.min_lengths[index]] * 2
+            finder._max_brackets[index] = [summary.max_lengths[index]] * 2
+        finder._min_brackets[cls.MIN_POINTS_TERM_INDEX] = [summary.min_points] * 2
+        finder._max_brackets[cls.MAX_POINTS_TERM_INDEX] = [summary.max_points] * 2
+        return finder
+
+    def _observe(self, z3_model):
+        for index, term in enumerate(self.TERMS):
+            value = z3_model.eval(term, model_completion=True).as_long()
+            min_bracket = self._min_brackets[index]
+            min_bracket[1] = min(min_bracket[1], value)
+            max_bracket = self._max_brackets[index]
+            max_bracket[0] = max(max_bracket[0], value)
+        if not z3.is_true(z3_model.eval(model.balanced, model_completion=True)):
+            self._seen_unbalanced = True
+
+    def _check(self, expr):
+        solver = self.history._solver()
+        solver.push()
+        solver.add(expr)
+        result = solver.check() == z3.sat
+        if result:
+            self._observe(solver.model())
+        solver.pop()
+        return result
+
+    def _ensure_consistency_checked(self):
+        if self._is_consistent is None:
+            self._is_consistent = self._check(model.NO_CONSTRAINTS)
+        return self._is_consistent
+
+    def minimum(self, index):
+        # Matches the old scans, which found nothing to report for an inconsistent history.
+        if not self._ensure_consistency_checked():
+            return 0
+        term = self.TERMS[index]
+        bracket = self._min_brackets[index]
+        while bracket[0] < bracket[1]:
+            middle = (bracket[0] + bracket[1]) / 2
+            if not self._check(term <= middle):
+                bracket[0] = middle + 1
+        return bracket[0]
+
+    def maximum(self, index):
+        if not self._ensure_consistency_checked():
+            return 0
+        term = self.TERMS[index]
+        bracket = self._max_brackets[index]
+        while bracket[0] < bracket[1]:
+            middle = (bracket[0] + bracket[1] + 1) / 2
+            if not self._check(term >= middle):
+                bracket[1] = middle - 1
+        return bracket[1]
+
+    def is_balanced(self):
+        if self._is_balanced is None:
+            if not self._ensure_consistency_checked():
+                self._is_balanced = True
+            elif self._seen_unbalanced:
+                self._is_balanced = False
+            else:
+                self._is_balanced = not self._check(z3.Not(model.balanced))
+        return self._is_balanced
+
+    def summary(self):
+        return PositionSummary(
+            tuple(self.minimum(index) for index in self.SUIT_TERM_INDICES),
+            tuple(self.maximum(index) for index in self.SUIT_TERM_INDICES),
+            self.minimum(self.MIN_POINTS_TERM_INDEX),
+            self.maximum(self.MAX_POINTS_TERM_INDEX),
+            self.is_balanced(),
+        )
+
+
 # This class is immutable.
 class History(object):
     # FIXME: Unclear if Rule should be stored on History at all.
-    def __init__(self, previous_history=None, call=None, annotations=None, constraints=None, rule=None):
+    def __init__(self, previous_history=None, call=None, annotations=None, constraints=None, rule=None, summary=None):
         self._previous_history = previous_history
         self._annotations_for_last_call = annotations if annotations else []
         self._constraints_for_last_call = constraints if constraints else []
         self._rule_for_last_call = rule
-        self.call_history = copy.deepcopy(self._previous_history.call_history) if self._previous_history else CallHistory()
-        if call:
-            self.call_history.calls.append(call)
+        # The last caller's summary, when already known from an atlas.
+        self._known_summary = summary
+        # What _solver had asserted when a later history took it.
+        self._solver_snapshot = None
+        self.call_history = self._previous_history.call_history.extend(call) if self._previous_history else CallSequence()
 
-    def extend_with(self, call, annotations, constraints, rule):
+    def extend_with(self, call, annotations, constraints, rule, summary=None):
         return History(
             previous_history=self,
             call=call,
             annotations=annotations,
             constraints=constraints,
             rule=rule,
+            summary=summary,
         )
 
+    # See core.call.mask_for_calls.
     @property
-    @memoized
+    def legal_call_mask(self):
+        return self.call_history.legal_call_mask()
+
+    @property
+    @instance_memoized
     def legal_calls(self):
-        return set(CallExplorer().possible_calls_over(self.call_history))
+        return set(calls_in_mask(self.legal_call_mask))
 
-    @memoized
+    @instance_memoized
     def _previous_position(self, position):
         return positions[(position.index - 1) % 4]
 
-    @memoized
+    @instance_memoized
     def _history_after_last_call_for(self, position):
         if position.index == positions.RHO.index:
             return self
@@ -193,15 +346,27 @@ class History(object):
             previous_history = self._history_after_last_call_for(position)
             if not previous_history:
                 continue
-            _solver_pool.restore(previous_history._solver.take())
+            _solver_pool.restore(previous_history._take_solver())
 
-    @memoized
+    # Each history's solver is handed on to the first history four calls later
+    # which needs one, without copying.  Any other history which then needs
+    # it (a sibling of that one, or this history itself) gets a fork of the
+    # snapshot taken at the hand off, rather than rebuilding the whole chain.
+    @instance_memoized
     def _solver(self):
+        if self._solver_snapshot is not None:
+            return _solver_pool.fork(self._solver_snapshot)
         previous_history = self._four_calls_ago
-        solver = previous_history._solver.take() if previous_history else _solver_pool.borrow()
+        solver = previous_history._take_solver() if previous_history else _solver_pool.borrow()
         solver.add(self._constraints_for_last_call)
         return solver
 
+    def _take_solver(self):
+        solver = self._solver.take()
+        if self._solver_snapshot is None:
+            self._solver_snapshot = _solver_pool.snapshot(solver)
+        return solver
+
     @property
     def _four_calls_ago(self):
         history = (
@@ -279,14 +444,14 @@ class History(object):
     def _solve_for_consistency(self, constraints):
         return is_possible(self._solver(), constraints)
 
-    @memoized
+    @instance_memoized
+    def _bounds(self):
+        if self._known_summary:
+            return BoundsFinder.from_summary(self, self._known_summary)
+        return BoundsFinder(self)
+
     def _solve_for_min_length(self, suit):
-        solver = self._solver()
-        suit_expr = expr_for_suit(suit)
-        for length in range(0, 13):
-            if is_possible(solver, suit_expr == length):
-                return length
-        return 0
+        return self._bounds().minimum(BoundsFinder.SUIT_TERM_INDICES[suit.index])
 
     def min_length_for_position(self, position, suit):
         history = self._history_after_last_call_for(position)
@@ -294,14 +459,8 @@ class History(object):
             return history._solve_for_min_length(suit)
         return 0
 
-    @memoized
     def _solve_for_max_length(self, suit):
-        solver = self._solver()
-        suit_expr = expr_for_suit(suit)
-        for length in range(13, 0, -1):
-            if is_possible(solver, suit_expr == length):
-                return length
-        return 0
+        return self._bounds().maximum(BoundsFinder.SUIT_TERM_INDICES[suit.index])
 
     def max_length_for_position(self, position, suit):
         history = self._history_after_last_call_for(position)
@@ -309,9 +468,8 @@ class History(object):
             return history._solve_for_max_length(suit)
         return 13
 
-    @memoized
     def _solve_for_is_balanced(self):
-        return is_certain(self._solver(), model.balanced)
+        return self._bounds().is_balanced()
 
     def is_balanced_for_position(self, position):
         history = self._history_after_last_call_for(position)
@@ -319,22 +477,8 @@ class History(object):
             return history._solve_for_is_balanced()
         return False
 
-    def _lower_bound(self, predicate, lo, hi):
-        if lo == hi:
-            return hi
-        assert lo < hi
-        pos = int((lo + hi) / 2)
-        if predicate(pos):
-            return self._lower_bound(predicate, lo, pos)
-        return self._lower_bound(predicate, pos + 1, hi)
-
-    @memoized
     def _solve_for_min_points(self):
-        solver = self._solver()
-        predicate = lambda points: is_possible(solver, model.playing_points == points)
-        if predicate(0):
-            return 0
-        return self._lower_bound(predicate, 1, 37)
+        return self._bounds().minimum(BoundsFinder.MIN_POINTS_TERM_INDEX)
 
     def min_points_for_position(self, position):
         history = self._history_after_last_call_for(position)
@@ -342,13 +486,8 @@ class History(object):
             return history._solve_for_min_points()
         return 0
 
-    @memoized
     def _solve_for_max_points(self):
-        solver = self._solver()
-        for cap in range(37, 0, -1):
-            if is_possible(solver, cap == model.points):
-                return cap
-        return 0
+        return self._bounds().maximum(BoundsFinder.MAX_POINTS_TERM_INDEX)
 
     def max_points_for_position(self, position):
         history = self._history_after_last_call_for(position)
@@ -356,7 +495,39 @@ class History(object):
             return history._solve_for_max_points()
         return 37
 
-    @memoized
+    def position_summary(self, position):
+        history = self._history_after_last_call_for(position)
+        if history:
+            return history._bounds().summary()
+        return PositionSummary.unknown()
+
+    def _constraints_for_position(self):
+        constraints = []
+        history = self
+        while history:
+            if isinstance(history._constraints_for_last_call, z3.ExprRef):
+                constraints.append(history._constraints_for_last_call)
+            history = history._four_calls_ago
+        return z3.And(constraints) if constraints else model.NO_CONSTRAINTS
+
+    # Everything position has shown, as one expression.
+    def all_constraints_for_position(self, position):
+        history = self._history_after_last_call_for(position)
+        if not history:
+            return model.NO_CONSTRAINTS
+        return history._constraints_for_position()
+
+    # Returns up to count hands drawn uniformly from those consistent with
+    # everything position has shown.  See vectorized.HandSampler.
+    def sample_hands(self, position, count, random_state=None):
+        # Sampling needs numpy, which the rest of the bidder does not.
+        from z3b.vectorized import HandSampler
+        history = self._history_after_last_call_for(position)
+        solver = history._solver() if history else None
+        sampler = HandSampler(self.all_constraints_for_position(position), solver)
+        return sampler.sample(count, random_state).hands()
+
+    @instance_memoized
     def _solve_for_more_points_than(self, points):
         return is_possible(self._solver(), model.points >= points)
 
@@ -366,7 +537,7 @@ class History(object):
             return history._solve_for_more_points_than(points)
         return True
 
-    @memoized
+    @instance_memoized
     def is_bid_suit(self, suit, position):
         # Look for the annotation of bidding a suit.
         if did_bid_annotation(suit) in self.annotations_for_position(position):
@@ -428,25 +599,16 @@ class PossibleCalls(object):
     def add_call_with_priority(self, call, priority):
         self._calls_and_priorities.append([call, priority])
 
-    def _is_dominated(self, priority, maximal_calls_and_priorities):
-        # First check to see if any existing call is larger than this one.
-        for max_call, max_priority in maximal_calls_and_priorities:
-            if self.ordering.lt(priority, max_priority):
-                return True
-        return False
-
     def priority_for_call(self, call):
         # FIXME: There must be a nicer way to do this.
         return [pair for pair in self._calls_and_priorities if pair[0] == call][0][1]
 
     def maximal_calls_and_priorities(self):
-        maximal_calls_and_priorities = []
+        present_bits = 0
         for call, priority in self._calls_and_priorities:
-            if self._is_dominated(priority, maximal_calls_and_priorities):
-                continue
-            maximal_calls_and_priorities = filter(lambda (max_call, max_priority): not self.ordering.lt(max_priority, priority), maximal_calls_and_priorities)
-            maximal_calls_and_priorities.append([call, priority])
-        return maximal_calls_and_priorities
+            present_bits |= self.ordering.bit(priority)
+        # A call is maximal unless a priority greater than its own is present.
+        return [[call, priority] for call, priority in self._calls_and_priorities if not self.ordering.greater_bits(priority) & present_bits]
 
 
 # CallSelection exposes similar information to a History object, but not connected in a History chain.
@@ -461,6 +623,44 @@ class CallSelection(object):
         return self.rule_selector.rule_for_call(self.call)
 
 
+# Call selections keyed by hand feature key and auction, along with the
+# system and atlas which interpreted it.  Hands which differ only in spot
+# cards below the ten always select the same call.  See Bidder._call_selection_key.
+class CallSelectionCache(object):
+    # Bidding a board adds about nine selections (100 random boards added 918),
+    # so this remembers about the last thousand boards bid.
+    def __init__(self, size_limit=10000):
+        self.size_limit = size_limit
+        self._call_selections = collections.OrderedDict()
+        self.statistics = CacheStatistics("CallSelectionCache")
+
+    def __len__(self):
+        return len(self._call_selections)
+
+    def lookup(self, key):
+        try:
+            call_selection = self._call_selections.pop(key)
+        except KeyError:
+            self.statistics.misses += 1
+            raise
+        self._call_selections[key] = call_selection
+        self.statistics.hits += 1
+        return call_selection
+
+    def add(self, key, call_selection):
+        self._call_selections[key] = call_selection
+        while len(self._call_selections) > self.size_limit:
+            self._call_selections.popitem(last=False)
+            self.statistics.evictions += 1
+
+    def clear(self):
+        self._call_selections.clear()
+
+
+call_selection_cache = CallSelectionCache()
+register_cache(call_selection_cache)
+
+
 class Bidder(object):
     def __init__(self):
         # Assuming SAYC for all sides.
@@ -468,27 +668,46 @@ class Bidder(object):
 
     def call_selection_for(self, hand, call_history, expected_call=None):
         with Interpreter().create_history(call_history) as history:
-            # Select highest-intra-bid-priority (category) rules for all possible bids
+            # expected_call only changes what we print, so those lookups skip the cache.
+            if expected_call:
+                return self._call_selection_for(hand, history, expected_call)
+            return self._cached_call_selection_for(hand, history)
+
+    # All of the hands share one interpreted history and rule selection.
+    def call_selections_for(self, hands, call_history):
+        with Interpreter().create_history(call_history) as history:
+            return [self._cached_call_selection_for(hand, history) for hand in hands]
+
+    # Interpretation only depends on the calls, so any History with the same
+    # calls (interpreted with the same system and atlas) selects the same call.
+    def _call_selection_key(self, hand, history):
+        return (self.system, interpretation_atlas, history.call_history.packed_calls, model.feature_key_for_hand(hand))
+
+    def _cached_call_selection_for(self, hand, history):
+        key = self._call_selection_key(hand, history)
+        try:
+            return call_selection_cache.lookup(key)
+        except KeyError:
+            pass
+        call_selection = self._call_selection_for(hand, history, None)
+        # No call is an error, which is reported (and worth retrying) every time.
+        if call_selection:
+            call_selection_cache.add(key, call_selection)
+        return call_selection
+
+    def _call_selection_for(self, hand, history, expected_call):
+        # Select highest-intra-bid-priority (category) rules for all possible bids
+        if expected_call:
             rule_selector = RuleSelector(self.system, history, expected_call)
+        else:
+            rule_selector = RuleSelector.for_history(self.system, history)
 
-            # Compute inter-bid priorities (priority) for each using the hand.
-            possible_calls = rule_selector.possible_calls_for_hand(hand, expected_call)
-            maximal_calls_and_priorities = possible_calls.maximal_calls_and_priorities()
-            # We don't currently support tie-breaking priorities, but we do have some bids that
-            # we don't make without a planner.
-            no_planning_filter = lambda call_priority_tuple: not rule_selector.rule_for_call(call_priority_tuple[0]).requires_planning
-            maximal_calls_and_priorities = filter(no_planning_filter, maximal_calls_and_priorities)
-            if not maximal_calls_and_priorities:
-                return None # If we failed to find any call, this is an error.
-            maximal_calls, maximal_priorities = zip(*maximal_calls_and_priorities)
-            if len(maximal_calls) != 1:
-                rules = map(rule_selector.rule_for_call, maximal_calls)
-                call_names = map(lambda call: call.name, maximal_calls)
-                print "WARNING: Unordered: %s rules: %s priorities: %s" % (call_names, rules, maximal_priorities)
-                return None
-
-            call = maximal_calls[0]
-            return CallSelection(call, rule_selector)
+        # Compute inter-bid priorities (priority) for each using the hand.
+        possible_calls = rule_selector.possible_calls_for_hand(hand, expected_call)
+        call = rule_selector.call_from_possible_calls(possible_calls)
+        if not call:
+            return None # If we failed to find any call, this is an error.
+        return CallSelection(call, rule_selector)
 
     def find_call_for(self, hand, call_history, expected_call=None):
         call_selection = self.call_selection_for(hand, call_history, expected_call)
@@ -497,6 +716,43 @@ class Bidder(object):
         return call_selection.call
 
 
+# Bids many boards in lockstep, one call per board per step.  Boards whose
+# auctions are identical so far are bid together, sharing one interpreted
+# history and rule selection.  Random boards mostly share their first rounds.
+class BatchBidder(object):
+    def __init__(self, bidder=None):
+        self.bidder = bidder or Bidder()
+
+    def _group_boards_to_bid(self, boards, indices, until_position):
+        groups = collections.OrderedDict()
+        for index in indices:
+            call_history = boards[index].call_history
+            if call_history.is_complete() or call_history.position_to_call() == until_position:
+                continue
+            # Interpretation ignores the dealer and vulnerability.
+            groups.setdefault(call_history.packed_calls, []).append(index)
+        return groups.values()
+
+    # Returns the CallSelections made for each board.  A board stops when no
+    # call can be found for it, leaving None as its last selection.
+    def bid_boards(self, boards, until_position=None):
+        call_selections = [[] for board in boards]
+        indices = range(len(boards))
+        while indices:
+            indices_to_bid = []
+            for group in self._group_boards_to_bid(boards, indices, until_position):
+                call_history = boards[group[0]].call_history
+                hands = [boards[index].deal.hand_for(boards[index].call_history.position_to_call()) for index in group]
+                for index, call_selection in zip(group, self.bidder.call_selections_for(hands, call_history)):
+                    call_selections[index].append(call_selection)
+                    if not call_selection:
+                        continue
+                    boards[index].call_history.calls.append(call_selection.call)
+                    indices_to_bid.append(index)
+            indices = indices_to_bid
+        return call_selections
+
+
 class RuleSelector(object):
     def __init__(self, system, history, expected_call=None, explain=False):
         self.system = system
@@ -506,6 +762,13 @@ class RuleSelector(object):
         self.expected_call = expected_call
         self._check_for_missing_rule()
 
+    # Interpreting each possible next call over a history (and bidding over it)
+    # needs the same rules and meanings, so those share a selector.
+    @classmethod
+    @bounded_memoized(size_limit=64)
+    def for_history(cls, system, history):
+        return cls(system, history)
+
     def _check_for_missing_rule(self):
         if not self.expected_call:
             return
@@ -513,28 +776,44 @@ class RuleSelector(object):
             return
         print "WARNING: No rule can make: %s" % self.expected_call
 
+    def _candidate_rules_and_calls(self):
+        # The index skips rules without evaluating their preconditions, and
+        # so without printing why they failed to match the expected call.
+        if not self.expected_call:
+            return self.system.rule_index.candidates(self.history)
+        legal_call_mask = self.history.legal_call_mask
+        return [(rule, call) for rule in self.system.rules for call in calls_in_mask(legal_call_mask & rule.known_call_mask)]
+
     @property
-    @memoized
+    @instance_memoized
     def _call_to_rule(self):
+        # An atlas knows which rule wins for every call, without checking any preconditions.
+        atlas = interpretation_atlas
+        if atlas and atlas.system is self.system and not self.expected_call:
+            call_to_rule = atlas.call_to_rule_over(self.history.call_history)
+            if call_to_rule is not None:
+                return call_to_rule
+
         maximal = {}
-        for rule in self.system.rules:
-            for category, call in rule.calls_over(self.history, self.expected_call):
-                if not self.history.call_history.is_legal_call(call):
-                    continue
+        # Candidates are all legal calls, so only preconditions need checking.
+        for rule, call in self._candidate_rules_and_calls():
+            if not rule.fits_preconditions(self.history, call, self.expected_call):
+                continue
 
-                current = maximal.get(call)
-                if not current:
-                    maximal[call] = (category, [rule])
-                else:
-                    existing_category, existing_rules = current
+            category = rule.category
+            current = maximal.get(call)
+            if not current:
+                maximal[call] = (category, [rule])
+            else:
+                existing_category, existing_rules = current
 
-                    # FIXME: It's lame that enum's < is backwards.
-                    if category < existing_category:
-                        if self.explain and call == self.expected_call:
-                            print "%s is higher category than %s" % (rule.name, str(maximal[call]))
-                        maximal[call] = (category, [rule])
-                    elif category == existing_category:
-                        existing_rules.append(rule)
+                # FIXME: It's lame that enum's < is backwards.
+                if category < existing_category:
+                    if self.explain and call == self.expected_call:
+                        print "%s is higher category than %s" % (rule.name, str(maximal[call]))
+                    maximal[call] = (category, [rule])
+                elif category == existing_category:
+                    existing_rules.append(rule)
 
         result = {}
         for call, best in maximal.iteritems():
@@ -548,39 +827,97 @@ class RuleSelector(object):
     def rule_for_call(self, call):
         return self._call_to_rule.get(call)
 
-    @memoized
+    @property
+    @instance_memoized
+    def _meanings_by_call(self):
+        return dict((call, list(rule.meaning_of(self.history, call))) for call, rule in self._call_to_rule.iteritems())
+
+    @property
+    @instance_memoized
+    def _negated_meanings(self):
+        negated_meanings = []
+        for unmade_call, unmade_rule in self._call_to_rule.iteritems():
+            for unmade_priority, unmade_z3_meaning in self._meanings_by_call[unmade_call]:
+                negated_meanings.append((unmade_priority, unmade_call, unmade_rule, z3.Not(unmade_z3_meaning)))
+        return negated_meanings
+
+    # Every meaning of every call shares these, so they're built once per priority.
+    @instance_memoized
+    def _negated_meanings_above(self, priority):
+        is_above = {}
+        negated_meanings = []
+        for negated_meaning in self._negated_meanings:
+            unmade_priority = negated_meaning[0]
+            above = is_above.get(unmade_priority)
+            if above is None:
+                above = self.system.priority_ordering.lt(priority, unmade_priority)
+                is_above[unmade_priority] = above
+            if above:
+                negated_meanings.append(negated_meaning)
+        return negated_meanings
+
+    @instance_memoized
     def constraints_for_call(self, call):
         situations = []
         rule = self.rule_for_call(call)
-        for priority, z3_meaning in rule.meaning_of(self.history, call):
+        for priority, z3_meaning in self._meanings_by_call[call]:
             situational_exprs = [z3_meaning]
-            for unmade_call, unmade_rule in self._call_to_rule.iteritems():
-                for unmade_priority, unmade_z3_meaning in unmade_rule.meaning_of(self.history, unmade_call):
-                    if self.system.priority_ordering.lt(priority, unmade_priority):
-                        if self.explain and self.expected_call == call:
-                            print "Adding negation %s (%s) to %s:" % (unmade_rule.name, unmade_call.name, rule.name)
-                            print " %s" % z3.simplify(z3.Not(unmade_z3_meaning))
-                        situational_exprs.append(z3.Not(unmade_z3_meaning))
+            for _, unmade_call, unmade_rule, negation in self._negated_meanings_above(priority):
+                if self.explain and self.expected_call == call:
+                    print "Adding negation %s (%s) to %s:" % (unmade_rule.name, unmade_call.name, rule.name)
+                    print " %s" % z3.simplify(negation)
+                situational_exprs.append(negation)
             situations.append(z3.And(situational_exprs))
 
         return z3.Or(situations)
 
+    def fits_hand(self, evaluator, z3_meaning):
+        # The hand is fully known, so we can usually skip the solver entirely.
+        try:
+            return evaluator.is_possible(z3_meaning)
+        except UnsupportedExpression:
+            return is_possible(_solver_pool.solver_for_hand(evaluator.hand), z3_meaning)
+
+    # (call, priority, z3_meaning) for every meaning of every legal call.
+    def meanings(self):
+        meanings = []
+        for call in self.history.legal_calls:
+            if self.rule_for_call(call):
+                meanings.extend((call, priority, z3_meaning) for priority, z3_meaning in self._meanings_by_call[call])
+        return meanings
+
     def possible_calls_for_hand(self, hand, expected_call):
         possible_calls = PossibleCalls(self.system.priority_ordering)
-        solver = _solver_pool.solver_for_hand(hand)
+        evaluator = HandEvaluator(hand)
         for call in self.history.legal_calls:
             rule = self.rule_for_call(call)
             if not rule:
                 continue
 
-            for priority, z3_meaning in rule.meaning_of(self.history, call):
-                if is_possible(solver, z3_meaning):
+            for priority, z3_meaning in self._meanings_by_call[call]:
+                if self.fits_hand(evaluator, z3_meaning):
                     possible_calls.add_call_with_priority(call, priority)
                 elif call == expected_call:
                     print "%s does not fit hand: %s" % (rule, z3_meaning)
 
         return possible_calls
 
+    def call_from_possible_calls(self, possible_calls):
+        maximal_calls_and_priorities = possible_calls.maximal_calls_and_priorities()
+        # We don't currently support tie-breaking priorities, but we do have some bids that
+        # we don't make without a planner.
+        no_planning_filter = lambda call_priority_tuple: not self.rule_for_call(call_priority_tuple[0]).requires_planning
+        maximal_calls_and_priorities = filter(no_planning_filter, maximal_calls_and_priorities)
+        if not maximal_calls_and_priorities:
+            return None
+        maximal_calls, maximal_priorities = zip(*maximal_calls_and_priorities)
+        if len(maximal_calls) != 1:
+            rules = map(self.rule_for_call, maximal_calls)
+            call_names = map(lambda call: call.name, maximal_calls)
+            print "WARNING: Unordered: %s rules: %s priorities: %s" % (call_names, rules, maximal_priorities)
+            return None
+        return maximal_calls[0]
+
 
 class InconsistentHistoryException(Exception):
     def __init__(self, annotations=None, constraints=None, rule=None):
@@ -589,34 +926,123 @@ class InconsistentHistoryException(Exception):
         self.rule = rule
 
 
+class HistoryCacheNode(object):
+    __slots__ = ('parent', 'call_index', 'children', 'history', 'call_count')
+
+    def __init__(self, parent=None, call_index=None):
+        self.parent = parent
+        self.call_index = call_index
+        self.children = {}
+        self.history = None
+        self.call_count = 0
+
+
+# A trie of interpreted histories keyed by call.  Interpretation does not
+# depend on the dealer or vulnerability, so only the calls are used as keys.
+#
+# Each cached history's solver holds assertions for every call in it, so
+# longer histories cost more to keep.  Besides size_limit histories, the cache
+# holds at most call_limit calls, summed over its histories.  The 100
+# histories a test-sayc run keeps hold at most about 720 calls, so call_limit
+# only matters when the cached auctions are unusually long.
 class HistoryCache(object):
-    # FIXME: size_limit has not been tuned at all.
-    def __init__(self, size_limit=100):
-        self.lru = collections.deque(maxlen=size_limit)
+    def __init__(self, size_limit=100, call_limit=1000):
+        self.size_limit = size_limit
+        self.call_limit = call_limit
+        self._root = HistoryCacheNode()
+        # Nodes holding a history, least recently used first.
+        self._lru = collections.OrderedDict()
+        self._call_count = 0
+        self.statistics = CacheStatistics("HistoryCache")
+
+    def __len__(self):
+        return len(self._lru)
 
-    # Python 3.2's functools has an @lru_cache decorator, but we can't use that yet.
-    def lookup(self, call_history):
-        calls_string = call_history.calls_string()
-        best_match = ""
-        best_history = None
-        for call_string_and_history in self.lru:
-            key = call_string_and_history[0]
-            if len(key) > len(best_match) and calls_string.startswith(key):
-                best_match = key
-                best_history = call_string_and_history[1]
-
-        if len(best_match):
-            calls_matched = best_match.count(' ') + 1
-            return best_history, call_history.calls[calls_matched:]
+    @property
+    def call_count(self):
+        return self._call_count
+
+    def _touch(self, node):
+        # Walking leaf-to-root leaves every node more recently used than its
+        # descendants, so eviction always removes leaves first.
+        while node is not self._root:
+            if node.history is not None:
+                del self._lru[node]
+                self._lru[node] = True
+            node = node.parent
+
+    def _discard_subtree(self, node):
+        for child in node.children.values():
+            self._discard_subtree(child)
+        node.children = {}
+        if node.history is not None:
+            del self._lru[node]
+            self._call_count -= node.call_count
+            node.history = None
+
+    def _remove(self, node):
+        self._discard_subtree(node)
+        # Drop the node and any interior nodes which no longer lead to a history.
+        while node is not self._root and node.history is None and not node.children:
+            del node.parent.children[node.call_index]
+            node = node.parent
+
+    def _evict(self):
+        while self._lru and (len(self._lru) > self.size_limit or self._call_count > self.call_limit):
+            count = len(self._lru)
+            self._remove(next(iter(self._lru)))
+            self.statistics.evictions += count - len(self._lru)
 
+    def lookup(self, call_history):
+        node = self._root
+        best_node = None
+        calls_matched = 0
+        for index, call in enumerate(call_history.calls):
+            node = node.children.get(call.index)
+            if not node:
+                break
+            if node.history is not None:
+                best_node = node
+                calls_matched = index + 1
+
+        if best_node:
+            self.statistics.hits += 1
+            self._touch(best_node)
+            return best_node.history, call_history.calls[calls_matched:]
+
+        self.statistics.misses += 1
         return History(), call_history.calls
 
     def add(self, history):
-        call_string_and_history = (history.call_history.calls_string(), history)
-        self.lru.append(call_string_and_history)
+        node = self._root
+        for call in history.call_history.calls:
+            child = node.children.get(call.index)
+            if not child:
+                child = HistoryCacheNode(node, call.index)
+                node.children[call.index] = child
+            node = child
+
+        if node.history is None:
+            self._lru[node] = True
+        self._call_count -= node.call_count
+        node.history = history
+        node.call_count = len(history.call_history)
+        self._call_count += node.call_count
+        self._touch(node)
+        self._evict()
+
+    def clear(self):
+        self._root = HistoryCacheNode()
+        self._lru.clear()
+        self._call_count = 0
 
 
 history_cache = HistoryCache()
+register_cache(history_cache)
+
+
+# A precomputed z3b.atlas.Atlas, consulted before solving.  See z3b.atlas.install_atlas.
+interpretation_atlas = None
 
 
 class Interpreter(object):
@@ -628,8 +1054,10 @@ class Interpreter(object):
         if explain:
             print call.name
 
-        expected_call = call if explain else None
-        selector = RuleSelector(self.system, history, expected_call=expected_call, explain=explain)
+        if explain:
+            selector = RuleSelector(self.system, history, expected_call=call, explain=explain)
+        else:
+            selector = RuleSelector.for_history(self.system, history)
 
         rule = selector.rule_for_call(call)
         if not rule:
@@ -638,11 +1066,19 @@ class Interpreter(object):
         annotations = rule.annotations_for_call(call)
         if explain:
             print "Selected %s for %s:" % (rule, call)
+
+        # The atlas already knows whether the call is consistent, and what it shows.
+        record = None
+        if interpretation_atlas and interpretation_atlas.system is self.system and not explain:
+            record = interpretation_atlas.record_for_call(history.call_history, call)
+        if record and not record.is_consistent:
+            raise InconsistentHistoryException(annotations, None, rule)
+
         constraints = selector.constraints_for_call(call)
-        if not history.is_consistent(positions.Me, constraints):
+        if not record and not history.is_consistent(positions.Me, constraints):
             raise InconsistentHistoryException(annotations, constraints, rule)
 
-        new_history = history.extend_with(call, annotations, constraints, rule)
+        new_history = history.extend_with(call, annotations, constraints, rule, record.summary if record else None)
         history_cache.add(new_history)
         return new_history
 
@@ -0,0 +1,225 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+from core import suit
+import z3
+import z3b.model as model
+
+
+class UnsupportedExpression(Exception):
+    pass
+
+
+def _name(var):
+    return var.decl().name()
+
+
+# expr_for_hand pins every model variable to a concrete value except
+# playing_points, which the axioms only bound to [high_card_points, 55].
+FREE_VARIABLE_NAME = _name(model.playing_points)
+MAX_PLAYING_POINTS = 55
+
+_suit_length_names = [_name(model.expr_for_suit(_suit)) for _suit in suit.SUITS]
+_honor_names = [map(_name, model._honor_vars(_suit)) for _suit in suit.SUITS]
+_support_points_names = [_name(model.support_points_expr_for_suit(_suit)) for _suit in suit.SUITS]
+_high_card_points_name = _name(model.high_card_points)
+_points_name = _name(model.points)
+
+
+_infix_ops = {
+    z3.Z3_OP_AND: " and ",
+    z3.Z3_OP_OR: " or ",
+    z3.Z3_OP_ADD: " + ",
+    z3.Z3_OP_SUB: " - ",
+    z3.Z3_OP_MUL: " * ",
+}
+
+_comparison_ops = {
+    z3.Z3_OP_EQ: " == ",
+    z3.Z3_OP_LE: " <= ",
+    z3.Z3_OP_LT: " < ",
+    z3.Z3_OP_GE: " >= ",
+    z3.Z3_OP_GT: " > ",
+}
+
+
+class CompiledExpression(object):
+    def __init__(self, function, comparisons_with_free_variable):
+        self.function = function
+        # (left - right) for each comparison which mentions the free variable.
+        self.comparisons_with_free_variable = comparisons_with_free_variable
+
+
+# Translates z3 expressions into python lambdas over a dictionary of variable values.
+# z3 hash-conses its asts, so the same meaning built over and over again (for
+# every history and every hand) has the same ast id and is only compiled once.
+class ExpressionCompiler(object):
+    infix_ops = _infix_ops
+    comparison_ops = _comparison_ops
+    true_source = "True"
+    false_source = "False"
+    not_format = "(not %s)"
+    implies_format = "((not %s) or %s)"
+
+    # A whole test-sayc run compiles about 1300 meanings, and bidding 100 random
+    # boards about 1100.  The limit is well above either, and only stops a
+    # long running server from growing forever; going over costs recompiling.
+    def __init__(self, size_limit=20000):
+        self.size_limit = size_limit
+        # These are keyed by ast id.  The expr is stored alongside the result
+        # to keep the ast (and thus its id) alive for the life of the cache.
+        self._compiled = {}
+        self._sources = {}
+
+    def _source(self, expr):
+        key = expr.get_id()
+        cached = self._sources.get(key)
+        if cached:
+            return cached[1], cached[2]
+        source, mentions_free, comparisons = self._compute_source(expr)
+        self._sources[key] = (expr, (source, mentions_free), comparisons)
+        return (source, mentions_free), comparisons
+
+    def _arg_sources(self, expr):
+        sources = []
+        mentions_free = False
+        comparisons = []
+        for index in range(expr.num_args()):
+            (source, arg_mentions_free), arg_comparisons = self._source(expr.arg(index))
+            sources.append(source)
+            mentions_free = mentions_free or arg_mentions_free
+            comparisons.extend(arg_comparisons)
+        return sources, mentions_free, comparisons
+
+    def _ite_source(self, condition, if_true, if_false):
+        return "(%s if %s else %s)" % (if_true, condition, if_false)
+
+    def _distinct_source(self, sources):
+        return "(len(set([%s])) == %d)" % (", ".join(sources), len(sources))
+
+    def _compute_source(self, expr):
+        kind = expr.decl().kind()
+        if kind == z3.Z3_OP_ANUM:
+            return str(expr.as_long()), False, []
+        if kind == z3.Z3_OP_TRUE:
+            return self.true_source, False, []
+        if kind == z3.Z3_OP_FALSE:
+            return self.false_source, False, []
+        if kind == z3.Z3_OP_UNINTERPRETED and expr.num_args() == 0:
+            name = _name(expr)
+            if name == FREE_VARIABLE_NAME:
+                return "p", True, []
+            return "v[%r]" % name, False, []
+
+        sources, mentions_free, comparisons = self._arg_sources(expr)
+        if kind in self.infix_ops:
+            if not sources:
+                return (self.true_source if kind == z3.Z3_OP_AND else self.false_source), False, []
+            source = "(%s)" % self.infix_ops[kind].join(sources)
+        elif kind in self.comparison_ops:
+            source = "(%s)" % self.comparison_ops[kind].join(sources)
+            if mentions_free:
+                comparisons = comparisons + ["(%s) - (%s)" % tuple(sources)]
+        elif kind == z3.Z3_OP_NOT:
+            source = self.not_format % sources[0]
+        elif kind == z3.Z3_OP_UMINUS:
+            source = "(-%s)" % sources[0]
+        elif kind == z3.Z3_OP_IMPLIES:
+            source = self.implies_format % tuple(sources)
+        elif kind == z3.Z3_OP_ITE:
+            source = self._ite_source(*sources)
+        elif kind == z3.Z3_OP_DISTINCT:
+            source = self._distinct_source(sources)
+        else:
+            raise UnsupportedExpression("Unsupported expression: %s" % expr)
+        return source, mentions_free, comparisons
+
+    def _lambda(self, source):
+        try:
+            return eval("lambda v, p: " + source, self._namespace())
+        except (SyntaxError, MemoryError, RuntimeError):
+            # Python's parser has a fixed nesting limit.
+            raise UnsupportedExpression("Failed to compile: %s" % source)
+
+    def _namespace(self):
+        return {}
+
+    def compile(self, expr):
+        key = expr.get_id()
+        cached = self._compiled.get(key)
+        if cached:
+            return cached[1]
+        if len(self._compiled) > self.size_limit:
+            self._compiled.clear()
+            self._sources.clear()
+        (source, _), comparisons = self._source(expr)
+        compiled = CompiledExpression(self._lambda(source), map(self._lambda, comparisons))
+        self._compiled[key] = (expr, compiled)
+        return compiled
+
+
+_compiler = ExpressionCompiler()
+
+
+# HandEvaluator answers the same question as is_possible(solver_for_hand(hand), expr)
+# without a solver, by computing the model's variables directly from the hand.
+class HandEvaluator(object):
+    def __init__(self, hand):
+        self.hand = hand
+        self._values = self._values_for_hand(hand)
+        self._free_range = (self._values[_high_card_points_name], MAX_PLAYING_POINTS)
+
+    @classmethod
+    def _values_for_hand(cls, hand):
+        values = {}
+        lengths = map(hand.length_of_suit, suit.SUITS)
+        for _suit in suit.SUITS:
+            cards = hand.cards_in_suit(_suit)
+            values[_suit_length_names[_suit.index]] = lengths[_suit.index]
+            for honor_name, card in zip(_honor_names[_suit.index], ('A', 'K', 'Q', 'J', 'T')):
+                values[honor_name] = int(card in cards)
+
+        hcp = hand.high_card_points()
+        values[_high_card_points_name] = hcp
+        values[_points_name] = hcp
+
+        for count_name, count in (('void', 0), ('singleton', 1), ('doubleton', 2)):
+            matches = [int(length == count) for length in lengths]
+            for _suit, match in zip(suit.SUITS, matches):
+                values["%s_in_%s" % (count_name, _suit.name.lower())] = match
+            values[count_name + "s"] = sum(matches)
+
+        # This matches the points_supporting_* axioms in model.py.
+        voids, singletons, doubletons = values['voids'], values['singletons'], values['doubletons']
+        for _suit in suit.SUITS:
+            length = lengths[_suit.index]
+            if length <= 2:
+                support_points = hcp
+            elif length == 3:
+                support_points = hcp + doubletons + 2 * singletons + 3 * voids
+            else:
+                support_points = hcp + doubletons + 3 * singletons + 5 * voids
+            values[_support_points_names[_suit.index]] = support_points
+        return values
+
+    def _candidate_free_values(self, compiled):
+        low, high = self._free_range
+        candidates = set([low, high])
+        for difference in compiled.comparisons_with_free_variable:
+            # Meanings are linear, so each comparison flips at most once as the free variable grows.
+            offset = difference(self._values, 0)
+            slope = difference(self._values, 1) - offset
+            if not slope:
+                continue
+            threshold = -offset // slope
+            # The truth of the expression is constant between thresholds, so checking
+            # either side of each threshold (and both bounds) covers every possible value.
+            candidates.update(value for value in range(threshold - 1, threshold + 3) if low <= value <= high)
+        return candidates
+
+    def is_possible(self, expr):
+        compiled = _compiler.compile(expr)
+        if not compiled.comparisons_with_free_variable:
+            return bool(compiled.function(self._values, self._free_range[1]))
+        return any(compiled.function(self._values, free_value) for free_value in self._candidate_free_values(compiled))
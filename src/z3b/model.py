@@ -4,6 +4,7 @@
 
 from z3b import enum
 import core.suit as suit
+import weakref
 import z3
 
 
@@ -233,6 +234,12 @@ def expr_for_hand(hand):
     )
 
 
+# expr_for_hand only looks at suit lengths and the top five honors, so hands
+# with the same key are indistinguishable to the model.
+def feature_key_for_hand(hand):
+    return tuple((len(cards), "".join(card for card in cards if card in 'AKQJT')) for cards in map(hand.cards_in_suit, suit.SUITS))
+
+
 positions = enum.Enum(
     "RHO",
     "Partner",
@@ -241,7 +248,62 @@ positions = enum.Enum(
 )
 
 
+# Answers is_possible/is_certain by asserting (literal implies expr) once per
+# solver and expr, and checking under the assumption literal, so the solver
+# keeps what it learned between queries instead of losing it to pop().
+# Unassumed literals are free, so they don't change any other check().
+# The implications live in whatever scope the solver was in, so anyone who
+# pops a scope and pushes a new one at the same depth (as SolverPool does)
+# must forget() the solver.
+class AssumptionQueries(object):
+    def __init__(self):
+        # solver -> {expr id: (expr, literal, scope count)}
+        self._literals_by_solver = weakref.WeakKeyDictionary()
+        self._literal_count = 0
+
+    def _literal_for(self, solver, expr):
+        literals = self._literals_by_solver.setdefault(solver, {})
+        scope_count = z3.Z3_solver_get_num_scopes(solver.ctx.ref(), solver.solver)
+        # exprs are hash-consed, so equal exprs have equal ids.  expr itself
+        # is kept alive by the entry, so its id can't be reused.
+        entry = literals.get(expr.get_id())
+        if entry and entry[2] <= scope_count:
+            return entry[1]
+        self._literal_count += 1
+        literal = z3.Bool("_assumption_%s" % self._literal_count)
+        solver.add(z3.Implies(literal, expr))
+        literals[expr.get_id()] = (expr, literal, scope_count)
+        return literal
+
+    def forget(self, solver):
+        self._literals_by_solver.pop(solver, None)
+
+    def is_certain(self, solver, expr):
+        return solver.check(self._literal_for(solver, z3.Not(expr))) == z3.unsat
+
+    def is_possible(self, solver, expr):
+        return solver.check(self._literal_for(solver, expr)) == z3.sat
+
+
+# Set with use_assumption_queries.  None means push/add/check/pop.
+assumption_queries = None
+
+
+def use_assumption_queries(enabled=True):
+    global assumption_queries
+    assumption_queries = AssumptionQueries() if enabled else None
+
+
+# Solvers which are about to be popped back to a state is_possible/is_certain
+# may have asserted into must be forgotten first.
+def forget_solver(solver):
+    if assumption_queries:
+        assumption_queries.forget(solver)
+
+
 def is_certain(solver, expr):
+    if assumption_queries:
+        return assumption_queries.is_certain(solver, expr)
     solver.push()
     solver.add(z3.Not(expr))
     result = solver.check() == z3.unsat
@@ -250,6 +312,8 @@ def is_certain(solver, expr):
 
 
 def is_possible(solver, expr):
+    if assumption_queries:
+        return assumption_queries.is_possible(solver, expr)
     solver.push()
     solver.add(expr)
     result = solver.check() == z3.sat
@@ -1,6 +1,8 @@
+import collections
 import functools
-import networkx
 
+# Orderings are compiled into a dense integer rank per item and, for each
+# item, a bitset (a python long) of the ranks of every item greater than it.
 class Ordering(object):
     @functools.total_ordering
     class OrderedItem(object):
@@ -15,13 +17,39 @@ class Ordering(object):
             return self._ordering.lt(self._item, other._item)
 
     def __init__(self):
-        self._graph = networkx.DiGraph()
+        # item -> set of items directly greater than it, in insertion order.
+        self._successors = collections.OrderedDict()
         self._compiled = True
+        self._ranks = {}
+        self._bits = {}
+        self._items_by_rank = []
+        self._greater_bits = {}
 
     def lt(self, left, right):
+        if not self._compiled:
+            self._compile()
+
+        return bool(self._greater_bits.get(left, 0) & self._bits.get(right, 0))
+
+    def bit(self, item):
+        self._compile()
+
+        return self._bits.get(item, 0)
+
+    # lt(item, other) is True exactly when bit(other) & greater_bits(item).
+    def greater_bits(self, item):
         self._compile()
 
-        return self._graph.has_edge(left, right)
+        return self._greater_bits.get(item, 0)
+
+    def items(self):
+        self._compile()
+
+        return list(self._items_by_rank)
+
+    def greater_items(self, item):
+        bits = self.greater_bits(item)
+        return [other for rank, other in enumerate(self._items_by_rank) if bits >> rank & 1]
 
     def key(self, item):
         return Ordering.OrderedItem(self, item)
@@ -33,29 +61,51 @@ class Ordering(object):
         for blob in args:
             for item in self._iterate(blob):
                 result.add(item)
+                self._successors.setdefault(item, set())
 
         for i in range(len(args)-1):
             for lower in self._iterate(args[i]):
                 for higher in self._iterate(args[i+1]):
-                    self._graph.add_edge(lower, higher)
+                    self._successors[lower].add(higher)
 
         return result
 
+    def _topological_order(self):
+        predecessor_counts = dict((item, 0) for item in self._successors)
+        for higher_items in self._successors.values():
+            for higher in higher_items:
+                predecessor_counts[higher] += 1
+
+        ready = [item for item, count in predecessor_counts.items() if not count]
+        ordered = []
+        while ready:
+            item = ready.pop()
+            ordered.append(item)
+            for higher in self._successors[item]:
+                predecessor_counts[higher] -= 1
+                if not predecessor_counts[higher]:
+                    ready.append(higher)
+
+        assert len(ordered) == len(self._successors), "Cycle detected"
+        return ordered
+
     def _compile(self):
         if self._compiled:
             return
 
-        for left in self._graph.nodes_iter():
-            for right in networkx.descendants(self._graph, left):
-                self._graph.add_edge(left, right)
+        # Every item is ranked below all of the items greater than it.
+        self._items_by_rank = self._topological_order()
+        self._ranks = dict((item, rank) for rank, item in enumerate(self._items_by_rank))
+        self._bits = dict((item, 1 << rank) for item, rank in self._ranks.items())
+        self._greater_bits = {}
+        for item in reversed(self._items_by_rank):
+            bits = 0
+            for higher in self._successors[item]:
+                bits |= self._greater_bits[higher] | self._bits[higher]
+            self._greater_bits[item] = bits
 
-        self._check_cycles()
         self._compiled = True
 
-    def _check_cycles(self):
-        if not networkx.is_directed_acyclic_graph(self._graph):
-            assert False, "Cycle detected"
-
     def _iterate(self, list_or_not):
         try:
             for item in list_or_not:
@@ -72,6 +72,9 @@ def did_bid_annotation(suit):
 # for faster matching, or asserting about unreachable call_names, etc.
 class Precondition(object):
     repr_name = None
+    # A fact which RuleIndex.facts_for(history) must include for this
+    # precondition to fit, so RuleIndex can skip the rule without calling fits.
+    required_fact = None
 
     def __repr__(self):
         name = self.repr_name or self.__class__.__name__
@@ -123,6 +126,8 @@ class AndPrecondition(SummaryPrecondition):
 
 
 class NoOpening(Precondition):
+    required_fact = ('no_opening',)
+
     def fits(self, history, call):
         return annotations.Opening not in history.annotations
 
@@ -223,6 +228,10 @@ class LastBidHasAnnotation(Precondition):
     def repr_args(self):
         return [self.position.key, self.annotation.key]
 
+    @property
+    def required_fact(self):
+        return ('last_call_annotation', self.position, self.annotation)
+
     def fits(self, history, call):
         return self.annotation in history.view_for(self.position).annotations_for_last_call
 
@@ -281,6 +290,10 @@ class LastBidWas(Precondition):
     def repr_args(self):
         return [self.position.key, self.call_name]
 
+    @property
+    def required_fact(self):
+        return ('last_call', self.position, self.call_name)
+
     def fits(self, history, call):
         last_call = history.view_for(self.position).last_call
         return last_call and last_call.name == self.call_name
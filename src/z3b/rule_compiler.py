@@ -2,7 +2,7 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
-from core.call import Call
+from core.call import Call, calls_in_mask, mask_for_calls
 from itertools import chain
 from third_party.memoized import memoized
 from z3b import enum
@@ -10,6 +10,7 @@ from z3b import model
 from z3b import ordering
 from z3b.constraints import Constraint
 from z3b.preconditions import implies_artificial, annotations
+import collections
 import z3
 
 
@@ -43,6 +44,12 @@ class RuleOrdering(object):
             print "Exception during lt(%s, %s)" % (left, right)
             raise
 
+    def bit(self, priority):
+        return self.ordering.bit(priority)
+
+    def greater_bits(self, priority):
+        return self.ordering.greater_bits(priority)
+
 
 rule_order = RuleOrdering()
 
@@ -59,6 +66,7 @@ class CompiledRule(object):
         self.dsl_rule = rule
         self.preconditions = preconditions
         self.known_calls = known_calls
+        self.known_call_mask = mask_for_calls(known_calls)
         self.shared_constraints = shared_constraints
         self._annotations = annotations
         self.constraints = constraints
@@ -102,7 +110,11 @@ class CompiledRule(object):
             return explanation
         return self.dsl_rule.explanation
 
-    def _fits_preconditions(self, history, call, expected_call=None):
+    @property
+    def category(self):
+        return self.dsl_rule.category
+
+    def fits_preconditions(self, history, call, expected_call=None):
         try:
             for precondition in self.preconditions:
                 if not precondition.fits(history, call):
@@ -115,9 +127,9 @@ class CompiledRule(object):
         return True
 
     def calls_over(self, history, expected_call=None):
-        for call in history.legal_calls.intersection(self.known_calls):
-            if self._fits_preconditions(history, call, expected_call):
-                yield self.dsl_rule.category, call
+        for call in calls_in_mask(history.legal_call_mask & self.known_call_mask):
+            if self.fits_preconditions(history, call, expected_call):
+                yield self.category, call
 
     def _constraint_exprs_for_call(self, history, call):
         exprs = []
@@ -273,6 +285,59 @@ class RuleCompiler(object):
             raise
 
 
+# Indexes rules by the calls they know and by one fact about the history
+# which their preconditions require, so that only rules which could apply to a
+# history need their preconditions evaluated.
+class RuleIndex(object):
+    # Facts which hold over fewer histories are more selective keys.
+    FACT_KIND_SELECTIVITY = ('last_call_annotation', 'no_opening', 'last_call')
+
+    def __init__(self, rules):
+        # required fact (or None) -> call -> [(index in rules, rule)]
+        self._rules_by_fact_and_call = collections.defaultdict(lambda: collections.defaultdict(list))
+        # required fact (or None) -> mask of the calls any of its rules know
+        self._call_mask_by_fact = collections.defaultdict(int)
+        for rule_index, rule in enumerate(rules):
+            fact = self._key_fact(rule)
+            for call in rule.known_calls:
+                self._rules_by_fact_and_call[fact][call].append((rule_index, rule))
+            self._call_mask_by_fact[fact] |= rule.known_call_mask
+
+    def _key_fact(self, rule):
+        facts = filter(None, [precondition.required_fact for precondition in rule.preconditions])
+        if not facts:
+            return None
+        return min(facts, key=lambda fact: self.FACT_KIND_SELECTIVITY.index(fact[0]))
+
+    @classmethod
+    def facts_for(cls, history):
+        facts = set()
+        for position in model.positions:
+            view = history.view_for(position)
+            last_call = view.last_call
+            if last_call:
+                facts.add(('last_call', position, last_call.name))
+            for annotation in view.annotations_for_last_call:
+                facts.add(('last_call_annotation', position, annotation))
+        if annotations.Opening not in history.annotations:
+            facts.add(('no_opening',))
+        return facts
+
+    # Returns (rule, call) pairs for the legal calls over history, in the
+    # order the rules were indexed.  Preconditions still need checking.
+    def candidates(self, history):
+        candidates = []
+        legal_call_mask = history.legal_call_mask
+        for fact in [None] + list(self.facts_for(history)):
+            rules_by_call = self._rules_by_fact_and_call.get(fact)
+            if not rules_by_call:
+                continue
+            for call in calls_in_mask(legal_call_mask & self._call_mask_by_fact[fact]):
+                candidates.extend((rule_index, rule, call) for rule_index, rule in rules_by_call[call])
+        candidates.sort(key=lambda candidate: candidate[0])
+        return [(rule, call) for _, rule, call in candidates]
+
+
 # The rules of SAYC are all described in terms of Rule.
 # These classes exist to support the DSL and make it easy to concisely express
 # the conventions of SAYC.
@@ -1,6 +1,7 @@
 
 from z3b.rules import *
 from z3b.cappelletti import *
+from z3b.rule_compiler import RuleIndex
 
 
 def _get_subclasses(base_class):
@@ -18,4 +19,5 @@ class StandardAmericanYellowCard(object):
     # rules cannot currently be a set() as CompiledRule is not hashable.
     rules = [RuleCompiler.compile(description_class) for description_class in _concrete_rule_classes()]
     assert len(rules) == len([rule.name for rule in rules]), "Duplicate rules!"
+    rule_index = RuleIndex(rules)
     priority_ordering = rule_order
@@ -0,0 +1,116 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import hashlib
+import os.path
+import shutil
+import tempfile
+import unittest2
+from core.call import Call
+from core.callhistory import CallHistory
+from core.hand import Hand
+from z3b.atlas import Atlas, AtlasBuilder, AtlasRecord, MappedAtlas, install_atlas, load_atlas
+from z3b.bidder import Bidder, History, Interpreter
+
+
+HANDS = (
+    "AKJ52.J.J9743.54",
+    "K3.AQ8.KJ75.Q842",
+    "32.32.32.AKQJT98",
+    "Q74.K965.A83.J72",
+)
+
+
+class AtlasTest(unittest2.TestCase):
+    DEPTH = 2
+
+    # Building even a shallow atlas interprets every auction, so the tests share one.
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.builder = AtlasBuilder(cls.DEPTH, os.path.join(cls.temp_dir, "shards"), 2)
+        cls.text_path = os.path.join(cls.temp_dir, "atlas.txt")
+        cls.mapped_path = os.path.join(cls.temp_dir, "atlas.mapped")
+        cls.builder.build(cls.text_path)
+        MappedAtlas.write(Atlas.load(cls.text_path), cls.mapped_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir)
+
+    def _records_json(self, atlas):
+        return [(packed_calls, record.to_json()) for packed_calls, record in atlas.items()]
+
+    def test_build(self):
+        self.assertEquals(self.builder.pending_shards(), [])
+        atlas = Atlas.load(self.text_path)
+        self.assertEquals(atlas.depth, self.DEPTH)
+        records = atlas.records_over(CallHistory())
+        self.assertEquals(len(records), len(self.builder.shards()))
+
+        interpreter = Interpreter()
+        for call_name in ("P", "1C", "1N", "2C", "3S"):
+            call = Call.from_string(call_name)
+            history = interpreter.extend_history(History(), call)
+            self.assertEquals(records[call].rule_name, history.rho.rule_for_last_call.name)
+            self.assertTrue(records[call].is_consistent)
+        self.assertFalse(records[Call.from_string("7N")].is_consistent)
+
+        # Nothing is known past the atlas' depth.
+        self.assertIsNone(atlas.records_over(CallHistory.from_string("1C P")))
+        self.assertIsNotNone(atlas.records_over(CallHistory.from_string("1C")))
+
+    def test_rebuild_resumes(self):
+        rebuilt_path = os.path.join(self.temp_dir, "rebuilt.txt")
+        self.builder.build(rebuilt_path)
+        self.assertEquals(open(rebuilt_path).read(), open(self.text_path).read())
+
+    def test_mapped_atlas_matches_text_atlas(self):
+        text_atlas = load_atlas(self.text_path)
+        mapped_atlas = load_atlas(self.mapped_path)
+        self.assertEquals(type(text_atlas), Atlas)
+        self.assertEquals(type(mapped_atlas), MappedAtlas)
+        self.assertEquals(len(mapped_atlas), len(text_atlas))
+        self.assertEquals(self._records_json(mapped_atlas), self._records_json(text_atlas))
+        for calls_string in ("", "1C", "1N", "P"):
+            call_history = CallHistory.from_string(calls_string)
+            self.assertEquals(mapped_atlas.call_to_rule_over(call_history), text_atlas.call_to_rule_over(call_history))
+        call_history = CallHistory.from_string("1C")
+        self.assertEquals(mapped_atlas.record_for_call(call_history, Call.from_string("1H")).to_json(), text_atlas.record_for_call(call_history, Call.from_string("1H")).to_json())
+
+    def test_record_json_round_trip(self):
+        for _, record in Atlas.load(self.text_path).items():
+            self.assertEquals(AtlasRecord.from_json(record.to_json()).to_json(), record.to_json())
+
+    def test_identifier(self):
+        text_atlas = load_atlas(self.text_path)
+        mapped_atlas = load_atlas(self.mapped_path)
+        self.assertEquals(text_atlas.identifier, hashlib.sha1(open(self.text_path).read()).hexdigest())
+        self.assertEquals(mapped_atlas.identifier, hashlib.sha1(open(self.mapped_path, "rb").read()).hexdigest())
+        self.assertNotEqual(text_atlas.identifier, mapped_atlas.identifier)
+        self.assertIsNone(Atlas(self.DEPTH, {}).identifier)
+
+    def test_stale_atlas(self):
+        stale_path = os.path.join(self.temp_dir, "stale.txt")
+        with open(stale_path, "w") as stale_file:
+            stale_file.write('{"depth": 1}\n')
+            stale_file.write("1C\t%s\n" % AtlasRecord("NoSuchRule", True).to_json())
+        self.assertRaises(ValueError, Atlas.load, stale_path)
+
+    def test_bidding_with_atlas(self):
+        bidder = Bidder()
+        hands = map(Hand.from_cdhs_string, HANDS)
+        call_histories = map(CallHistory.from_string, ("", "P", "1C", "1N"))
+        expected_calls = [[bidder.find_call_for(hand, call_history) for hand in hands] for call_history in call_histories]
+        for path in (self.text_path, self.mapped_path):
+            install_atlas(load_atlas(path))
+            try:
+                calls = [[bidder.find_call_for(hand, call_history) for hand in hands] for call_history in call_histories]
+            finally:
+                install_atlas(None)
+            self.assertEquals(calls, expected_calls)
+
+
+if __name__ == '__main__':
+    unittest2.main()
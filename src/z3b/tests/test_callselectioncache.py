@@ -0,0 +1,65 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest2
+from core.callhistory import CallHistory
+from core.hand import Hand
+from z3b import bidder
+from z3b.bidder import Bidder, Interpreter, call_selection_cache
+import z3b.model as model
+
+
+# Pairs of hands which differ only in spot cards below the ten.
+SAME_FEATURE_HANDS = (
+    ("AKJ52.J.J9743.54", "AKJ43.J.J9852.32"),
+    ("732.Q32.AJ8.AKJ9", "852.Q54.AJ3.AKJ7"),
+    ("T765.QJ2.KQ.A842", "T432.QJ9.KQ.A765"),
+    ("2.AKQJT9876.5.43", "3.AKQJT9872.6.54"),
+)
+
+
+class CallSelectionCacheTest(unittest2.TestCase):
+    def setUp(self):
+        call_selection_cache.clear()
+
+    def tearDown(self):
+        call_selection_cache.clear()
+
+    def test_cached_selections_match_uncached(self):
+        test_bidder = Bidder()
+        for calls_string in ("", "P", "1H P", "1S P 2S P", "1C 1H", "1N P"):
+            call_history = CallHistory.from_string(calls_string)
+            for hand_strings in SAME_FEATURE_HANDS:
+                first_hand, second_hand = map(Hand.from_cdhs_string, hand_strings)
+                self.assertEquals(model.feature_key_for_hand(first_hand), model.feature_key_for_hand(second_hand))
+                # The second lookup is answered from the first hand's selection.
+                first_call = test_bidder.find_call_for(first_hand, call_history)
+                hits = call_selection_cache.statistics.hits
+                cached_call = test_bidder.find_call_for(second_hand, call_history)
+                if first_call:
+                    self.assertEquals(call_selection_cache.statistics.hits, hits + 1)
+                call_selection_cache.clear()
+                self.assertEquals(test_bidder.find_call_for(second_hand, call_history), cached_call)
+
+    def test_key(self):
+        test_bidder = Bidder()
+        hand = Hand.from_cdhs_string("AKJ52.J.J9743.54")
+        interpreter = Interpreter()
+        history = interpreter.create_history(CallHistory.from_string("1H P"))
+        key = test_bidder._call_selection_key(hand, history)
+        # Dealer and vulnerability don't change the interpretation.
+        other_history = interpreter.create_history(CallHistory.from_string("1H P", dealer_char='W', vulnerability_string='Both'))
+        self.assertEquals(test_bidder._call_selection_key(hand, other_history), key)
+        self.assertNotEquals(test_bidder._call_selection_key(hand, interpreter.create_history(CallHistory.from_string("1S P"))), key)
+        # Selections are only reused with the atlas they were made with.
+        previous_atlas = bidder.interpretation_atlas
+        bidder.interpretation_atlas = object()
+        try:
+            self.assertNotEquals(test_bidder._call_selection_key(hand, history), key)
+        finally:
+            bidder.interpretation_atlas = previous_atlas
+
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -0,0 +1,85 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest2
+from core.callhistory import CallHistory
+from z3b.bidder import History, HistoryCache
+import z3b.model as model
+
+
+def _history_for(calls_string):
+    history = History()
+    for call in CallHistory.from_string(calls_string).calls:
+        history = history.extend_with(call, [], model.NO_CONSTRAINTS, None)
+    return history
+
+
+class HistoryCacheTest(unittest2.TestCase):
+    def _cached_calls(self, cache, calls_string):
+        history, remaining_calls = cache.lookup(CallHistory.from_string(calls_string))
+        return history.call_history.calls_string()
+
+    def test_lookup(self):
+        cache = HistoryCache()
+        cache.add(_history_for("1C"))
+        cache.add(_history_for("1C P 1H"))
+        history, remaining_calls = cache.lookup(CallHistory.from_string("1C P 1H P 2H"))
+        self.assertEquals(history.call_history.calls_string(), "1C P 1H")
+        self.assertEquals([call.name for call in remaining_calls], ["P", "2H"])
+        # Only histories are matched, not the nodes leading to them.
+        history, remaining_calls = cache.lookup(CallHistory.from_string("1C P"))
+        self.assertEquals(history.call_history.calls_string(), "1C")
+        history, remaining_calls = cache.lookup(CallHistory.from_string("1D"))
+        self.assertEquals(len(history.call_history), 0)
+        self.assertEquals(len(remaining_calls), 1)
+        # Dealer and vulnerability aren't part of the key.
+        history, remaining_calls = cache.lookup(CallHistory.from_string("1C P 1H", dealer_char='E', vulnerability_string='Both'))
+        self.assertEquals(history.call_history.calls_string(), "1C P 1H")
+
+    def test_size_limit(self):
+        cache = HistoryCache(size_limit=3)
+        for calls_string in ("1C", "1D", "1H"):
+            cache.add(_history_for(calls_string))
+        self.assertEquals(len(cache), 3)
+        # Looking up 1C makes 1D the least recently used.
+        self._cached_calls(cache, "1C P")
+        cache.add(_history_for("1S"))
+        self.assertEquals(len(cache), 3)
+        self.assertEquals(self._cached_calls(cache, "1D"), "")
+        for calls_string in ("1C", "1H", "1S"):
+            self.assertEquals(self._cached_calls(cache, calls_string), calls_string)
+
+    def test_leaves_are_evicted_first(self):
+        cache = HistoryCache(size_limit=2)
+        cache.add(_history_for("1C"))
+        cache.add(_history_for("1C P"))
+        cache.add(_history_for("1C P 1H"))
+        # Adding 1C P 1H touched 1C and 1C P after it, so it goes first.
+        self.assertEquals(len(cache), 2)
+        self.assertEquals(self._cached_calls(cache, "1C P 1H"), "1C P")
+
+    def test_call_limit(self):
+        cache = HistoryCache(call_limit=2)
+        for calls_string in ("1C", "1D", "1H"):
+            cache.add(_history_for(calls_string))
+        self.assertEquals(len(cache), 2)
+        self.assertEquals(cache.call_count, 2)
+        self.assertEquals(self._cached_calls(cache, "1C"), "")
+        # A longer history holds more calls, so it pushes out both of the others.
+        cache.add(_history_for("1S P"))
+        self.assertEquals(len(cache), 1)
+        self.assertEquals(self._cached_calls(cache, "1S P"), "1S P")
+        self.assertEquals(cache.call_count, 2)
+
+    def test_clear(self):
+        cache = HistoryCache()
+        cache.add(_history_for("1C P"))
+        cache.clear()
+        self.assertEquals(len(cache), 0)
+        self.assertEquals(cache.call_count, 0)
+        self.assertEquals(self._cached_calls(cache, "1C P"), "")
+
+
+if __name__ == '__main__':
+    unittest2.main()
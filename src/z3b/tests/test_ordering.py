@@ -0,0 +1,116 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import random
+import unittest2
+from z3b.bidder import PossibleCalls
+from z3b.ordering import Ordering
+import z3b.sayc as sayc
+
+
+# lt as the graph based Ordering computed it, by searching the successors.
+def _reference_lt(ordering, left, right):
+    seen = set()
+    pending = list(ordering._successors.get(left, ()))
+    while pending:
+        item = pending.pop()
+        if item == right:
+            return True
+        if item not in seen:
+            seen.add(item)
+            pending.extend(ordering._successors[item])
+    return False
+
+
+# maximal_calls_and_priorities as it was before the bitset rewrite.
+def _reference_maximal(lt, calls_and_priorities):
+    maximal_calls_and_priorities = []
+    for call, priority in calls_and_priorities:
+        if any(lt(priority, max_priority) for max_call, max_priority in maximal_calls_and_priorities):
+            continue
+        maximal_calls_and_priorities = [[max_call, max_priority] for max_call, max_priority in maximal_calls_and_priorities if not lt(max_priority, priority)]
+        maximal_calls_and_priorities.append([call, priority])
+    return maximal_calls_and_priorities
+
+
+class OrderingTest(unittest2.TestCase):
+    def test_lt_is_transitive(self):
+        ordering = Ordering()
+        ordering.order(1, 2)
+        ordering.order(2, [3, 4])
+        ordering.order(5, 4)
+        self.assertTrue(ordering.lt(1, 2))
+        self.assertTrue(ordering.lt(1, 3))
+        self.assertTrue(ordering.lt(1, 4))
+        self.assertTrue(ordering.lt(5, 4))
+        self.assertFalse(ordering.lt(2, 1))
+        self.assertFalse(ordering.lt(3, 4))
+        self.assertFalse(ordering.lt(5, 1))
+        self.assertFalse(ordering.lt(1, 1))
+        self.assertFalse(ordering.lt(1, 6))
+
+    def test_greater_items_and_bits(self):
+        ordering = Ordering()
+        ordering.order(1, 2, 3)
+        ordering.order(4, 3)
+        self.assertEqual(sorted(ordering.greater_items(1)), [2, 3])
+        self.assertEqual(ordering.greater_items(3), [])
+        self.assertEqual(sorted(ordering.items()), [1, 2, 3, 4])
+        for item in ordering.items():
+            for other in ordering.items():
+                self.assertEqual(ordering.lt(item, other), bool(ordering.greater_bits(item) & ordering.bit(other)))
+
+    def test_ordering_after_compile(self):
+        ordering = Ordering()
+        ordering.order(1, 2)
+        self.assertFalse(ordering.lt(1, 3))
+        ordering.order(2, 3)
+        self.assertTrue(ordering.lt(1, 3))
+
+    def test_key(self):
+        ordering = Ordering()
+        ordering.order(3, 1, 2)
+        self.assertEqual(sorted([2, 1, 3], key=ordering.key), [3, 1, 2])
+
+    def test_cycle(self):
+        ordering = Ordering()
+        ordering.order(1, 2)
+        ordering.order(2, 1)
+        self.assertRaises(AssertionError, ordering.lt, 1, 2)
+
+
+class PossibleCallsTest(unittest2.TestCase):
+    def _assert_matches_reference(self, ordering, priorities):
+        possible_calls = PossibleCalls(ordering)
+        calls_and_priorities = []
+        for call, priority in enumerate(priorities):
+            possible_calls.add_call_with_priority(call, priority)
+            calls_and_priorities.append([call, priority])
+        reference_lt = lambda left, right: _reference_lt(ordering, left, right)
+        self.assertEqual(possible_calls.maximal_calls_and_priorities(), _reference_maximal(reference_lt, calls_and_priorities))
+
+    def test_small_ordering(self):
+        ordering = Ordering()
+        ordering.order(1, 2, 3)
+        ordering.order(4, 3)
+        ordering.order(5, 6)
+        self._assert_matches_reference(ordering, [1, 2, 4, 5])
+        self._assert_matches_reference(ordering, [3, 1, 6, 5, 7])
+        self._assert_matches_reference(ordering, [1, 1, 2])
+        self._assert_matches_reference(ordering, [])
+
+    def test_sayc_priorities(self):
+        ordering = sayc.StandardAmericanYellowCard.priority_ordering.ordering
+        priorities = ordering.items()
+        for item in random.Random(0).sample(priorities, 100):
+            for other in priorities:
+                self.assertEqual(ordering.lt(item, other), _reference_lt(ordering, item, other))
+
+        sample_random = random.Random(1)
+        for _ in range(200):
+            self._assert_matches_reference(ordering, sample_random.sample(priorities, sample_random.randint(1, 12)))
+
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -0,0 +1,69 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest2
+from core.call import Call, calls_in_mask
+from core.callhistory import CallHistory
+from z3b.bidder import Interpreter
+from z3b.model import positions
+from z3b.preconditions import annotations
+from z3b.rule_compiler import RuleIndex
+import z3b.sayc as sayc
+
+
+AUCTIONS = (
+    "",
+    "P",
+    "P P P",
+    "1C",
+    "1C P",
+    "1C X",
+    "1S 2H",
+    "1H P 2H P",
+    "1N P 2C P",
+    "1N P 2D P 2H P",
+    "2C P 2D P",
+    "P P 1D 1S X",
+    "1H P 1S P 1N P",
+    "1C P 1H P 1S P 2S P",
+    "4S P",
+)
+
+
+class RuleIndexTest(unittest2.TestCase):
+    def _fitting(self, rules_and_calls, history):
+        return [(rule, call) for rule, call in rules_and_calls if rule.fits_preconditions(history, call)]
+
+    def test_candidates_include_every_fitting_rule(self):
+        system = sayc.StandardAmericanYellowCard
+        interpreter = Interpreter()
+        for calls_string in AUCTIONS:
+            history = interpreter.create_history(CallHistory.from_string(calls_string))
+            every_rule_and_call = [(rule, call) for rule in system.rules for call in calls_in_mask(history.legal_call_mask & rule.known_call_mask)]
+            candidates = system.rule_index.candidates(history)
+            self.assertLessEqual(len(candidates), len(every_rule_and_call))
+            # Same rules, for the same calls, in the same order.
+            self.assertEquals(self._fitting(candidates, history), self._fitting(every_rule_and_call, history), calls_string)
+
+    def test_candidates_are_legal(self):
+        history = Interpreter().create_history(CallHistory.from_string("1S P 2S"))
+        for rule, call in sayc.StandardAmericanYellowCard.rule_index.candidates(history):
+            self.assertTrue(history.legal_call_mask & (1 << call.index))
+            self.assertNotEquals(call, Call.from_string("2S"))
+            self.assertNotEquals(call, Call.from_string("XX"))
+
+    def test_facts_for(self):
+        interpreter = Interpreter()
+        facts = RuleIndex.facts_for(interpreter.create_history(CallHistory.from_string("")))
+        self.assertEquals(facts, set([('no_opening',)]))
+
+        facts = RuleIndex.facts_for(interpreter.create_history(CallHistory.from_string("1H P")))
+        self.assertIn(('last_call', positions.Partner, '1H'), facts)
+        self.assertIn(('last_call', positions.RHO, 'P'), facts)
+        self.assertIn(('last_call_annotation', positions.Partner, annotations.Opening), facts)
+        self.assertNotIn(('no_opening',), facts)
+
+
+if __name__ == '__main__':
+    unittest2.main()
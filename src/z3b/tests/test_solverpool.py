@@ -0,0 +1,67 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import itertools
+import unittest2
+from core.callhistory import CallHistory
+from core.dealstream import DealStream
+from z3b.bidder import Interpreter, SolverPool, _solver_pool
+from z3b.model import positions, is_possible
+import z3b.model as model
+
+
+class SolverPoolTest(unittest2.TestCase):
+    def setUp(self):
+        self.solvers_for_hands = SolverPool.__dict__['solver_for_hand']
+        self.solvers_for_hands.clear()
+
+    def tearDown(self):
+        self.solvers_for_hands.clear()
+
+    def _hands(self, count):
+        deals = DealStream(1234, batch_size=count).batch(0).deals()
+        return list(itertools.islice(itertools.chain.from_iterable(deal.hands for deal in deals), count))
+
+    def test_solvers_for_hands_are_restored(self):
+        pool = SolverPool()
+        size_limit = self.solvers_for_hands.size_limit
+        hands = self._hands(size_limit + 1)
+        first_solver = pool.solver_for_hand(hands[0])
+        self.assertIs(pool.solver_for_hand(hands[0]), first_solver)
+        for hand in hands[1:size_limit]:
+            pool.solver_for_hand(hand)
+        self.assertEquals(pool._pool, [])
+
+        # Evicting the first hand's solver returns it to the pool, with only the axioms asserted.
+        pool.solver_for_hand(hands[size_limit])
+        self.assertEquals(pool._pool, [first_solver])
+        self.assertEquals(pool.snapshot(first_solver), [])
+
+        self.solvers_for_hands.clear()
+        self.assertEquals(len(pool._pool), size_limit + 1)
+
+    def _answers(self, solver):
+        exprs = (model.spades >= 5, model.spades >= 6, model.hearts >= 4, model.high_card_points >= 16, model.high_card_points <= 11, model.balanced)
+        return [is_possible(solver, expr) for expr in exprs]
+
+    def test_forks_match_the_original(self):
+        history = Interpreter().create_history(CallHistory.from_string("1S P 2S P 2N"))
+        previous_histories = [history._history_after_last_call_for(position) for position in positions]
+        answers = [self._answers(previous_history._solver()) for previous_history in previous_histories]
+        # LHO raised to 2S, so can't hold 16 points.
+        self.assertFalse(answers[positions.LHO.index][3])
+        for previous_history, expected_answers in zip(previous_histories, answers):
+            fork = _solver_pool.fork(_solver_pool.snapshot(previous_history._solver()))
+            self.assertEquals(self._answers(fork), expected_answers)
+            _solver_pool.restore(fork)
+
+        # Leaving the history hands its solvers back, so later uses fork a snapshot.
+        with history:
+            pass
+        for previous_history, expected_answers in zip(previous_histories, answers):
+            self.assertIsNotNone(previous_history._solver_snapshot)
+            self.assertEquals(self._answers(previous_history._solver()), expected_answers)
+
+if __name__ == '__main__':
+    unittest2.main()
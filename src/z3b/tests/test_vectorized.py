@@ -0,0 +1,175 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import numpy
+import unittest2
+from core.callhistory import CallHistory
+from core.hand import Hand
+from core.position import *
+from core.suit import *
+from z3b.bidder import Bidder, Interpreter, RuleSelector
+from z3b.evaluator import HandEvaluator, UnsupportedExpression
+from z3b.model import positions
+from z3b.vectorized import DealGenerator, HandMatrix, HandMatrixEvaluator, HandSampler, MatrixBidder, _fits_hand
+import z3
+import z3b.model as model
+import z3b.sayc as sayc
+
+
+AUCTIONS = (
+    "",
+    "P",
+    "1C",
+    "1H P",
+    "1S 2H",
+    "1N P",
+    "1N P 2C P",
+    "1H P 1S P",
+    "2C P 2D P",
+)
+
+
+class HandMatrixTest(unittest2.TestCase):
+    def test_hands_round_trip(self):
+        hands = [Hand.from_cdhs_string("AKJ52.J.J9743.54"), Hand.from_cdhs_string("32.32.32.AKQJT98")]
+        hand_matrix = HandMatrix.from_hands(hands)
+        self.assertEquals(len(hand_matrix), 2)
+        self.assertEquals([hand.cdhs_dot_string() for hand in hand_matrix.hands()], [hand.cdhs_dot_string() for hand in hands])
+
+    def test_values_match_hand_evaluator(self):
+        hand_matrix = HandMatrix.random(200, numpy.random.RandomState(1))
+        for row, hand in enumerate(hand_matrix.hands()):
+            values = HandEvaluator._values_for_hand(hand)
+            self.assertEquals(list(hand_matrix.features[row]), [values[name] for name in HandMatrix.FEATURE_NAMES])
+
+
+class HandMatrixEvaluatorTest(unittest2.TestCase):
+    def test_masks_match_hand_evaluator(self):
+        hand_matrix = HandMatrix.random(100, numpy.random.RandomState(2))
+        hand_evaluators = map(HandEvaluator, hand_matrix.hands())
+        matrix_evaluator = HandMatrixEvaluator(hand_matrix)
+        checked_count = 0
+        for calls_string in AUCTIONS:
+            with Interpreter().create_history(CallHistory.from_string(calls_string)) as history:
+                for call, priority, z3_meaning in RuleSelector.for_history(sayc.StandardAmericanYellowCard, history).meanings():
+                    try:
+                        mask = matrix_evaluator.mask(z3_meaning)
+                    except UnsupportedExpression:
+                        continue
+                    self.assertEquals(list(mask), [hand_evaluator.is_possible(z3_meaning) for hand_evaluator in hand_evaluators], "%s after '%s'" % (call.name, calls_string))
+                    checked_count += 1
+        self.assertGreater(checked_count, 0)
+
+
+class MatrixBidderTest(unittest2.TestCase):
+    def test_calls_match_bidder(self):
+        hand_matrix = HandMatrix.random(30, numpy.random.RandomState(3))
+        hands = hand_matrix.hands()
+        matrix_bidder = MatrixBidder()
+        bidder = Bidder()
+        for calls_string in AUCTIONS:
+            call_history = CallHistory.from_string(calls_string)
+            calls = matrix_bidder.calls_for(hand_matrix, call_history)
+            self.assertEquals(len(calls), len(hands))
+            for hand, call in zip(hands, calls):
+                self.assertEquals(call, bidder.find_call_for(hand, call_history), "%s after '%s'" % (hand.pretty_one_line(), calls_string))
+
+
+class DealGeneratorTest(unittest2.TestCase):
+    def _generator(self, calls_string, dealer_char, known_hand=None):
+        call_history = CallHistory.from_string(calls_string, dealer_char=dealer_char)
+        history = Interpreter().create_history(call_history)
+        return DealGenerator(history, call_history.dealer, known_hand), history
+
+    def test_seats_follow_the_dealer(self):
+        generator, history = self._generator("1S P 2S P", 'E')
+        deals = generator.generate(20, numpy.random.RandomState(1234))
+        self.assertEquals(len(deals), 20)
+        # East dealt and opened 1S, so East is Me, and West raised.
+        for deal in deals:
+            self.assertGreaterEqual(deal.hand_for(EAST).length_of_suit(SPADES), 5)
+            self.assertGreaterEqual(deal.hand_for(WEST).length_of_suit(SPADES), 3)
+            self.assertGreaterEqual(deal.hand_for(EAST).high_card_points(), 10)
+        self.assertGreater(generator.statistics.dealt, generator.statistics.accepted)
+
+    def test_every_seat_fits_its_calls(self):
+        generator, history = self._generator("1H P 2H P", 'S')
+        me = SOUTH
+        absolute_positions = {
+            positions.Me: me,
+            positions.LHO: me.lho,
+            positions.Partner: me.partner,
+            positions.RHO: me.rho,
+        }
+        for deal in generator.generate(10, numpy.random.RandomState(1)):
+            for position in positions:
+                hand = deal.hand_for(absolute_positions[position])
+                self.assertTrue(_fits_hand(hand, history.all_constraints_for_position(position)))
+
+    def test_known_hand(self):
+        known_hand = Hand.from_cdhs_string("AKJ52.J.J9743.54")
+        generator, history = self._generator("1S P 2S", 'W', known_hand)
+        deals = generator.generate(10, numpy.random.RandomState(1))
+        self.assertEquals(len(deals), 10)
+        # West dealt, so South calls next.
+        for deal in deals:
+            self.assertEquals(deal.hand_for(SOUTH).cdhs_dot_string(), known_hand.cdhs_dot_string())
+            self.assertGreaterEqual(deal.hand_for(WEST).length_of_suit(SPADES), 5)
+
+    def test_impossible_auction(self):
+        generator, history = self._generator("1S P 2S", 'N', Hand.from_cdhs_string("32.32.32.AKQJT98"))
+        # Seven spades in the known hand leave too few for opener and responder.
+        generator.BATCH_SIZE = 100
+        generator.MAX_BATCHES = 3
+        self.assertEquals(generator.generate(10, numpy.random.RandomState(1)), [])
+        self.assertEquals(generator.statistics.accepted, 0)
+
+
+class HandSamplerTest(unittest2.TestCase):
+    def _solver(self, expr):
+        solver = z3.SolverFor('QF_LIA')
+        solver.add(model.axioms)
+        solver.add(expr)
+        return solver
+
+    def test_sample(self):
+        expr = z3.And(model.hearts >= 5, model.high_card_points >= 12)
+        sampler = HandSampler(expr)
+        hands = sampler.sample(50, numpy.random.RandomState(1)).hands()
+        self.assertEquals(len(hands), 50)
+        for hand in hands:
+            self.assertGreaterEqual(hand.length_of_suit(HEARTS), 5)
+            self.assertGreaterEqual(hand.high_card_points(), 12)
+
+    def test_rare_shapes_use_the_solver(self):
+        # Fewer than one hand in a hundred has eight spades.
+        expr = model.spades >= 8
+        sampler = HandSampler(expr, self._solver(expr))
+        hands = sampler.sample(50, numpy.random.RandomState(1)).hands()
+        self.assertEquals(len(hands), 50)
+        self.assertIsNotNone(sampler._shapes)
+        self.assertTrue((sampler._shapes[:, SPADES.index] >= 8).all())
+        self.assertAlmostEqual(sampler._shape_probabilities.sum(), 1)
+        for hand in hands:
+            self.assertGreaterEqual(hand.length_of_suit(SPADES), 8)
+
+    def test_impossible(self):
+        expr = z3.And(model.spades >= 8, model.hearts >= 6)
+        sampler = HandSampler(expr, self._solver(expr))
+        self.assertEquals(len(sampler.sample(10, numpy.random.RandomState(1))), 0)
+        self.assertEquals(len(sampler._shapes), 0)
+
+    def test_history_sample_hands(self):
+        call_history = CallHistory.from_string("1S P 2S P")
+        with Interpreter().create_history(call_history) as history:
+            for position, min_spades in ((positions.Me, 5), (positions.Partner, 3)):
+                hands = history.sample_hands(position, 20, numpy.random.RandomState(1))
+                self.assertEquals(len(hands), 20)
+                for hand in hands:
+                    self.assertGreaterEqual(hand.length_of_suit(SPADES), min_spades)
+                    self.assertTrue(_fits_hand(hand, history.all_constraints_for_position(position)))
+
+
+if __name__ == '__main__':
+    unittest2.main()
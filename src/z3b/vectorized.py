@@ -0,0 +1,397 @@
+# Copyright (c) 2013 The SAYCBridge Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+from core import dealcodec
+from core import suit
+from core.card import Card
+from core.hand import Hand
+from z3b import evaluator
+from z3b.bidder import Interpreter, PossibleCalls, RuleSelector
+from z3b.evaluator import ExpressionCompiler, HandEvaluator, UnsupportedExpression
+from z3b.model import is_possible
+import itertools
+import numpy
+import z3
+import z3b.model as model
+import z3b.sayc as sayc
+
+
+HONOR_CARDS = ('A', 'K', 'Q', 'J', 'T')
+
+
+# An N x 52 card matrix for N hands, and the N x F matrix of every variable
+# HandEvaluator computes for a hand, so meanings can be evaluated over all N
+# hands at once.  Card columns are Card.identifier_for_card.
+class HandMatrix(object):
+    FEATURE_NAMES = tuple(evaluator._suit_length_names) + tuple(itertools.chain(*evaluator._honor_names)) + (
+        evaluator._high_card_points_name,
+        evaluator._points_name,
+    ) + tuple("%s_in_%s" % (count_name, _suit.name.lower()) for count_name in ('void', 'singleton', 'doubleton') for _suit in suit.SUITS) + (
+        'voids',
+        'singletons',
+        'doubletons',
+    ) + tuple(evaluator._support_points_names)
+
+    def __init__(self, cards):
+        assert cards.shape[1:] == (52,)
+        assert (cards.sum(axis=1) == 13).all()
+        self.cards = cards
+        self.values = self._values_for_cards(cards)
+        self.features = numpy.column_stack([self.values[name] for name in self.FEATURE_NAMES])
+
+    def __len__(self):
+        return len(self.cards)
+
+    @classmethod
+    def from_hands(cls, hands):
+        cards = numpy.zeros((len(hands), 52), dtype=bool)
+        for row, hand in enumerate(hands):
+            for _suit in suit.SUITS:
+                for card in hand.cards_in_suit(_suit):
+                    cards[row, Card.identifier_for_card(_suit, card)] = True
+        return cls(cards)
+
+    @classmethod
+    def from_deals(cls, deals):
+        return cls.from_hands(list(itertools.chain.from_iterable(deal.hands for deal in deals)))
+
+    @classmethod
+    def random(cls, count, random_state=None):
+        random_state = random_state or numpy.random
+        dealt = random_state.rand(count, 52).argsort(axis=1)[:, :13]
+        cards = numpy.zeros((count, 52), dtype=bool)
+        cards[numpy.arange(count)[:, numpy.newaxis], dealt] = True
+        return cls(cards)
+
+    def hand(self, row):
+        cards_by_suit = ["" for _ in suit.SUITS]
+        for identifier in numpy.flatnonzero(self.cards[row]):
+            _suit, card = Card.suit_and_value_from_identifier(identifier)
+            cards_by_suit[_suit.index] += card
+        return Hand(cards_by_suit)
+
+    def hands(self):
+        return map(self.hand, range(len(self)))
+
+    # This mirrors HandEvaluator._values_for_hand.
+    @classmethod
+    def _values_for_cards(cls, cards):
+        values = {}
+        lengths = []
+        hcp = numpy.zeros(len(cards), dtype=int)
+        for _suit in suit.SUITS:
+            length = cards[:, _suit.index * 13:(_suit.index + 1) * 13].sum(axis=1)
+            lengths.append(length)
+            values[evaluator._suit_length_names[_suit.index]] = length
+            for honor_name, card in zip(evaluator._honor_names[_suit.index], HONOR_CARDS):
+                held = cards[:, Card.identifier_for_card(_suit, card)].astype(int)
+                values[honor_name] = held
+                hcp += Card.high_card_points(card) * held
+        values[evaluator._high_card_points_name] = hcp
+        values[evaluator._points_name] = hcp
+
+        for count_name, count in (('void', 0), ('singleton', 1), ('doubleton', 2)):
+            matches = [(length == count).astype(int) for length in lengths]
+            for _suit, match in zip(suit.SUITS, matches):
+                values["%s_in_%s" % (count_name, _suit.name.lower())] = match
+            values[count_name + "s"] = sum(matches)
+
+        voids, singletons, doubletons = values['voids'], values['singletons'], values['doubletons']
+        for _suit in suit.SUITS:
+            length = lengths[_suit.index]
+            values[evaluator._support_points_names[_suit.index]] = numpy.where(length <= 2, hcp,
+                numpy.where(length == 3, hcp + doubletons + 2 * singletons + 3 * voids, hcp + doubletons + 3 * singletons + 5 * voids))
+        return values
+
+
+# Compiles meanings into lambdas over HandMatrix.values which return boolean masks.
+class MaskCompiler(ExpressionCompiler):
+    infix_ops = {
+        z3.Z3_OP_AND: " & ",
+        z3.Z3_OP_OR: " | ",
+        z3.Z3_OP_ADD: " + ",
+        z3.Z3_OP_SUB: " - ",
+        z3.Z3_OP_MUL: " * ",
+    }
+    # numpy booleans, unlike python's, negate correctly with ~.
+    true_source = "_true"
+    false_source = "_false"
+    not_format = "(~%s)"
+    implies_format = "((~%s) | %s)"
+
+    def _ite_source(self, condition, if_true, if_false):
+        return "_where(%s, %s, %s)" % (condition, if_true, if_false)
+
+    def _distinct_source(self, sources):
+        if len(sources) != 2:
+            raise UnsupportedExpression("Unsupported distinct over %d arguments" % len(sources))
+        return "(%s != %s)" % tuple(sources)
+
+    def _namespace(self):
+        return {
+            '_true': numpy.bool_(True),
+            '_false': numpy.bool_(False),
+            '_where': numpy.where,
+        }
+
+
+_mask_compiler = MaskCompiler()
+
+
+# HandMatrixEvaluator answers HandEvaluator.is_possible for every hand in a HandMatrix at once.
+class HandMatrixEvaluator(object):
+    def __init__(self, hand_matrix):
+        self.hand_matrix = hand_matrix
+        self._values = hand_matrix.values
+        self._free_range = (self._values[evaluator._high_card_points_name], evaluator.MAX_PLAYING_POINTS)
+
+    def _as_mask(self, result):
+        return numpy.zeros(len(self.hand_matrix), dtype=bool) | result
+
+    def _candidate_free_values(self, compiled):
+        low, high = self._free_range
+        candidates = [low, numpy.full(len(self.hand_matrix), high)]
+        for difference in compiled.comparisons_with_free_variable:
+            # See HandEvaluator._candidate_free_values.  Candidates are clipped into
+            # the free range, so extra candidates (e.g. when slope is 0) are harmless.
+            offset = difference(self._values, 0)
+            slope = difference(self._values, 1) - offset
+            threshold = -offset // numpy.where(slope == 0, 1, slope)
+            candidates.extend(numpy.clip(threshold + delta, low, high) for delta in (-1, 0, 1, 2))
+        return candidates
+
+    def mask(self, expr):
+        compiled = _mask_compiler.compile(expr)
+        if not compiled.comparisons_with_free_variable:
+            return self._as_mask(compiled.function(self._values, self._free_range[1]))
+        mask = self._as_mask(False)
+        for free_values in self._candidate_free_values(compiled):
+            mask |= compiled.function(self._values, free_values)
+        return mask
+
+
+# Finds the call Bidder would make for every hand in a HandMatrix.  Every
+# meaning is evaluated once over all of the hands, and hands which fit exactly
+# the same meanings share one call selection.
+class MatrixBidder(object):
+    def __init__(self):
+        # Assuming SAYC for all sides.
+        self.system = sayc.StandardAmericanYellowCard
+
+    def _mask(self, rule_selector, matrix_evaluator, z3_meaning):
+        try:
+            return matrix_evaluator.mask(z3_meaning)
+        except UnsupportedExpression:
+            hands = matrix_evaluator.hand_matrix.hands()
+            return numpy.array([rule_selector.fits_hand(HandEvaluator(hand), z3_meaning) for hand in hands], dtype=bool)
+
+    def calls_for(self, hand_matrix, call_history):
+        with Interpreter().create_history(call_history) as history:
+            rule_selector = RuleSelector.for_history(self.system, history)
+            meanings = rule_selector.meanings()
+            if not meanings:
+                return [None] * len(hand_matrix)
+
+            matrix_evaluator = HandMatrixEvaluator(hand_matrix)
+            masks = numpy.array([self._mask(rule_selector, matrix_evaluator, z3_meaning) for _, _, z3_meaning in meanings])
+            patterns, pattern_indices = numpy.unique(masks, axis=1, return_inverse=True)
+
+            calls = []
+            for pattern in patterns.T:
+                possible_calls = PossibleCalls(self.system.priority_ordering)
+                for (call, priority, _), fits in zip(meanings, pattern):
+                    if fits:
+                        possible_calls.add_call_with_priority(call, priority)
+                calls.append(rule_selector.call_from_possible_calls(possible_calls))
+            return [calls[index] for index in pattern_indices]
+
+
+def _fits_hand(hand, expr):
+    try:
+        return HandEvaluator(hand).is_possible(expr)
+    except UnsupportedExpression:
+        solver = z3.SolverFor('QF_LIA')
+        solver.add(model.axioms)
+        solver.add(model.expr_for_hand(hand))
+        return is_possible(solver, expr)
+
+
+# Samples hands uniformly from all hands satisfying expr.  Random hands are
+# drawn a batch at a time and filtered with HandMatrixEvaluator.  When few of
+# them fit, solver (which must already include expr) is used to find every
+# shape expr allows, and hands are then drawn only from those shapes, each
+# weighted by how many hands have it, which keeps the sampling uniform.
+class HandSampler(object):
+    # A batch takes about 12ms to deal and check, so an impossible expr gives up
+    # after about a second.  Finding the shapes takes about 2ms a shape (0.1s
+    # for 8+ spades, 0.8s for 22+ points), so it is only worth it once fewer
+    # than one random hand in twenty fits.
+    BATCH_SIZE = 2000
+    MAX_BATCHES = 100
+    MIN_ACCEPTANCE_RATE = 0.05
+
+    def __init__(self, expr, solver=None):
+        self.expr = expr
+        self.solver = solver
+        self._shapes = None
+        self._shape_probabilities = None
+
+    def _find_shapes(self):
+        suit_exprs = map(model.expr_for_suit, suit.SUITS)
+        shapes = []
+        self.solver.push()
+        try:
+            while self.solver.check() == z3.sat:
+                solver_model = self.solver.model()
+                shape = tuple(solver_model.eval(suit_expr, model_completion=True).as_long() for suit_expr in suit_exprs)
+                shapes.append(shape)
+                self.solver.add(z3.Or([suit_expr != length for suit_expr, length in zip(suit_exprs, shape)]))
+        finally:
+            self.solver.pop()
+
+        self._shapes = numpy.array(shapes, dtype=int).reshape(len(shapes), 4)
+        hand_counts = numpy.array([numpy.prod([_binomial(13, length) for length in shape]) for shape in shapes], dtype=float)
+        self._shape_probabilities = hand_counts / hand_counts.sum() if shapes else hand_counts
+
+    def _random_cards_with_shapes(self, count, random_state):
+        lengths = self._shapes[random_state.choice(len(self._shapes), size=count, p=self._shape_probabilities)]
+        # A random rank for every card within its suit; the lowest ranks are dealt.
+        ranks = random_state.rand(count, 4, 13).argsort(axis=2).argsort(axis=2)
+        return (ranks < lengths[:, :, numpy.newaxis]).reshape(count, 52)
+
+    def _random_hand_matrix(self, random_state):
+        if self._shapes is None:
+            return HandMatrix.random(self.BATCH_SIZE, random_state)
+        return HandMatrix(self._random_cards_with_shapes(self.BATCH_SIZE, random_state))
+
+    def _mask(self, hand_matrix):
+        try:
+            return HandMatrixEvaluator(hand_matrix).mask(self.expr)
+        except UnsupportedExpression:
+            return numpy.array([_fits_hand(hand, self.expr) for hand in hand_matrix.hands()], dtype=bool)
+
+    # May return fewer than count hands if expr is very unlikely (or impossible).
+    def sample(self, count, random_state=None):
+        random_state = random_state or numpy.random.RandomState()
+        accepted = []
+        accepted_count = 0
+        for _ in range(self.MAX_BATCHES):
+            if accepted_count >= count:
+                break
+            hand_matrix = self._random_hand_matrix(random_state)
+            mask = self._mask(hand_matrix)
+            accepted.append(hand_matrix.cards[mask])
+            accepted_count += mask.sum()
+            if self._shapes is None and self.solver and mask.mean() < self.MIN_ACCEPTANCE_RATE:
+                self._find_shapes()
+                if not len(self._shapes):
+                    break
+        cards = numpy.concatenate(accepted)[:count] if accepted else numpy.zeros((0, 52), dtype=bool)
+        return HandMatrix(cards)
+
+
+def _binomial(n, k):
+    result = 1
+    for i in range(k):
+        result = result * (n - i) / (i + 1)
+    return result
+
+
+class DealStatistics(object):
+    def __init__(self):
+        self.dealt = 0
+        self.accepted = 0
+        # Deals rejected by each position's constraints, keyed by positions enum value.
+        self.rejected_by_position = dict((position, 0) for position in model.positions)
+
+    def __repr__(self):
+        rejections = ", ".join("%s=%s" % (position.key, count) for position, count in sorted(self.rejected_by_position.items()))
+        return "DealStatistics(dealt=%s, accepted=%s, rejected: %s)" % (self.dealt, self.accepted, rejections)
+
+    @property
+    def acceptance_rate(self):
+        return float(self.accepted) / self.dealt if self.dealt else 0.0
+
+
+# Deals whole boards in which every seat fits everything its calls have shown
+# over history.  Me is the position to call next, and can optionally be given
+# a known hand.  Histories are interpreted (and cached) without a dealer, so
+# the dealer who made history's first call must be given.  Deals are made a
+# batch at a time, with the unknown cards shuffled as a matrix, and each batch
+# is filtered one seat at a time, most often rejecting seat first, so most
+# deals are rejected after one check.
+class DealGenerator(object):
+    # A batch takes 25-50ms to deal and check, so an impossible auction gives
+    # up after five million deals, in under a minute.  That is fine for
+    # deal-stats, which is run by hand.
+    BATCH_SIZE = 5000
+    MAX_BATCHES = 1000
+
+    def __init__(self, history, dealer, known_hand=None):
+        self.history = history
+        self.dealer = dealer
+        self.known_hand = known_hand
+        self.statistics = DealStatistics()
+        me = self.dealer.position_after_n_calls(len(history.call_history))
+        # model.positions are relative to Me, deals use absolute positions.
+        self._absolute_positions = dict((position, me.position_after_n_calls(3 - position.index)) for position in model.positions)
+        self._exprs = dict((position, history.all_constraints_for_position(position)) for position in model.positions)
+        self._unknown_positions = [position for position in model.positions if not (known_hand and position == model.positions.Me)]
+        self._known_cards = HandMatrix.from_hands([known_hand]).cards[0] if known_hand else numpy.zeros(52, dtype=bool)
+        self._unknown_cards = numpy.flatnonzero(~self._known_cards)
+
+    def _positions_to_check(self):
+        # Checking the seat which rejects the most first leaves the fewest deals for the rest.
+        return sorted(self._unknown_positions, key=lambda position: -self.statistics.rejected_by_position[position])
+
+    def _hand_matrix(self, shuffled_cards, slot):
+        count = len(shuffled_cards)
+        cards = numpy.zeros((count, 52), dtype=bool)
+        cards[numpy.arange(count)[:, numpy.newaxis], shuffled_cards[:, slot * 13:(slot + 1) * 13]] = True
+        return HandMatrix(cards)
+
+    def _mask(self, hand_matrix, position):
+        try:
+            return HandMatrixEvaluator(hand_matrix).mask(self._exprs[position])
+        except UnsupportedExpression:
+            return numpy.array([_fits_hand(hand, self._exprs[position]) for hand in hand_matrix.hands()], dtype=bool)
+
+    def _deal_batch(self, random_state):
+        order = random_state.rand(self.BATCH_SIZE, len(self._unknown_cards)).argsort(axis=1)
+        shuffled_cards = self._unknown_cards[order]
+        slots = dict((position, slot) for slot, position in enumerate(self._unknown_positions))
+        self.statistics.dealt += len(shuffled_cards)
+        for position in self._positions_to_check():
+            mask = self._mask(self._hand_matrix(shuffled_cards, slots[position]), position)
+            self.statistics.rejected_by_position[position] += len(mask) - mask.sum()
+            shuffled_cards = shuffled_cards[mask]
+            if not len(shuffled_cards):
+                break
+        self.statistics.accepted += len(shuffled_cards)
+
+        # position_for_card, as in Deal.identifier, for each accepted deal.
+        positions_for_cards = numpy.zeros((len(shuffled_cards), 52), dtype=int)
+        if self.known_hand:
+            positions_for_cards[:, self._known_cards] = self._absolute_positions[model.positions.Me].index
+        for position, slot in slots.items():
+            rows = numpy.arange(len(shuffled_cards))[:, numpy.newaxis]
+            positions_for_cards[rows, shuffled_cards[:, slot * 13:(slot + 1) * 13]] = self._absolute_positions[position].index
+        return positions_for_cards
+
+    # Returns a count x 52 matrix of the position index holding each card.
+    # May return fewer than count deals if the auction is very unlikely.
+    def generate_positions_for_cards(self, count, random_state=None):
+        random_state = random_state or numpy.random.RandomState()
+        batches = []
+        dealt_count = 0
+        for _ in range(self.MAX_BATCHES):
+            if dealt_count >= count:
+                break
+            batch = self._deal_batch(random_state)
+            batches.append(batch)
+            dealt_count += len(batch)
+        return numpy.concatenate(batches)[:count] if batches else numpy.zeros((0, 52), dtype=int)
+
+    def generate(self, count, random_state=None):
+        return dealcodec.deals_for_positions(self.generate_positions_for_cards(count, random_state))